@@ -0,0 +1,216 @@
+'''
+Benchmark suite for the stages of percent and filter on a synthetic path file
+
+Each stage is timed separately on a generated path file (see generate_path.py)
+and reported with rows/sec and peak memory. Results are compared against the
+baseline stored in baselines.json for the same size of path file.
+
+The minimal search is exponential in the size of the cover, so the minimal
+stages can stop finishing with many distinct used pieces (low pc numbers,
+more hold) or a large --pool.
+
+Usage: python benchmarks/bench.py [size options] [--stages ...] [--save-baseline] [--tolerance T]
+'''
+import argparse
+import builtins
+import contextlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from generate_path import add_size_arguments, generate_from_args
+from lib.argument_parser import parse_leftover_build
+from lib.constants import DEFAULT_WIDTH, DEFAULT_HEIGHT
+from lib.saves_reader import SavesReader
+from lib.parser import Parser as WantedSavesParser, evaluate_ast, evaluate_ast_all
+from lib.percent import percent
+from lib.filter import generate_minimals
+from lib.minimal import fumens_to_graph, find_minimal_nodes
+
+BASELINES_FILE = path.join(path.dirname(path.abspath(__file__)), "baselines.json")
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.25
+
+# expressions covering each kind of node of the wanted save expressions
+BENCH_WANTED_SAVES = ["T", "LJ", "^S", "!(T&&O)||I", r"/T[^T]/||/^[^LJ]*[LJ]{2}[^LJ]*$/"]
+BENCH_FILTER_SAVE = "T"
+
+class BenchContext:
+  '''
+  Inputs of the stages prepared ahead of time so only the stage itself is measured
+  '''
+  def __init__(self, filepath: str, pc_num: int, hold: int):
+    self.filepath = filepath
+    self.hold = hold
+    self.leftover, self.build = parse_leftover_build('', None, None, pc_num, hold)
+
+    parser = WantedSavesParser()
+    self.asts = [parser.parse(wanted_save) for wanted_save in BENCH_WANTED_SAVES]
+    filter_ast = parser.parse(BENCH_FILTER_SAVE)
+
+    self.rows_saves = []
+    self.line_fumens = []
+    self.line_queue_fumens_map = {}
+    for row in self.reader().read(assign_fumens=True):
+      self.rows_saves.append(row.saves)
+      if not row.solveable or row.fumens is None:
+        continue
+      new_fumens = [fumen for i in evaluate_ast_all(filter_ast, row.saves) for fumen in row.fumens[i]]
+      if new_fumens:
+        self.line_queue_fumens_map[row.queue] = new_fumens
+        self.line_fumens.append(new_fumens)
+
+    self.total = len(self.rows_saves)
+
+  def reader(self) -> SavesReader:
+    return SavesReader(self.filepath, self.leftover, self.build, DEFAULT_WIDTH, DEFAULT_HEIGHT, self.hold)
+
+# each stage prepares its inputs and returns the measured part which gives the number of rows handled
+Stage = Callable[[], int]
+
+def stage_read(ctx: BenchContext) -> Stage:
+  return lambda: sum(1 for _ in ctx.reader().read())
+
+def stage_read_fumens(ctx: BenchContext) -> Stage:
+  return lambda: sum(1 for _ in ctx.reader().read(assign_fumens=True))
+
+def stage_evaluate_ast(ctx: BenchContext) -> Stage:
+  def run() -> int:
+    for saves in ctx.rows_saves:
+      if not saves:
+        continue
+      for ast in ctx.asts:
+        evaluate_ast(ast, saves)
+    return ctx.total
+  return run
+
+def stage_percent(ctx: BenchContext) -> Stage:
+  def run() -> int:
+    with open(os.devnull, 'w') as log_file:
+      percent(ctx.filepath, BENCH_WANTED_SAVES, BENCH_WANTED_SAVES, ctx.leftover, ctx.build, DEFAULT_WIDTH, DEFAULT_HEIGHT, ctx.hold, log_file, False, False, False, False, 1)
+    return ctx.total
+  return run
+
+def stage_fumens_to_graph(ctx: BenchContext) -> Stage:
+  def run() -> int:
+    fumens_to_graph(ctx.line_fumens)
+    return len(ctx.line_fumens)
+  return run
+
+def stage_find_minimal_nodes(ctx: BenchContext) -> Stage:
+  graph = fumens_to_graph(ctx.line_fumens)
+  def run() -> int:
+    # the search leaves the colors of the graph as they were so it can be reused
+    find_minimal_nodes(graph.edges)
+    return len(ctx.line_fumens)
+  return run
+
+def stage_generate_minimals(ctx: BenchContext) -> Stage:
+  def run() -> int:
+    # always pick the first option instead of prompting
+    prompt = builtins.input
+    builtins.input = lambda *_: '1'
+    try:
+      with open(os.devnull, 'w') as log_file, contextlib.redirect_stdout(log_file):
+        generate_minimals([BENCH_FILTER_SAVE], ctx.line_fumens, ctx.line_queue_fumens_map, ctx.total, log_file, False, False, True)
+    finally:
+      builtins.input = prompt
+    return len(ctx.line_fumens)
+  return run
+
+STAGES: dict[str, Callable[[BenchContext], Stage]] = {
+  "read": stage_read,
+  "read_fumens": stage_read_fumens,
+  "evaluate_ast": stage_evaluate_ast,
+  "percent": stage_percent,
+  "fumens_to_graph": stage_fumens_to_graph,
+  "find_minimal_nodes": stage_find_minimal_nodes,
+  "generate_minimals": stage_generate_minimals,
+}
+
+def run_stage(ctx: BenchContext, prepare: Callable[[BenchContext], Stage], repeat: int) -> dict:
+  stage = prepare(ctx)
+  times = []
+  rows = 0
+  for _ in range(repeat):
+    start = time.perf_counter()
+    rows = stage()
+    times.append(time.perf_counter() - start)
+
+  # separate run as tracing allocations slows down the stage
+  tracemalloc.start()
+  stage()
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+
+  seconds = min(times)
+  return {
+    "seconds": seconds,
+    "median_seconds": statistics.median(times),
+    "rows": rows,
+    "rows_per_sec": rows / seconds if seconds > 0 else 0,
+    "peak_kib": peak / 1024,
+  }
+
+def size_key(args: argparse.Namespace) -> str:
+  return f"rows={args.rows},fumens={args.fumens},unused={args.unused},hold={args.hold},pc={args.pc_num},fail={args.fail_rate},pool={args.pool},seed={args.seed}"
+
+def main() -> int:
+  parser = argparse.ArgumentParser(description="Benchmark the stages of percent and filter on a synthetic path file")
+  add_size_arguments(parser)
+  parser.add_argument("-st", "--stages", help="stages to run (default: all)", choices=list(STAGES), nargs='+', default=list(STAGES))
+  parser.add_argument("-re", "--repeat", help=f"number of runs of each stage to take the fastest of (default: {DEFAULT_REPEAT})", metavar="<int>", type=int, default=DEFAULT_REPEAT)
+  parser.add_argument("-bp", "--baseline-path", help="json file of the baselines (default: benchmarks/baselines.json)", metavar="<filepath>", default=BASELINES_FILE)
+  parser.add_argument("-sb", "--save-baseline", help="store the results as the baseline for this size", action="store_true")
+  parser.add_argument("-to", "--tolerance", help=f"fraction slower than the baseline before flagged as a regression (default: {DEFAULT_TOLERANCE})", metavar="<float>", type=float, default=DEFAULT_TOLERANCE)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmpdir:
+    filepath = path.join(tmpdir, "path.csv")
+    generate_from_args(filepath, args)
+    ctx = BenchContext(filepath, args.pc_num, args.hold)
+
+    results = {name: run_stage(ctx, STAGES[name], args.repeat) for name in args.stages}
+
+  baselines = {}
+  if path.exists(args.baseline_path):
+    with open(args.baseline_path, 'r', encoding="utf8") as infile:
+      baselines = json.load(infile)
+
+  key = size_key(args)
+  baseline = baselines.get(key, {})
+
+  print(key)
+  regressions = []
+  for name, result in results.items():
+    line = f"{name:>20}: {result['seconds'] * 1000:10.1f}ms {result['rows_per_sec']:12.0f} rows/s {result['peak_kib']:10.0f}KiB peak"
+    if name in baseline:
+      change = result["seconds"] / baseline[name]["seconds"] - 1 if baseline[name]["seconds"] > 0 else 0
+      line += f" ({change:+.0%} vs baseline)"
+      if change > args.tolerance:
+        line += " REGRESSION"
+        regressions.append(name)
+    print(line)
+
+  if args.save_baseline:
+    baselines[key] = {**baseline, **results}
+    with open(args.baseline_path, 'w', encoding="utf8") as outfile:
+      json.dump(baselines, outfile, indent=2, sort_keys=True)
+      outfile.write('\n')
+    print(f"Saved baseline to {args.baseline_path}")
+
+  if regressions:
+    print(f"Regressions in {', '.join(regressions)}")
+    return 1
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,152 @@
+'''
+Generate synthetic sfinder path files for benchmarking
+
+Rows use valid bag queues for the pc number and real encoded fumens whose
+comments hold the used pieces, so SavesReader reads them like sfinder output
+when the setup is given without a leftover (ex: percent -pc 2).
+
+Usage: python benchmarks/generate_path.py <output> [--rows N] [--fumens N] [--unused N] [--hold N] [--pc-num N]
+'''
+import argparse
+import csv
+import random
+import sys
+from collections import Counter
+from itertools import combinations
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from lib.constants import BAG, DEFAULT_WIDTH, DEFAULT_HEIGHT
+from lib.formulas import PCNUM2LONUM, WIDTHHEIGHT2NUMPIECES
+from lib.saves_reader import COLUMN_QUEUE, COLUMN_FUMEN_COUNT, COLUMN_USED_PIECES, COLUMN_UNUSED_PIECES, COLUMN_FUMENS, COLUMN_UNUSED_PIECES_DELIMITOR, COLUMN_FUMENS_DELIMITOR
+from lib.utils import sort_queue
+
+PATH_COLUMNS = [COLUMN_QUEUE, COLUMN_FUMEN_COUNT, COLUMN_USED_PIECES, COLUMN_UNUSED_PIECES, COLUMN_FUMENS]
+
+DEFAULT_ROWS = 5040
+DEFAULT_FUMENS = 8
+DEFAULT_UNUSED = 3
+DEFAULT_POOL = 6
+DEFAULT_FAIL_RATE = 0.05
+
+class FumenPool:
+  '''
+  Pool of fumens for each set of used pieces so fumens repeat across rows as in sfinder output
+  '''
+  def __init__(self, rng: random.Random, pool_size: int):
+    self.rng = rng
+    self.pool_size = pool_size
+    self.pools: dict[str, list[str]] = {}
+
+  def _make_fumen(self, used: str) -> str:
+    import py_fumen_py as pf
+
+    # setup pieces are gray and the used pieces fill the rest of the field
+    num_cells = DEFAULT_WIDTH * DEFAULT_HEIGHT
+    cells = ['X'] * (num_cells - len(used) * 4) + [piece for piece in used for _ in range(4)]
+    self.rng.shuffle(cells)
+    lines = [''.join(cells[i:i + DEFAULT_WIDTH]) for i in range(0, num_cells, DEFAULT_WIDTH)]
+
+    page = pf.Page(field=pf.Field(field='\n'.join(lines)), comment=used, flags=pf.Flags())
+    return pf.encode([page])
+
+  def get(self, used: str, count: int) -> list[str]:
+    pool = self.pools.setdefault(used, [])
+    while len(pool) < self.pool_size:
+      pool.append(self._make_fumen(used))
+    return self.rng.sample(pool, min(count, len(pool)))
+
+def random_queue(rng: random.Random, length: int) -> str:
+  '''
+  Queue of the pieces after the leftover that follows the 7 bag randomizer
+  '''
+  queue = ''
+  while len(queue) < length:
+    bag = list(BAG)
+    rng.shuffle(bag)
+    queue += ''.join(bag)
+  return queue[:length]
+
+def generate_path_file(
+  filepath: str,
+  rows: int = DEFAULT_ROWS,
+  fumens_per_row: int = DEFAULT_FUMENS,
+  unused_pieces: int = DEFAULT_UNUSED,
+  hold: int = 1,
+  pc_num: int = 2,
+  fail_rate: float = DEFAULT_FAIL_RATE,
+  pool_size: int = DEFAULT_POOL,
+  seed: int = 0
+):
+  '''
+  Write a synthetic path file
+
+  Parameter:
+      filepath (str): path of the file to write
+      rows (int): number of queues
+      fumens_per_row (int): max number of fumens for a solveable queue
+      unused_pieces (int): max number of distinct unused pieces options for a solveable queue
+      hold (int): number of hold, also the number of pieces unused in each solve
+      pc_num (int): pc number that determines the length of the queue
+      fail_rate (float): chance a queue has no solution
+      pool_size (int): number of distinct fumens for each set of used pieces
+      seed (int): seed of the random generator
+  '''
+  rng = random.Random(seed)
+  fumen_pool = FumenPool(rng, pool_size)
+
+  leftover_length = PCNUM2LONUM(pc_num)
+  queue_length = WIDTHHEIGHT2NUMPIECES(DEFAULT_WIDTH, DEFAULT_HEIGHT, hold) - leftover_length
+
+  with open(filepath, 'w', encoding="utf-8", newline='') as outfile:
+    writer = csv.DictWriter(outfile, PATH_COLUMNS)
+    writer.writeheader()
+
+    for _ in range(rows):
+      queue = random_queue(rng, queue_length)
+
+      if rng.random() < fail_rate:
+        writer.writerow({COLUMN_QUEUE: queue, COLUMN_FUMEN_COUNT: 0, COLUMN_USED_PIECES: '', COLUMN_UNUSED_PIECES: '', COLUMN_FUMENS: ''})
+        continue
+
+      # options of pieces left unused by a solve
+      options = sorted({sort_queue(''.join(c)) for c in combinations(queue, hold)})
+      options = rng.sample(options, min(unused_pieces, len(options)))
+
+      used_pieces = []
+      fumens = []
+      for i, unused in enumerate(options):
+        used = sort_queue(''.join((Counter(queue) - Counter(unused)).elements()))
+        # spread the fumens over the options with each having at least one
+        count = max(1, fumens_per_row // len(options) + (i < fumens_per_row % len(options)))
+        used_pieces.append(used)
+        fumens += fumen_pool.get(used, count)
+
+      writer.writerow({
+        COLUMN_QUEUE: queue,
+        COLUMN_FUMEN_COUNT: len(fumens),
+        COLUMN_USED_PIECES: COLUMN_UNUSED_PIECES_DELIMITOR.join(used_pieces),
+        COLUMN_UNUSED_PIECES: COLUMN_UNUSED_PIECES_DELIMITOR.join(options),
+        COLUMN_FUMENS: COLUMN_FUMENS_DELIMITOR.join(fumens),
+      })
+
+def add_size_arguments(parser: argparse.ArgumentParser):
+  parser.add_argument("-r", "--rows", help=f"number of queues (default: {DEFAULT_ROWS})", metavar="<int>", type=int, default=DEFAULT_ROWS)
+  parser.add_argument("-fu", "--fumens", help=f"max fumens for each queue (default: {DEFAULT_FUMENS})", metavar="<int>", type=int, default=DEFAULT_FUMENS)
+  parser.add_argument("-u", "--unused", help=f"max unused pieces options for each queue (default: {DEFAULT_UNUSED})", metavar="<int>", type=int, default=DEFAULT_UNUSED)
+  parser.add_argument("-ho", "--hold", help="number of hold (default: 1)", metavar="<int>", type=int, default=1)
+  parser.add_argument("-pc", "--pc-num", help="pc number for setup (default: 2)", metavar="<int>", type=int, default=2)
+  parser.add_argument("-fr", "--fail-rate", help=f"chance a queue has no solution (default: {DEFAULT_FAIL_RATE})", metavar="<float>", type=float, default=DEFAULT_FAIL_RATE)
+  parser.add_argument("-po", "--pool", help=f"distinct fumens for each set of used pieces (default: {DEFAULT_POOL})", metavar="<int>", type=int, default=DEFAULT_POOL)
+  parser.add_argument("-se", "--seed", help="seed of the random generator (default: 0)", metavar="<int>", type=int, default=0)
+
+def generate_from_args(filepath: str, args: argparse.Namespace):
+  generate_path_file(filepath, args.rows, args.fumens, args.unused, args.hold, args.pc_num, args.fail_rate, args.pool, args.seed)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Generate a synthetic path file")
+  parser.add_argument("output", help="filepath to write the path file to")
+  add_size_arguments(parser)
+  args = parser.parse_args()
+  generate_from_args(args.output, args)
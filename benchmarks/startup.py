@@ -0,0 +1,84 @@
+'''
+Startup benchmark for sfinder-saves.py
+
+Measures the time to import the argument parser and the wall time of --help,
+and fails if either goes over its budget or if a lazily loaded module got
+imported eagerly.
+
+Usage: python benchmarks/startup.py [--repeat N] [--import-budget MS] [--help-budget MS]
+'''
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from os import path
+
+PROJ_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+SCRIPT = path.join(PROJ_DIR, "sfinder-saves.py")
+
+# budgets in milliseconds for the median run
+IMPORT_BUDGET_MS = 50
+HELP_BUDGET_MS = 150
+DEFAULT_REPEAT = 10
+
+# modules that should only be loaded when a code path needs them
+LAZY_MODULES = [
+  "py_fumen_py", "lib.percent", "lib.filter", "lib.minimal", "lib.saves_reader", "lib.selection", "lib.archive",
+  "lib.prefix_index", "lib.chain", "lib.expression_plan", "lib.profiler", "lib.shortener", "gzip",
+]
+
+IMPORT_SNIPPET = f'''
+import json, sys, time
+start = time.perf_counter()
+import lib.argument_parser
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+  "import_ms": elapsed * 1000,
+  "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules],
+}}))
+'''
+
+def time_import() -> dict:
+  result = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=PROJ_DIR, capture_output=True, text=True, check=True)
+  return json.loads(result.stdout)
+
+def time_help() -> float:
+  start = time.perf_counter()
+  subprocess.run([sys.executable, SCRIPT, "--help"], cwd=PROJ_DIR, capture_output=True, check=True)
+  return (time.perf_counter() - start) * 1000
+
+def main() -> int:
+  parser = argparse.ArgumentParser(description="Benchmark the startup time of sfinder-saves.py")
+  parser.add_argument("-r", "--repeat", help=f"number of runs to take the median of (default: {DEFAULT_REPEAT})", type=int, default=DEFAULT_REPEAT)
+  parser.add_argument("-ib", "--import-budget", help=f"budget in ms for importing the argument parser (default: {IMPORT_BUDGET_MS})", type=float, default=IMPORT_BUDGET_MS)
+  parser.add_argument("-hb", "--help-budget", help=f"budget in ms for running --help (default: {HELP_BUDGET_MS})", type=float, default=HELP_BUDGET_MS)
+  args = parser.parse_args()
+
+  imports = [time_import() for _ in range(args.repeat)]
+  helps = [time_help() for _ in range(args.repeat)]
+
+  import_ms = statistics.median(run["import_ms"] for run in imports)
+  help_ms = statistics.median(helps)
+  loaded = sorted({module for run in imports for module in run["loaded"]})
+
+  failed = False
+  print(f"import lib.argument_parser: {import_ms:.1f}ms (budget {args.import_budget:.0f}ms)")
+  if import_ms > args.import_budget:
+    print("   over budget")
+    failed = True
+
+  print(f"sfinder-saves.py --help: {help_ms:.1f}ms (budget {args.help_budget:.0f}ms)")
+  if help_ms > args.help_budget:
+    print("   over budget")
+    failed = True
+
+  if loaded:
+    print(f"Eagerly loaded modules: {', '.join(loaded)}")
+    failed = True
+
+  return 1 if failed else 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,211 @@
+import csv
+import io
+import json
+import struct
+import sys
+import zlib
+from array import array
+from typing import Iterable, Iterator
+from .constants import BAG
+from .saves_reader import COLUMN_QUEUE, COLUMN_FUMENS, COLUMN_FUMENS_DELIMITOR
+
+# start of every archive, which a path file can't start with since its header is text
+ARCHIVE_MAGIC = b"\x00PCSAVES"
+ARCHIVE_VERSION = 1
+ARCHIVE_SUFFIX = ".archive"
+
+PIECE_DIGITS = {piece: digit for digit, piece in enumerate(BAG)}
+# longest queue whose base 7 code still fits in the 64 bits stored for each row
+MAX_QUEUE_LENGTH = 22
+
+def default_archive_path(filepath: str) -> str:
+  return filepath + ARCHIVE_SUFFIX
+
+def is_archive(filepath: str) -> bool:
+  with open(filepath, 'rb') as infile:
+    return infile.read(len(ARCHIVE_MAGIC)) == ARCHIVE_MAGIC
+
+def encode_queue(queue: str) -> int:
+  '''
+  Queue as a base 7 integer with the first piece as the most significant digit
+  '''
+  if len(queue) > MAX_QUEUE_LENGTH:
+    raise ValueError(f"Found {queue} in path.csv, but queues can only have up to {MAX_QUEUE_LENGTH} pieces to be archived")
+  code = 0
+  for piece in queue:
+    if piece not in PIECE_DIGITS:
+      raise ValueError(f"Found {queue} in path.csv, but queues can only have the pieces {BAG} to be archived")
+    code = code * 7 + PIECE_DIGITS[piece]
+  return code
+
+def decode_queue(code: int, length: int) -> str:
+  pieces = [''] * length
+  for i in range(length - 1, -1, -1):
+    code, digit = divmod(code, 7)
+    pieces[i] = BAG[digit]
+  return ''.join(pieces)
+
+def _to_bytes(values: array) -> bytes:
+  # arrays are stored little endian regardless of the machine
+  if sys.byteorder == "big":
+    values = array(values.typecode, values)
+    values.byteswap()
+  return values.tobytes()
+
+def _from_bytes(typecode: str, data: memoryview) -> array:
+  values = array(typecode)
+  values.frombytes(data)
+  if sys.byteorder == "big":
+    values.byteswap()
+  return values
+
+class _Dictionary:
+  def __init__(self):
+    self.ids: dict[str, int] = {}
+    self.values: list[str] = []
+
+  def id(self, value: str) -> int:
+    value_id = self.ids.get(value)
+    if value_id is None:
+      value_id = self.ids[value] = len(self.values)
+      self.values.append(value)
+    return value_id
+
+def write_archive(filepath: str, output_path: str) -> tuple[int, int]:
+  '''
+  Convert the path file into an archive with each fumen and each value of the other columns stored once
+
+  Rows are stored by column with the queues as base 7 integers, the fumens of each row as ids into the table of fumens,
+  and every other column as ids into a table of the values of the column.
+
+  Return:
+      tuple[int, int]: number of rows and number of distinct fumens
+  '''
+  with open(filepath, 'r', encoding="utf-8-sig", newline='') as infile:
+    reader = csv.DictReader(infile)
+    fieldnames = list(reader.fieldnames or [])
+    if COLUMN_QUEUE not in fieldnames or COLUMN_FUMENS not in fieldnames:
+      missing = {COLUMN_QUEUE, COLUMN_FUMENS} - set(fieldnames)
+      raise ValueError(f"Missing required columns: {', '.join(missing)}. Columns found instead: {', '.join(fieldnames)}")
+    other_columns = [name for name in fieldnames if name not in (COLUMN_QUEUE, COLUMN_FUMENS)]
+
+    fumens = _Dictionary()
+    dictionaries = [_Dictionary() for _ in other_columns]
+    queue_lengths = array('B')
+    queue_codes = array('Q')
+    column_ids = [array('I') for _ in other_columns]
+    fumen_offsets = array('I', [0])
+    fumen_ids = array('I')
+
+    for row in reader:
+      queue = row[COLUMN_QUEUE] or ''
+      queue_lengths.append(len(queue))
+      queue_codes.append(encode_queue(queue))
+
+      for ids, dictionary, name in zip(column_ids, dictionaries, other_columns):
+        ids.append(dictionary.id(row[name] or ''))
+
+      # unsolveable rows have no fumens rather than an empty fumen
+      if row[COLUMN_FUMENS]:
+        fumen_ids.extend(fumens.id(fumen) for fumen in row[COLUMN_FUMENS].split(COLUMN_FUMENS_DELIMITOR))
+      fumen_offsets.append(len(fumen_ids))
+
+  header = json.dumps({
+    "version": ARCHIVE_VERSION,
+    "fieldnames": fieldnames,
+    "rows": len(queue_lengths),
+    "fumen_ids": len(fumen_ids),
+    "fumens": fumens.values,
+    "columns": {name: dictionary.values for name, dictionary in zip(other_columns, dictionaries)},
+  }, ensure_ascii=False).encode("utf-8")
+
+  compressor = zlib.compressobj(9)
+  with open(output_path, 'wb') as outfile:
+    outfile.write(ARCHIVE_MAGIC)
+    outfile.write(compressor.compress(struct.pack("<I", len(header)) + header))
+    for values in (queue_lengths, queue_codes, *column_ids, fumen_offsets, fumen_ids):
+      outfile.write(compressor.compress(_to_bytes(values)))
+    outfile.write(compressor.flush())
+
+  return len(queue_lengths), len(fumens.values)
+
+class PathArchive:
+  '''
+  Rows of an archived path file, given as the same rows as reading the path file
+  '''
+  def __init__(self, filepath: str):
+    with open(filepath, 'rb') as infile:
+      if infile.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+        raise ValueError(f"{filepath} is not an archive")
+      data = memoryview(zlib.decompress(infile.read()))
+
+    header_size, = struct.unpack_from("<I", data)
+    header = json.loads(bytes(data[4:4 + header_size]).decode("utf-8"))
+    if header.get("version") != ARCHIVE_VERSION:
+      raise ValueError(f"{filepath} is an archive made by a different version")
+
+    self.fieldnames: list[str] = header["fieldnames"]
+    self.num_rows: int = header["rows"]
+    self.fumens: list[str] = header["fumens"]
+    self.other_columns: list[str] = list(header["columns"])
+    self.column_values: list[list[str]] = [header["columns"][name] for name in self.other_columns]
+
+    offset = 4 + header_size
+    def take(typecode: str, count: int) -> array:
+      nonlocal offset
+      size = array(typecode).itemsize * count
+      values = _from_bytes(typecode, data[offset:offset + size])
+      offset += size
+      return values
+
+    self.queue_lengths = take('B', self.num_rows)
+    self.queue_codes = take('Q', self.num_rows)
+    self.column_ids = [take('I', self.num_rows) for _ in self.other_columns]
+    self.fumen_offsets = take('I', self.num_rows + 1)
+    self.fumen_ids = take('I', header["fumen_ids"])
+
+  def queue(self, index: int) -> str:
+    return decode_queue(self.queue_codes[index], self.queue_lengths[index])
+
+  def queues(self) -> Iterator[str]:
+    for code, length in zip(self.queue_codes, self.queue_lengths):
+      yield decode_queue(code, length)
+
+  def row(self, index: int) -> dict[str, str]:
+    '''
+    Row at the index after the header as read from the path file
+    '''
+    row = {name: values[ids[index]] for name, values, ids in zip(self.other_columns, self.column_values, self.column_ids)}
+    row[COLUMN_QUEUE] = self.queue(index)
+    fumens = self.fumens
+    row[COLUMN_FUMENS] = COLUMN_FUMENS_DELIMITOR.join([fumens[i] for i in self.fumen_ids[self.fumen_offsets[index]:self.fumen_offsets[index + 1]]])
+    return row
+
+  def rows(self, indicies: Iterable[int] | None = None) -> Iterator[dict[str, str]]:
+    for index in range(self.num_rows) if indicies is None else indicies:
+      yield self.row(index)
+
+  def csv_lines(self) -> Iterator[bytes]:
+    '''
+    Rows as lines of a path file after the header
+    '''
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, self.fieldnames, lineterminator='\n')
+    for row in self.rows():
+      writer.writerow(row)
+      yield buffer.getvalue().encode("utf-8")
+      buffer.seek(0)
+      buffer.truncate()
+
+def extract_archive(filepath: str, output_path: str) -> int:
+  '''
+  Write the rows of the archive back into a path file
+
+  Return:
+      int: number of rows
+  '''
+  archive = PathArchive(filepath)
+  with open(output_path, 'wb') as outfile:
+    outfile.write((','.join(archive.fieldnames) + '\n').encode("utf-8"))
+    outfile.writelines(archive.csv_lines())
+  return archive.num_rows
@@ -1,11 +1,34 @@
+import io
 import argparse
+import contextlib
 import json
+import os
 from collections import Counter
 from .constants import (
   DEFAULT_SAVES_JSON, 
   DEFAULT_PATH_FILE, 
   DEFAULT_LAST_OUTPUT_FILE, 
   DEFAULT_FILTERED_PATH_FILE, 
+  DEFAULT_FILTER_OUTPUT_DIR,
+  DEFAULT_BATCH_OUTPUT_FILE,
+  DEFAULT_DIFF_FILE,
+  DEFAULT_LATTICE_FILE,
+  DEFAULT_TINYURL_CACHE_FILE,
+  DEFAULT_SELECTION_FILE,
+  DEFAULT_RESULT_CACHE_DIR,
+  DEFAULT_RESULT_CACHE_SIZE_MB,
+  PROFILE_SUFFIX,
+  PREFIX_INDEX_SUFFIX,
+  SAVE_TABLE_SUFFIX,
+  DEFAULT_INDEX_DEPTH,
+  DEFAULT_PLAN_ROWS,
+  TINYURL_API,
+  DEFAULT_SHORTENER_TIMEOUT,
+  DEFAULT_SHORTENER_CONCURRENCY,
+  EXACT_ORDER_MAX_SOLVES,
+  BEST_SET_SCORES,
+  COVER_SOLVER_BUILTIN,
+  COVER_SOLVER_CHOICES,
   WANTED_SAVE_COMMENT_DELIMITOR, 
   WANTED_SAVE_DELIMITOR, 
   DEFAULT_WIDTH,
@@ -13,9 +36,8 @@ from .constants import (
   DEFAULT_HOLD
 )
 from .formulas import PCNUM2LONUM
-from .percent import percent
-from .filter import filter
-from .utils import is_queue
+from .utils import is_queue, sort_queue
+from os import path
 
 def parse_wanted_saves(raw_keys: list[str], raw_wanted_saves: list[str], saves_path: str) -> tuple[list[str], list[str]]:
   # get the wanted saves
@@ -124,10 +146,83 @@ def parse_leftover_build(leftover, leftover_length, build, pc_num, hold) -> tupl
 
   return leftover, build
 
+def parse_sweep_configs(raw_configs: list[str], leftover_length: int | None, pc_num: int | None, hold: int):
+  '''
+  Parse each configuration of leftover and build, keeping why a configuration is invalid instead of exiting
+  '''
+  from .sweep import SweepConfig, SWEEP_CONFIG_DELIMITOR
+
+  configs = []
+  for raw_config in raw_configs:
+    leftover, _, build = raw_config.partition(SWEEP_CONFIG_DELIMITOR)
+    config = SweepConfig(raw_config)
+    message = io.StringIO()
+    try:
+      with contextlib.redirect_stdout(message):
+        config.leftover, config.build = parse_leftover_build(leftover, leftover_length, build or None, pc_num, hold)
+    except SystemExit:
+      config.error = message.getvalue().strip()
+    configs.append(config)
+  return configs
+
+def parse_percentage(text: str) -> float:
+  '''
+  Parse a percentage with or without the % sign (ex: 0.5% or 0.5)
+  '''
+  try:
+    return float(text.rstrip('%'))
+  except ValueError:
+    raise argparse.ArgumentTypeError(f"Expected a percentage but got {text}")
+
+def make_shortener(args):
+  from .shortener import Shortener
+  return Shortener(args.tinyurl_api, args.tinyurl_cache or None, args.tinyurl_timeout, args.tinyurl_concurrency)
+
+def make_result_cache(args):
+  '''
+  Cache of the results of percent and filter, or None if the cache is turned off with an empty directory
+  '''
+  if not args.result_cache:
+    return None
+
+  from .result_cache import ResultCache
+  return ResultCache(args.result_cache, args.result_cache_size << 20)
+
+def load_selection(selection_path: str | None):
+  '''
+  Load the selection of rows to read, exiting if it isn't a selection
+  '''
+  if selection_path is None:
+    return None
+
+  from .selection import RowSelection
+  try:
+    return RowSelection.load(selection_path)
+  except (ValueError, OSError) as e:
+    print(e)
+    exit(0)
+
+def make_profiler(args):
+  from .profiler import Profiler, NULL_PROFILER
+  return Profiler() if args.profile else NULL_PROFILER
+
+def write_profile(profiler, args, command: str):
+  if not profiler.enabled:
+    return
+
+  profile_path = args.profile_path
+  if profile_path is None:
+    # report next to the log file
+    profile_path = path.splitext(args.log_path)[0] + PROFILE_SUFFIX
+  profiler.write(profile_path, command)
+
 def parse_percent_args(args):
   '''
   Parse the arguments for percent subcommand to pass to run calculation of save percent
   '''
+  # subcommand modules are only loaded when the subcommand runs to keep startup fast
+  from .percent import percent, open_fails_file
+
   if not (args.key or args.wanted_saves or args.all):
     print("Expected -k, -w, or -a to be set")
     exit(0)
@@ -137,35 +232,180 @@ def parse_percent_args(args):
     print("Width and height does not produce an area divisible by 4 necessary for a PC")
     exit(0)
 
+  if args.lattice and (args.all or args.best_save or args.tree_depth or args.fails):
+    print("Lattice can't be used with -a, -bs, -td, nor -fa")
+    exit(0)
+
+  if args.approx and (args.all or args.tree_depth or args.fails or args.lattice):
+    print("Approx can't be used with -a, -td, -fa, nor -lt")
+    exit(0)
+
+  if args.given_prefix and (args.approx or args.lattice):
+    print("Given prefix can't be used with -ap nor -lt")
+    exit(0)
+
+  if args.given_prefix and not is_queue(args.given_prefix):
+    print("Given prefix expected to contain only TILJSZO pieces")
+    exit(0)
+
+  if args.fails_path and not args.fails:
+    print("Fails path requires -fa")
+    exit(0)
+
+  if args.group_by and (args.all or args.approx or args.lattice or args.follow):
+    print("Group by can't be used with -a, -ap, -lt, nor -fo")
+    exit(0)
+
+  if args.follow and (args.all or args.approx or args.lattice or args.given_prefix):
+    print("Follow can't be used with -a, -ap, -lt, nor -gp")
+    exit(0)
+
+  # the log is written over on each run so the fails found before resuming are only kept in the fails file
+  if args.follow and args.fails and not args.fails_path:
+    print("Follow with -fa requires -fap")
+    exit(0)
+
+  if args.selection and (args.approx or args.lattice or args.given_prefix or args.follow):
+    print("Selection can't be used with -ap, -lt, -gp, nor -fo")
+    exit(0)
+
+  if args.approx and not (0 < args.confidence < 1):
+    print("Confidence expected to be between 0 and 1")
+    exit(0)
+
+  if args.explain and (args.all or args.approx or args.lattice or args.follow or args.sweep):
+    print("Explain can't be used with -a, -ap, -lt, -fo, nor -sw")
+    exit(0)
+
+  if args.plan_rows < 0:
+    print("Plan rows can't be negative")
+    exit(0)
+
+  if args.sweep:
+    if args.all or args.approx or args.lattice or args.given_prefix or args.follow or args.fails or args.group_by:
+      print("Sweep can't be used with -a, -ap, -lt, -gp, -fo, -fa, nor -gb")
+      exit(0)
+    if args.leftover or args.build:
+      print("Sweep takes the leftover and build of each configuration instead of -l and -b")
+      exit(0)
+    if args.pc_num is None and args.leftover_length is None:
+      print("Either -pc or -ll must be set")
+      exit(0)
+
+    from .sweep import sweep_percent
+
+    configs = parse_sweep_configs(args.sweep, args.leftover_length, args.pc_num, args.hold)
+    selection = load_selection(args.selection)
+    profiler = make_profiler(args)
+    wanted_saves, labels = parse_wanted_saves(args.key, args.wanted_saves, args.saves_path)
+    log_file = open(args.log_path, 'w', encoding="utf8")
+    try:
+      sweep_percent(args.path_file, wanted_saves, labels, configs, args.width, args.height, args.hold, log_file, not args.no_print, args.over_solves, args.best_save, args.tree_depth, profiler, args.mirror, selection)
+    except ValueError as e:
+      print(e)
+    log_file.close()
+    write_profile(profiler, args, "percent")
+    return
+
   leftover, build = parse_leftover_build(args.leftover, args.leftover_length, args.build, args.pc_num, args.hold)
 
+  selection = load_selection(args.selection)
+
+  profiler = make_profiler(args)
   log_file = open(args.log_path, 'w', encoding="utf8")
   try:
+    if args.approx:
+      from .percent import approx_percent
+
+      wanted_saves, labels = parse_wanted_saves(args.key, args.wanted_saves, args.saves_path)
+      approx_percent(args.path_file, wanted_saves, labels, leftover, build, args.width, args.height, args.hold, log_file, not args.no_print, args.over_solves, args.best_save, args.target_error, args.confidence, args.seed, profiler, args.mirror)
+      log_file.close()
+      write_profile(profiler, args, "percent")
+      return
+
+    if args.follow:
+      from .follow import follow_percent, CHECKPOINT_SUFFIX
+
+      wanted_saves, labels = parse_wanted_saves(args.key, args.wanted_saves, args.saves_path)
+      checkpoint_path = args.checkpoint_path
+      if checkpoint_path is None:
+        # checkpoint next to the log file
+        checkpoint_path = path.splitext(args.log_path)[0] + CHECKPOINT_SUFFIX
+      follow_percent(args.path_file, wanted_saves, labels, leftover, build, args.width, args.height, args.hold, log_file, checkpoint_path, not args.no_print, args.fails, args.over_solves, args.best_save, args.tree_depth, args.interval, args.idle_timeout, profiler, args.mirror, args.fails_path or '')
+      log_file.close()
+      write_profile(profiler, args, "percent")
+      return
+
+    if args.lattice:
+      from .lattice import lattice_percent
+
+      wanted_saves, labels = parse_wanted_saves(args.key, args.wanted_saves, args.saves_path)
+      lattice_percent(args.path_file, args.lattice_path, wanted_saves, labels, leftover, build, args.width, args.height, args.hold, log_file, not args.no_print, args.over_solves, profiler, args.mirror)
+      log_file.close()
+      write_profile(profiler, args, "percent")
+      return
+
     if args.all:
-      percent(args.path_file, [], [], leftover, build, args.width, args.height, args.hold, log_file, not args.no_print, args.fails, args.over_solves, args.all)
+      percent(args.path_file, [], [], leftover, build, args.width, args.height, args.hold, log_file, not args.no_print, args.fails, args.over_solves, args.all, profiler=profiler, given_prefix=args.given_prefix, index_path=args.index_path, index_depth=args.index_depth, mirror=args.mirror, selection=selection, result_cache=make_result_cache(args))
       log_file.close()
+      write_profile(profiler, args, "percent")
       return
 
     wanted_saves, labels = parse_wanted_saves(args.key, args.wanted_saves, args.saves_path)
 
+    fails_file = open_fails_file(args.fails_path) if args.fails_path else None
+
     if args.best_save:
-      percent(args.path_file, wanted_saves, labels, leftover, build, args.width, args.height, args.hold, log_file, not args.no_print, args.fails, args.over_solves, False, args.tree_depth)
+      percent(args.path_file, wanted_saves, labels, leftover, build, args.width, args.height, args.hold, log_file, not args.no_print, args.fails, args.over_solves, False, args.tree_depth, profiler, args.given_prefix, args.index_path, args.index_depth, args.group_by, fails_file, args.fails_path, args.mirror, selection, make_result_cache(args), args.plan_rows, args.explain)
     else:
       for wanted_save, label in zip(wanted_saves, labels):
-        percent(args.path_file, [wanted_save], [label], leftover, build, args.width, args.height, args.hold, log_file, not args.no_print, args.fails, args.over_solves, False, args.tree_depth)
+        percent(args.path_file, [wanted_save], [label], leftover, build, args.width, args.height, args.hold, log_file, not args.no_print, args.fails, args.over_solves, False, args.tree_depth, profiler, args.given_prefix, args.index_path, args.index_depth, args.group_by, fails_file, args.fails_path, args.mirror, selection, make_result_cache(args), args.plan_rows, args.explain)
+
+    if fails_file is not None:
+      fails_file.close()
   except ValueError as e:
     print(e)
 
   log_file.close()
+  write_profile(profiler, args, "percent")
 
 def parse_filter_args(args):
   '''
   Parse the arguments for filter subcommand to pass to filter out path file
   '''
+  from .filter import filter, filter_all_expressions
+
   if not (args.key or args.wanted_saves):
     print("Expected -k or -w to be set")
     exit(0)
 
+  if args.all_expressions and args.best_save:
+    print("All expressions can't be used with -bs")
+    exit(0)
+
+  if args.jobs < 1:
+    print("Jobs must be at least 1")
+    exit(0)
+
+  if args.chunk_pages < 0:
+    print("Chunk pages can't be negative")
+    exit(0)
+
+  selection = load_selection(args.selection)
+
+  if args.best_set_score == "ranking" and args.ranking_path is None:
+    print("Ranking best set score requires -rp to be set")
+    exit(0)
+
+  if args.cover_export:
+    from .cover_solver import COVER_FORMATS
+    if args.all_expressions:
+      print("Cover export can't be used with -ae")
+      exit(0)
+    if path.splitext(args.cover_export)[1].lower() not in COVER_FORMATS:
+      print(f"Cover export expected a filepath ending with one of {', '.join(COVER_FORMATS)}")
+      exit(0)
+
   # valid dimensions to do a PC
   if (args.width * args.height) % 4 != 0:
     print("Width and height does not produce an area divisible by 4 necessary for a PC")
@@ -173,21 +413,319 @@ def parse_filter_args(args):
 
   leftover, build = parse_leftover_build(args.leftover, args.leftover_length, args.build, args.pc_num, args.hold)
 
+  profiler = make_profiler(args)
   log_file = open(args.log_path, 'w', encoding="utf8")
   wanted_saves, labels = parse_wanted_saves(args.key, args.wanted_saves, args.saves_path)
   
   try:
-    if args.best_save:
-      filter(args.path_file, wanted_saves, labels, leftover, build, args.width, args.height, args.hold, log_file, not args.no_print, args.cumulative, args.solve, args.filtered_path, args.tinyurl)
+    if args.all_expressions:
+      os.makedirs(args.output_dir, exist_ok=True)
+      filter_all_expressions(args.path_file, wanted_saves, labels, leftover, build, args.width, args.height, args.hold, log_file, args.output_dir, not args.no_print, args.cumulative, args.solve, args.tinyurl, args.jobs, profiler, args.mirror, args.exact_order, args.best_set_score, args.ranking_path, make_shortener(args), args.chunk_pages, selection, args.cover_solver)
+    elif args.best_save:
+      filter(args.path_file, wanted_saves, labels, leftover, build, args.width, args.height, args.hold, log_file, not args.no_print, args.cumulative, args.solve, args.selection_output if args.solve == "selection" else args.filtered_path, args.tinyurl, profiler, args.mirror, args.exact_order, args.best_set_score, args.ranking_path, make_shortener(args), args.chunk_pages, selection, make_result_cache(args), args.cover_solver, args.cover_export or None)
     else:
       if args.index < -len(wanted_saves) or args.index >= len(wanted_saves):
         print(f"Index out of bounds for wanted saves")
 
-      filter(args.path_file, [wanted_saves[args.index]], [labels[args.index]], leftover, build, args.width, args.height, args.hold, log_file, not args.no_print, args.cumulative, args.solve, args.filtered_path, args.tinyurl)
+      filter(args.path_file, [wanted_saves[args.index]], [labels[args.index]], leftover, build, args.width, args.height, args.hold, log_file, not args.no_print, args.cumulative, args.solve, args.selection_output if args.solve == "selection" else args.filtered_path, args.tinyurl, profiler, args.mirror, args.exact_order, args.best_set_score, args.ranking_path, make_shortener(args), args.chunk_pages, selection, make_result_cache(args), args.cover_solver, args.cover_export or None)
   except ValueError as e:
     print(e)
 
   log_file.close()
+  write_profile(profiler, args, "filter")
+
+# options of percent and filter that don't apply to a job in a batch
+BATCH_EXCLUDED_OPTIONS = {
+  "func", "log_path", "no_print", "profile", "profile_path", "filtered_path", "fails_path", "group_by",
+  "lattice", "lattice_path", "given_prefix", "index_depth", "index_path",
+  "approx", "target_error", "confidence", "seed",
+  "follow", "interval", "idle_timeout", "checkpoint_path",
+  "all_expressions", "output_dir", "jobs", "sweep", "plan_rows", "explain",
+  "tinyurl_api", "tinyurl_cache", "tinyurl_timeout", "tinyurl_concurrency",
+  "selection", "selection_output", "result_cache", "result_cache_size", "cover_export",
+}
+
+def parse_batch_job(raw_job: dict, index: int, defaults: dict, manifest_dir: str):
+  '''
+  Parse a job of the batch manifest into the job and the key of the group it reads with
+  '''
+  from .batch import BatchJob
+
+  options = {**defaults, **raw_job}
+  job_id = str(options.pop("id", index))
+  command = options.pop("command", None)
+  subparsers = {"percent": percent_parser, "filter": filter_parser}
+  if command not in subparsers:
+    print(f"Job {job_id} expected command to be one of {', '.join(subparsers)}")
+    exit(0)
+
+  # start from the defaults of the subcommand
+  args = subparsers[command].parse_args([])
+  for option, value in options.items():
+    if option not in vars(args) or option in BATCH_EXCLUDED_OPTIONS:
+      print(f"Job {job_id} has unknown option {option} for {command} in a batch")
+      exit(0)
+    if option in ("wanted_saves", "key") and isinstance(value, str):
+      value = [value]
+    setattr(args, option, value)
+
+  if command == "percent" and not (args.key or args.wanted_saves or args.all):
+    print(f"Job {job_id} expected key, wanted_saves, or all to be set")
+    exit(0)
+  if command == "filter":
+    if not (args.key or args.wanted_saves):
+      print(f"Job {job_id} expected key or wanted_saves to be set")
+      exit(0)
+    if args.solve in ("file", "selection"):
+      print(f"Job {job_id} can't output a {args.solve} in a batch")
+      exit(0)
+
+  if (args.width * args.height) % 4 != 0:
+    print(f"Job {job_id} width and height does not produce an area divisible by 4 necessary for a PC")
+    exit(0)
+
+  try:
+    leftover, build = parse_leftover_build(args.leftover, args.leftover_length, args.build, args.pc_num, args.hold)
+  except SystemExit:
+    print(f"Job {job_id} has an invalid leftover or build")
+    raise
+
+  wanted_saves, labels = [], []
+  if command == "filter" or not args.all:
+    wanted_saves, labels = parse_wanted_saves(args.key, args.wanted_saves, args.saves_path)
+
+  if command == "filter" and not args.best_save:
+    if args.index < -len(wanted_saves) or args.index >= len(wanted_saves):
+      print(f"Job {job_id} index out of bounds for wanted saves")
+      exit(0)
+    wanted_saves, labels = [wanted_saves[args.index]], [labels[args.index]]
+
+  job = BatchJob(index, job_id, command, wanted_saves, labels, vars(args))
+  # relative paths are from the manifest
+  path_file = path.join(manifest_dir, args.path_file)
+  return job, (path.abspath(path_file), leftover, build, args.width, args.height, args.hold, args.mirror)
+
+def parse_batch_args(args):
+  '''
+  Parse the manifest for batch subcommand to run the jobs grouped by the path file they read
+  '''
+  from .batch import batch, group_jobs, write_batch_output
+
+  with open(args.manifest, 'r', encoding="utf8") as manifest_file:
+    manifest = json.load(manifest_file)
+
+  # either a list of jobs or an object with the jobs and the defaults of the jobs
+  if isinstance(manifest, list):
+    manifest = {"jobs": manifest}
+  defaults = manifest.get("defaults", {})
+  raw_jobs = manifest.get("jobs", [])
+
+  manifest_dir = path.dirname(path.abspath(args.manifest))
+  parsed_jobs = [parse_batch_job(raw_job, index, defaults, manifest_dir) for index, raw_job in enumerate(raw_jobs)]
+  jobs = [job for job, _ in parsed_jobs]
+  groups = group_jobs(parsed_jobs)
+
+  results = batch(groups, args.jobs, make_shortener(args))
+  write_batch_output(args.output, jobs, results)
+
+  if args.no_print:
+    return
+
+  for job in jobs:
+    result = results[job.index]
+    print(f"[{job.id}] {job.command}")
+    if "error" in result:
+      print(result["error"])
+    else:
+      print(result["output"].rstrip('\n'))
+  print(f"Ran {len(jobs)} jobs reading {len(groups)} path files")
+
+def parse_diff_args(args):
+  '''
+  Parse the arguments for diff subcommand to compare the saves of two setups on the same queues
+  '''
+  from .diff import diff, print_diff
+
+  if not (args.key or args.wanted_saves):
+    print("Expected -k or -w to be set")
+    exit(0)
+
+  if (args.width * args.height) % 4 != 0:
+    print("Width and height does not produce an area divisible by 4 necessary for a PC")
+    exit(0)
+
+  # one leftover or build is for both setups
+  raw_leftovers = args.leftover * 2 if len(args.leftover) == 1 else args.leftover
+  raw_builds = (args.build * 2 if len(args.build) == 1 else args.build) if args.build is not None else [None, None]
+  if len(raw_leftovers) != 2 or len(raw_builds) != 2:
+    print("Expected one -l and -b for both setups or one for each")
+    exit(0)
+
+  if args.chunk_rows < 1:
+    print("Chunk rows expected to be at least 1")
+    exit(0)
+
+  leftovers, builds = zip(*(parse_leftover_build(leftover, args.leftover_length, build, args.pc_num, args.hold) for leftover, build in zip(raw_leftovers, raw_builds)))
+  wanted_saves, labels = parse_wanted_saves(args.key, args.wanted_saves, args.saves_path)
+
+  profiler = make_profiler(args)
+  log_file = open(args.log_path, 'w', encoding="utf8")
+  diff_file = open(args.diff_path, 'w', encoding="utf8", newline='')
+  try:
+    result = diff(tuple(args.path_files), wanted_saves, labels, leftovers, builds, args.width, args.height, args.hold, diff_file, args.chunk_rows, profiler)
+    print_diff(result, log_file, not args.no_print, profiler)
+  except ValueError as e:
+    print(e)
+
+  diff_file.close()
+  log_file.close()
+  write_profile(profiler, args, "diff")
+
+# options of a setup in a chain manifest
+CHAIN_SETUP_OPTIONS = {"path_file", "leftover", "build", "pc_num", "leftover_length", "width", "height", "hold", "mirror", "save"}
+
+def parse_chain_setup(raw_setup: dict, stage_index: int, defaults: dict, manifest_dir: str):
+  '''
+  Parse a setup of a stage of the chain manifest
+  '''
+  from .chain import ChainSetup
+
+  options = {**defaults, **raw_setup}
+  for option in options:
+    if option not in CHAIN_SETUP_OPTIONS:
+      print(f"Stage {stage_index} has unknown option {option} for a setup")
+      exit(0)
+
+  width = options.get("width", DEFAULT_WIDTH)
+  height = options.get("height", DEFAULT_HEIGHT)
+  hold = options.get("hold", DEFAULT_HOLD)
+  if (width * height) % 4 != 0:
+    print(f"Stage {stage_index} width and height does not produce an area divisible by 4 necessary for a PC")
+    exit(0)
+
+  raw_leftover = options.get("leftover", '')
+  save = options.get("save")
+  if save is None:
+    # the save of the previous stage is the leftover of this setup
+    if not raw_leftover or not is_queue(raw_leftover):
+      print(f"Stage {stage_index} setup with leftover {raw_leftover or 'none'} expected a save with the pieces it is used for")
+      exit(0)
+    save = raw_leftover
+  if not is_queue(save):
+    print(f"Stage {stage_index} save expected to contain only TILJSZO pieces")
+    exit(0)
+
+  try:
+    leftover, build = parse_leftover_build(raw_leftover, options.get("leftover_length"), options.get("build"), options.get("pc_num"), hold)
+  except SystemExit:
+    print(f"Stage {stage_index} setup for {save} has an invalid leftover or build")
+    raise
+
+  # relative paths are from the manifest
+  path_file = path.join(manifest_dir, options.get("path_file", DEFAULT_PATH_FILE))
+  return ChainSetup(sort_queue(save), path_file, leftover, build, width, height, hold, options.get("mirror", False))
+
+def parse_combine_args(args):
+  '''
+  Parse the arguments for combine subcommand to combine selections of the same path file
+  '''
+  selections = [load_selection(selection_path) for selection_path in args.selections]
+
+  for index in args.negate or []:
+    if index < -len(selections) or index >= len(selections):
+      print(f"Index {index} out of bounds for selections")
+      exit(0)
+    selections[index] = ~selections[index]
+
+  try:
+    result = selections[0]
+    for selection in selections[1:]:
+      result = result & selection if args.operation == "and" else result | selection
+  except ValueError as e:
+    print(e)
+    exit(0)
+
+  result.save(args.output)
+
+  output = f"{result.expression}: {result.count()}/{result.rows} rows selected into {args.output}\n"
+  with open(args.log_path, 'w', encoding="utf8") as log_file:
+    log_file.write(output)
+  if not args.no_print: print(output, end='')
+
+def parse_archive_args(args):
+  '''
+  Parse the arguments for archive subcommand to convert a path file into an archive or back
+  '''
+  from .archive import write_archive, extract_archive, default_archive_path, ARCHIVE_SUFFIX
+
+  if args.extract:
+    output_path = args.output or (args.path_file.removesuffix(ARCHIVE_SUFFIX) if args.path_file.endswith(ARCHIVE_SUFFIX) else args.path_file + ".csv")
+  else:
+    output_path = args.output or default_archive_path(args.path_file)
+
+  if path.abspath(output_path) == path.abspath(args.path_file):
+    print("Output expected to be a different file than the path file")
+    exit(0)
+
+  try:
+    if args.extract:
+      num_rows = extract_archive(args.path_file, output_path)
+      output = f"Extracted {num_rows} rows"
+    else:
+      num_rows, num_fumens = write_archive(args.path_file, output_path)
+      output = f"Archived {num_rows} rows with {num_fumens} distinct fumens"
+  except (ValueError, OSError) as e:
+    print(e)
+    exit(0)
+
+  size, output_size = path.getsize(args.path_file), path.getsize(output_path)
+  output += f" into {output_path}: {size} -> {output_size} bytes ({size / max(output_size, 1):.2f}x)\n"
+  with open(args.log_path, 'w', encoding="utf8") as log_file:
+    log_file.write(output)
+  if not args.no_print: print(output, end='')
+
+def parse_chain_args(args):
+  '''
+  Parse the manifest for chain subcommand to give the chance of doing the PCs of the stages in order
+  '''
+  from .chain import chain, print_chain
+
+  with open(args.manifest, 'r', encoding="utf8") as manifest_file:
+    manifest = json.load(manifest_file)
+
+  # either a list of stages or an object with the stages and the defaults of the setups
+  if isinstance(manifest, list):
+    manifest = {"stages": manifest}
+  defaults = manifest.get("defaults", {})
+  raw_stages = manifest.get("stages", [])
+  if len(raw_stages) == 0:
+    print("Expected at least one stage in the manifest")
+    exit(0)
+
+  manifest_dir = path.dirname(path.abspath(args.manifest))
+  stages = []
+  for stage_index, raw_stage in enumerate(raw_stages, 1):
+    # a stage of only one setup can be the setup itself
+    if isinstance(raw_stage, dict):
+      raw_stage = [raw_stage]
+    stage = [parse_chain_setup(raw_setup, stage_index, defaults, manifest_dir) for raw_setup in raw_stage]
+
+    saves = [setup.save for setup in stage]
+    if len(set(saves)) != len(saves):
+      print(f"Stage {stage_index} has more than one setup for the same save")
+      exit(0)
+    stages.append(stage)
+
+  profiler = make_profiler(args)
+  log_file = open(args.log_path, 'w', encoding="utf8")
+  try:
+    results = chain(stages, not args.no_tables, profiler)
+    print_chain(results, log_file, not args.no_print)
+  except ValueError as e:
+    print(e)
+
+  log_file.close()
+  write_profile(profiler, args, "chain")
 
 arg_parser = argparse.ArgumentParser(usage="<cmd> [options]", description="A tool for further expansion of the saves from path.csv")
 arg_subparsers = arg_parser.add_subparsers()
@@ -205,13 +743,37 @@ percent_parser.add_argument("-ll", "--leftover-length", help="length of leftover
 percent_parser.add_argument("-he", "--height", help="height of pc (default: 4)", metavar="<int>", type=int, default=DEFAULT_HEIGHT)
 percent_parser.add_argument("-wi", "--width", help="width of pc (default: 10)", metavar="<int>", type=int, default=DEFAULT_WIDTH)
 percent_parser.add_argument("-ho", "--hold", help="number of hold (default: 1)", metavar="<int>", type=int, default=DEFAULT_HOLD)
+percent_parser.add_argument("-mi", "--mirror", help="percents of the mirrored setup with L-J and S-Z swapped from the path file of the setup. Leftover, build and wanted saves are of the mirrored setup (default: False)", action="store_true")
 percent_parser.add_argument("-td", "--tree-depth", help="set the tree depth of pieces in percent (default: 0)", metavar="<int>", type=int, default=0)
 percent_parser.add_argument("-f", "--path-file", help="path filepath (default: output/path.csv)", metavar="<filepath>", default=DEFAULT_PATH_FILE, type=str)
 percent_parser.add_argument("-lp", "--log-path", help="output filepath (default: output/last_output.txt)", metavar="<filepath>", default=DEFAULT_LAST_OUTPUT_FILE, type=str)
 percent_parser.add_argument("-sp", "--saves-path", help="path to json file with preset wanted saves (default: GITROOT/saves.json)", metavar="<filepath>", default=DEFAULT_SAVES_JSON, type=str)
 percent_parser.add_argument("-np", "--no-print", help="don't log to terminal", action="store_true")
 percent_parser.add_argument("-fa", "--fails", help="include the fail queues for saves in output (default: False)", action="store_true")
+percent_parser.add_argument("-fap", "--fails-path", help="write the fail queues into this file instead of the output, compressed if ending with .gz (requires -fa)", metavar="<filepath>", type=str)
 percent_parser.add_argument("-os", "--over-solves", help="have the percents be out of when setup is solvable (default: False)", action="store_true")
+percent_parser.add_argument("-lt", "--lattice", help="answer wanted saves of only pieces from a table of every multiset of pieces computed in one pass (default: False)", action="store_true")
+percent_parser.add_argument("-ltp", "--lattice-path", help="filepath of the lattice table reused while the path file is unchanged (default: output/lattice.json)", metavar="<filepath>", default=DEFAULT_LATTICE_FILE, type=str)
+percent_parser.add_argument("-gp", "--given-prefix", help="only the queues starting with these pieces, reading only those rows using an index of the path file", metavar="<string>", type=str, default='')
+percent_parser.add_argument("-id", "--index-depth", help="number of pieces of the queue the index is by (default: 3)", metavar="<int>", type=int, default=DEFAULT_INDEX_DEPTH)
+percent_parser.add_argument("-ip", "--index-path", help=f"filepath of the index reused while the path file is unchanged (default: path file with {PREFIX_INDEX_SUFFIX})", metavar="<filepath>", type=str)
+percent_parser.add_argument("-ap", "--approx", help="estimate the percents from a random sample of queues with confidence intervals (default: False)", action="store_true")
+percent_parser.add_argument("-te", "--target-error", help="stop sampling once every interval is within this error (default: 0.5%%)", metavar="<percent>", type=parse_percentage, default=0.5)
+percent_parser.add_argument("-cl", "--confidence", help="confidence level of the intervals (default: 0.95)", metavar="<float>", type=float, default=0.95)
+percent_parser.add_argument("-se", "--seed", help="seed of the random sample (default: random)", metavar="<int>", type=int)
+percent_parser.add_argument("-gb", "--group-by", help="also break down the percents by the held piece, number of unused leftover pieces, number of saves, fumen or another expression (held, unused-leftover, num-saves, fumen, save:<expression>)", metavar="<string>", nargs='+')
+percent_parser.add_argument("-sl", "--selection", help="only read the rows of the path file in this selection made by filter -s selection or combine", metavar="<filepath>", type=str)
+percent_parser.add_argument("-fo", "--follow", help="keep reading rows appended to the path file while sfinder writes it, resuming from the checkpoint (default: False)", action="store_true")
+percent_parser.add_argument("-iv", "--interval", help="seconds between outputting the percents and saving the checkpoint while following (default: 10)", metavar="<float>", type=float, default=10.0)
+percent_parser.add_argument("-it", "--idle-timeout", help="stop following after this many seconds without new rows, 0 stops once caught up (default: until interrupted)", metavar="<float>", type=float)
+percent_parser.add_argument("-cpp", "--checkpoint-path", help="filepath of the checkpoint while following (default: log path with _checkpoint.json)", metavar="<filepath>", type=str)
+percent_parser.add_argument("-pn", "--plan-rows", help=f"rows evaluating every operand of the wanted saves before reordering the operands of and and or for the rest of the rows by how often they decide the expression for their time, 0 to keep the order written (default: {DEFAULT_PLAN_ROWS})", metavar="<int>", type=int, default=DEFAULT_PLAN_ROWS)
+percent_parser.add_argument("-ex", "--explain", help="output the order each wanted save was evaluated in with how often each sub expression was true and its time in the rows of -pn (default: False)", action="store_true")
+percent_parser.add_argument("-sw", "--sweep", help="percents for each of these configurations of leftover and build from one read of the path file, each as <leftover>:<build> or only <leftover> as in -l, instead of -l and -b", metavar="<string>", nargs='+')
+percent_parser.add_argument("-pr", "--profile", help="record time and calls of each stage into a json report (default: False)", action="store_true")
+percent_parser.add_argument("-pp", "--profile-path", help=f"filepath of the profile report (default: log path with {PROFILE_SUFFIX})", metavar="<filepath>", type=str)
+percent_parser.add_argument("-rc", "--result-cache", help=f"directory of the results of earlier runs served again for the same path file and options, empty to not cache (default: {DEFAULT_RESULT_CACHE_DIR})", metavar="<directory>", default=DEFAULT_RESULT_CACHE_DIR, type=str)
+percent_parser.add_argument("-rs", "--result-cache-size", help=f"megabytes of results kept in the cache before the least recently used are removed (default: {DEFAULT_RESULT_CACHE_SIZE_MB})", metavar="<int>", default=DEFAULT_RESULT_CACHE_SIZE_MB, type=int)
 
 filter_parser = arg_subparsers.add_parser("filter", help="filter path.csv of fumens that doesn't meet the wanted saves")
 filter_parser.set_defaults(func=parse_filter_args)
@@ -225,13 +787,90 @@ filter_parser.add_argument("-ll", "--leftover-length", help="length of leftover
 filter_parser.add_argument("-he", "--height", help="height of pc (default: 4)", metavar="<int>", type=int, default=DEFAULT_HEIGHT)
 filter_parser.add_argument("-wi", "--width", help="width of pc (default: 10)", metavar="<int>", type=int, default=DEFAULT_WIDTH)
 filter_parser.add_argument("-ho", "--hold", help="number of hold (default: 1)", metavar="<int>", type=int, default=DEFAULT_HOLD)
+filter_parser.add_argument("-mi", "--mirror", help="filter the mirrored setup with L-J and S-Z swapped and the fumens flipped from the path file of the setup. Leftover, build and wanted saves are of the mirrored setup (default: False)", action="store_true")
 filter_parser.add_argument("-bs", "--best-save", help="instead of listing each wanted save separately, it prioritizes the first then second and so on (default: False)", action="store_true")
+filter_parser.add_argument("-ae", "--all-expressions", help="filter by every wanted save in one pass of the path file with the output of each in its own file in -od instead of only -i (default: False)", action="store_true")
+filter_parser.add_argument("-od", "--output-dir", help="directory of the output of each wanted save with -ae (default: output/filter)", metavar="<directory>", default=DEFAULT_FILTER_OUTPUT_DIR, type=str)
+filter_parser.add_argument("-j", "--jobs", help="number of processes to filter and find the minimals of the wanted saves with -ae, where more than 1 takes the first best set without prompting unless -bss is set (default: 1)", metavar="<int>", type=int, default=1)
 filter_parser.add_argument("-c", "--cumulative", help="gives percents cumulatively in fumens of a minimal set (default: False)", action="store_true")
+filter_parser.add_argument("-eo", "--exact-order", help=f"with -c, order the minimal set for the most queues covered summed over each number of solves learned instead of greedily, for minimal sets of at most {EXACT_ORDER_MAX_SOLVES} solves (default: False)", action="store_true")
+filter_parser.add_argument("-bss", "--best-set-score", help="pick the minimal set with the highest total score of its solves instead of prompting. coverage scores each solve by the number of queues it solves and ranking by its place in -rp", choices=BEST_SET_SCORES, metavar="<string>", type=str)
+filter_parser.add_argument("-rp", "--ranking-path", help="file of fumens from best to worst with one per line for -bss ranking, where unlisted fumens are worst", metavar="<filepath>", type=str)
+filter_parser.add_argument("-cs", "--cover-solver", help=f"search for the minimal sets with the built-in search, the first installed solver with auto, or an installed solver, which finds one minimal set without prompting. Falls back to the built-in search if the solver isn't installed (default: {COVER_SOLVER_BUILTIN})", choices=COVER_SOLVER_CHOICES, metavar="<string>", default=COVER_SOLVER_BUILTIN, type=str)
+filter_parser.add_argument("-ce", "--cover-export", help="write the queues and fumens left after reducing the minimal graph to a cover file in lp format for a .lp or dimacs wcnf format for a .wcnf filepath", metavar="<filepath>", type=str)
 filter_parser.add_argument("-f", "--path-file", help="path filepath (default: output/path.csv)", metavar="<filepath>", default=DEFAULT_PATH_FILE, type=str)
 filter_parser.add_argument("-lp", "--log-path", help="output filepath (default: output/last_output.txt)", metavar="<filepath>", default=DEFAULT_LAST_OUTPUT_FILE, type=str)
 filter_parser.add_argument("-sp", "--saves-path", help="path to json file with preset wanted saves (default: GITROOT/saves.json)", metavar="<filepath>", default=DEFAULT_SAVES_JSON, type=str)
 filter_parser.add_argument("-fp", "--filtered-path", help="output filtered path file with solve of \"file\" (default: output/filtered_path.txt)", metavar="<filepath>", default=DEFAULT_FILTERED_PATH_FILE, type=str)
 filter_parser.add_argument("-np", "--no-print", help="don't log to terminal", action="store_true")
-filter_parser.add_argument("-s", "--solve", help="setting for how to output solve (minimal, unique, file) (default: minimal)", choices={"minimal", "unique", "file"}, metavar="<string>", default="minimal", type=str)
+filter_parser.add_argument("-sl", "--selection", help="only read the rows of the path file in this selection made by filter -s selection or combine", metavar="<filepath>", type=str)
+filter_parser.add_argument("-so", "--selection-output", help=f"output selection of the rows satisfying the wanted saves with solve of \"selection\" (default: {DEFAULT_SELECTION_FILE})", metavar="<filepath>", default=DEFAULT_SELECTION_FILE, type=str)
+filter_parser.add_argument("-s", "--solve", help="setting for how to output solve (minimal, unique, file, selection) (default: minimal)", choices={"minimal", "unique", "file", "selection"}, metavar="<string>", default="minimal", type=str)
+filter_parser.add_argument("-ch", "--chunk-pages", help="split the fumen of unique or minimal into fumens of this many pages each output as it's made, 0 for one fumen (default: 0)", metavar="<int>", type=int, default=0)
 filter_parser.add_argument("-t", "--tinyurl", help="output the link with tinyurl if possible", action="store_true")
-
+filter_parser.add_argument("-tu", "--tinyurl-api", help=f"url of the api shortening the link given in the url query (default: {TINYURL_API})", metavar="<url>", default=TINYURL_API, type=str)
+filter_parser.add_argument("-tc", "--tinyurl-cache", help=f"json file of links already shortened reused across runs, empty to not cache (default: {DEFAULT_TINYURL_CACHE_FILE})", metavar="<filepath>", default=DEFAULT_TINYURL_CACHE_FILE, type=str)
+filter_parser.add_argument("-tt", "--tinyurl-timeout", help=f"seconds to wait on the api for each link (default: {DEFAULT_SHORTENER_TIMEOUT})", metavar="<float>", default=DEFAULT_SHORTENER_TIMEOUT, type=float)
+filter_parser.add_argument("-tn", "--tinyurl-concurrency", help=f"number of links shortened at the same time when there are many minimals with -ae (default: {DEFAULT_SHORTENER_CONCURRENCY})", metavar="<int>", default=DEFAULT_SHORTENER_CONCURRENCY, type=int)
+filter_parser.add_argument("-pr", "--profile", help="record time and calls of each stage into a json report (default: False)", action="store_true")
+filter_parser.add_argument("-pp", "--profile-path", help=f"filepath of the profile report (default: log path with {PROFILE_SUFFIX})", metavar="<filepath>", type=str)
+filter_parser.add_argument("-rc", "--result-cache", help=f"directory of the results of earlier runs served again for the same path file and options, empty to not cache (default: {DEFAULT_RESULT_CACHE_DIR})", metavar="<directory>", default=DEFAULT_RESULT_CACHE_DIR, type=str)
+filter_parser.add_argument("-rs", "--result-cache-size", help=f"megabytes of results kept in the cache before the least recently used are removed (default: {DEFAULT_RESULT_CACHE_SIZE_MB})", metavar="<int>", default=DEFAULT_RESULT_CACHE_SIZE_MB, type=int)
+
+
+batch_parser = arg_subparsers.add_parser("batch", help="run many percent and filter jobs from a json manifest reading each path file once")
+batch_parser.set_defaults(func=parse_batch_args)
+batch_parser.add_argument("-m", "--manifest", help="json file with the jobs (required)", metavar="<filepath>", required=True, type=str)
+batch_parser.add_argument("-o", "--output", help="output json filepath of the results (default: output/batch.json)", metavar="<filepath>", default=DEFAULT_BATCH_OUTPUT_FILE, type=str)
+batch_parser.add_argument("-j", "--jobs", help="number of processes to run the groups of jobs across (default: number of cpus)", metavar="<int>", type=int, default=os.cpu_count() or 1)
+batch_parser.add_argument("-np", "--no-print", help="don't log to terminal", action="store_true")
+batch_parser.add_argument("-tu", "--tinyurl-api", help=f"url of the api shortening the link of the jobs with tinyurl given in the url query (default: {TINYURL_API})", metavar="<url>", default=TINYURL_API, type=str)
+batch_parser.add_argument("-tc", "--tinyurl-cache", help=f"json file of links already shortened reused across runs, empty to not cache (default: {DEFAULT_TINYURL_CACHE_FILE})", metavar="<filepath>", default=DEFAULT_TINYURL_CACHE_FILE, type=str)
+batch_parser.add_argument("-tt", "--tinyurl-timeout", help=f"seconds to wait on the api for each link (default: {DEFAULT_SHORTENER_TIMEOUT})", metavar="<float>", default=DEFAULT_SHORTENER_TIMEOUT, type=float)
+batch_parser.add_argument("-tn", "--tinyurl-concurrency", help=f"number of links shortened at the same time (default: {DEFAULT_SHORTENER_CONCURRENCY})", metavar="<int>", default=DEFAULT_SHORTENER_CONCURRENCY, type=int)
+
+diff_parser = arg_subparsers.add_parser("diff", help="compare the saves of two setups on the queues in both of their path files")
+diff_parser.set_defaults(func=parse_diff_args)
+diff_parser.add_argument("-w", "--wanted-saves", help="the save expression (required if there isn't -k)", metavar="<string>", nargs='+')
+diff_parser.add_argument("-k", "--key", help="use preset wanted saves in the saves json (required if there isn't -w)", metavar="<string>", nargs='+')
+diff_parser.add_argument("-f", "--path-files", help="path filepaths of the two setups (required)", metavar="<filepath>", nargs=2, required=True, type=str)
+diff_parser.add_argument("-b", "--build", help="pieces in the build of both setups or of each setup. Ignored if -l has '-' in expression", metavar="<string>", nargs='+', type=str)
+diff_parser.add_argument("-l", "--leftover", help="leftover pieces of both setups or of each setup. Supports T-IO for still have T from leftover and used IO from following bag", metavar="<string>", nargs='+', type=str, default=[''])
+diff_parser.add_argument("-pc", "--pc-num", help="pc number for setup", metavar="<int>", type=int)
+diff_parser.add_argument("-ll", "--leftover-length", help="length of leftover alternative to -pc", metavar="<int>", type=int)
+diff_parser.add_argument("-he", "--height", help="height of pc (default: 4)", metavar="<int>", type=int, default=DEFAULT_HEIGHT)
+diff_parser.add_argument("-wi", "--width", help="width of pc (default: 10)", metavar="<int>", type=int, default=DEFAULT_WIDTH)
+diff_parser.add_argument("-ho", "--hold", help="number of hold (default: 1)", metavar="<int>", type=int, default=DEFAULT_HOLD)
+diff_parser.add_argument("-lp", "--log-path", help="output filepath (default: output/last_output.txt)", metavar="<filepath>", default=DEFAULT_LAST_OUTPUT_FILE, type=str)
+diff_parser.add_argument("-sp", "--saves-path", help="path to json file with preset wanted saves (default: GITROOT/saves.json)", metavar="<filepath>", default=DEFAULT_SAVES_JSON, type=str)
+diff_parser.add_argument("-dp", "--diff-path", help="output csv of the queues saved by only one of the setups (default: output/diff.csv)", metavar="<filepath>", default=DEFAULT_DIFF_FILE, type=str)
+diff_parser.add_argument("-cr", "--chunk-rows", help="rows sorted in memory at a time for path files not sorted by queue (default: 100000)", metavar="<int>", type=int, default=100000)
+diff_parser.add_argument("-np", "--no-print", help="don't log to terminal", action="store_true")
+diff_parser.add_argument("-pr", "--profile", help="record time and calls of each stage into a json report (default: False)", action="store_true")
+diff_parser.add_argument("-pp", "--profile-path", help=f"filepath of the profile report (default: log path with {PROFILE_SUFFIX})", metavar="<filepath>", type=str)
+
+chain_parser = arg_subparsers.add_parser("chain", help="give the chance of doing a sequence of PCs where the save of each is the leftover of the next")
+chain_parser.set_defaults(func=parse_chain_args)
+chain_parser.add_argument("-m", "--manifest", help="json file with the setups of each stage (required)", metavar="<filepath>", required=True, type=str)
+chain_parser.add_argument("-lp", "--log-path", help="output filepath (default: output/last_output.txt)", metavar="<filepath>", default=DEFAULT_LAST_OUTPUT_FILE, type=str)
+chain_parser.add_argument("-np", "--no-print", help="don't log to terminal", action="store_true")
+chain_parser.add_argument("-nt", "--no-tables", help=f"read every path file instead of reusing the save table stored next to it with {SAVE_TABLE_SUFFIX} (default: False)", action="store_true")
+chain_parser.add_argument("-pr", "--profile", help="record time and calls of each stage into a json report (default: False)", action="store_true")
+chain_parser.add_argument("-pp", "--profile-path", help=f"filepath of the profile report (default: log path with {PROFILE_SUFFIX})", metavar="<filepath>", type=str)
+
+combine_parser = arg_subparsers.add_parser("combine", help="combine selections of rows of the same path file made by filter -s selection")
+combine_parser.set_defaults(func=parse_combine_args)
+combine_parser.add_argument("-s", "--selections", help="selections to combine (required)", metavar="<filepath>", nargs='+', required=True, type=str)
+combine_parser.add_argument("-op", "--operation", help="combine the selections by rows in all of them or in any of them (and, or) (default: and)", choices={"and", "or"}, metavar="<string>", default="and", type=str)
+combine_parser.add_argument("-n", "--negate", help="indicies of -s to take the rows not in the selection of before combining", metavar="<int>", nargs='+', type=int)
+combine_parser.add_argument("-o", "--output", help=f"output selection (default: {DEFAULT_SELECTION_FILE})", metavar="<filepath>", default=DEFAULT_SELECTION_FILE, type=str)
+combine_parser.add_argument("-lp", "--log-path", help="output filepath (default: output/last_output.txt)", metavar="<filepath>", default=DEFAULT_LAST_OUTPUT_FILE, type=str)
+combine_parser.add_argument("-np", "--no-print", help="don't log to terminal", action="store_true")
+
+archive_parser = arg_subparsers.add_parser("archive", help="convert a path file into a compact archive that percent, filter and the other commands read as the path file")
+archive_parser.set_defaults(func=parse_archive_args)
+archive_parser.add_argument("-f", "--path-file", help="path filepath, or archive with -x (default: output/path.csv)", metavar="<filepath>", default=DEFAULT_PATH_FILE, type=str)
+archive_parser.add_argument("-o", "--output", help="output filepath (default: path file ending with .archive, or without .archive with -x)", metavar="<filepath>", type=str)
+archive_parser.add_argument("-x", "--extract", help="convert the archive back into a path file (default: False)", action="store_true")
+archive_parser.add_argument("-lp", "--log-path", help="output filepath (default: output/last_output.txt)", metavar="<filepath>", default=DEFAULT_LAST_OUTPUT_FILE, type=str)
+archive_parser.add_argument("-np", "--no-print", help="don't log to terminal", action="store_true")
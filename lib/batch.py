@@ -0,0 +1,262 @@
+import io
+import json
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from .saves_reader import SavesReader
+from .parser import Parser as WantedSavesParser, AST, evaluate_ast
+from .percent import PercentCounter, PercentNode, print_percent
+from .filter import FilterCollector, satisfied_indicies, output_filter
+from .utils import queue_val
+from .shortener import Shortener
+
+BATCH_COMMANDS = {"percent", "filter"}
+
+@dataclass
+class BatchJob:
+  index: int
+  id: str
+  command: str
+  wanted_saves: list[str]
+  labels: list[str]
+  options: dict
+
+@dataclass
+class BatchGroup:
+  '''
+  Jobs reading the same path file with the same leftover, build, dimensions and orientation
+  '''
+  path_file: str
+  leftover: str
+  build: str
+  width: int
+  height: int
+  hold: int
+  mirror: bool
+  jobs: list[BatchJob] = field(default_factory=list)
+
+  def key(self) -> tuple:
+    return (self.path_file, self.leftover, self.build, self.width, self.height, self.hold, self.mirror)
+
+class _ExpressionCache:
+  '''
+  Evaluates each distinct expression at most once per row across all jobs of a group
+  '''
+  def __init__(self):
+    self.expressions: dict[str, int] = {}
+    self.asts: list[AST] = []
+    self.parser = WantedSavesParser()
+    self.results: list[bool | None] = []
+
+  def add(self, wanted_save: str) -> int:
+    if wanted_save not in self.expressions:
+      self.expressions[wanted_save] = len(self.asts)
+      self.asts.append(self.parser.parse(wanted_save))
+    return self.expressions[wanted_save]
+
+  def reset(self):
+    self.results = [None] * len(self.asts)
+
+  def evaluate(self, expression_id: int, saves: list[str]) -> bool:
+    result = self.results[expression_id]
+    if result is None:
+      result = self.results[expression_id] = evaluate_ast(self.asts[expression_id], saves)
+    return result
+
+class _PercentUnit:
+  '''
+  State of one percent calculation which is a whole job with best save or one of its wanted saves otherwise
+  '''
+  def __init__(self, labels: list[str], expression_ids: list[int], options: dict):
+    self.labels = labels
+    self.expression_ids = expression_ids
+    self.all_saves = options["all"]
+    self.over_solves = options["over_solves"]
+    self.tree_depth = options["tree_depth"]
+    self.counter = PercentCounter(len(expression_ids), self.tree_depth, options["fails"])
+    self.all_saves_dict: dict[str, int] = {}
+
+  def add(self, row, expressions: _ExpressionCache):
+    if self.over_solves and not row.solveable:
+      return
+
+    if self.all_saves:
+      for save in row.saves:
+        self.all_saves_dict[save] = self.all_saves_dict.get(save, 0) + 1
+      self.counter.total += 1
+      return
+
+    index = None
+    if len(row.saves) > 0:
+      index = next((i for i, expression_id in enumerate(self.expression_ids) if expressions.evaluate(expression_id, row.saves)), None)
+    self.counter.add(row.queue, index)
+
+  def results(self) -> tuple[list[str], list[PercentNode]]:
+    if not self.all_saves:
+      return self.labels, self.counter.saveable_counters
+
+    items = sorted(self.all_saves_dict.items(), key=lambda x: queue_val(x[0]))
+    return [save for save, _ in items], [PercentNode(count) for _, count in items]
+
+def _tree_to_dict(node: PercentNode, total_node: PercentNode) -> dict:
+  tree = {}
+  if node.children is None or total_node.children is None:
+    return tree
+
+  for piece, child in node.children.items():
+    total_child = total_node.children[piece]
+    tree[piece] = {"count": child.count, "total": total_child.count, "children": _tree_to_dict(child, total_child)}
+  return tree
+
+def _percent_result(units: list[_PercentUnit]) -> dict:
+  log = io.StringIO()
+  saves = []
+  fails = []
+  for unit in units:
+    labels, counters = unit.results()
+    total = unit.counter.total
+    print_percent(labels, counters, total, log, False, unit.counter.fails, unit.tree_depth)
+    fails += unit.counter.fails
+
+    for label, counter in zip(labels, counters):
+      save = {
+        "label": label,
+        "count": counter.count,
+        "total": total.count,
+        "percent": counter.count / total.count * 100 if total.count != 0 else 0
+      }
+      if unit.tree_depth > 0:
+        save["tree"] = _tree_to_dict(counter, total)
+      saves.append(save)
+
+  result = {"output": log.getvalue(), "saves": saves}
+  if fails:
+    result["fails"] = fails
+  return result
+
+def _filter_result(job: BatchJob, collector: FilterCollector, shortener: Shortener | None) -> dict:
+  log = io.StringIO()
+  options = job.options
+  # urls are shortened together once every group is done
+  deferred = shortener.deferred() if options["tinyurl"] and shortener is not None else None
+  # the minimal output also prints to console which would interleave between workers
+  with contextlib.redirect_stdout(io.StringIO()):
+    output_filter(options["solve"], job.labels, collector.unique_fumens, collector.line_fumens, collector.line_queue_fumens_map, collector.total, log, False, options["tinyurl"], options["cumulative"], interactive=False, exact_order=options["exact_order"], best_set_score=options["best_set_score"], ranking_path=options["ranking_path"], shortener=deferred, chunk_pages=options["chunk_pages"], cover_solver=options["cover_solver"])
+
+  result = {"output": log.getvalue()}
+  if deferred is not None and deferred.pending:
+    result["urls"] = deferred.pending
+  return result
+
+def run_group(group: BatchGroup, shortener: Shortener | None = None) -> list[tuple[int, dict]]:
+  '''
+  Read the path file of the group once and evaluate every job of the group in the same pass
+
+  Return:
+      list[tuple[int, dict]]: index of the job in the manifest and its result
+  '''
+  expressions = _ExpressionCache()
+  parser = WantedSavesParser()
+  percent_units: dict[int, list[_PercentUnit]] = {}
+  # each filter job collects the solves of the rows satisfying its wanted saves like filter does
+  filter_asts: dict[int, list[AST]] = {}
+  filter_collectors: dict[int, FilterCollector] = {}
+
+  for job in group.jobs:
+    if job.command == "filter":
+      filter_asts[job.index] = [parser.parse(wanted_save) for wanted_save in job.wanted_saves]
+      filter_collectors[job.index] = FilterCollector(job.options["solve"])
+    elif job.options["all"]:
+      percent_units[job.index] = [_PercentUnit([], [], job.options)]
+    elif job.options["best_save"]:
+      percent_units[job.index] = [_PercentUnit(job.labels, [expressions.add(w) for w in job.wanted_saves], job.options)]
+    else:
+      percent_units[job.index] = [_PercentUnit([label], [expressions.add(w)], job.options) for w, label in zip(job.wanted_saves, job.labels)]
+
+  all_percent_units = [unit for units in percent_units.values() for unit in units]
+  warnings = []
+
+  try:
+    save_reader = SavesReader(group.path_file, group.leftover, group.build, group.width, group.height, group.hold, mirror=group.mirror)
+    for row in save_reader.read(assign_fumens=len(filter_collectors) > 0):
+      if row.warn is not None and row.warn not in warnings:
+        warnings.append(row.warn)
+
+      expressions.reset()
+      for unit in all_percent_units:
+        unit.add(row, expressions)
+      for job_index, collector in filter_collectors.items():
+        indicies = satisfied_indicies(filter_asts[job_index], row.saves) if row.solveable else []
+        collector.add(row.queue, [fumen for i in indicies for fumen in row.fumens[i]])
+  except (ValueError, OSError) as e:
+    return [(job.index, {"error": str(e)}) for job in group.jobs]
+
+  results = []
+  for job in group.jobs:
+    try:
+      if job.command == "filter":
+        result = _filter_result(job, filter_collectors[job.index], shortener)
+      else:
+        result = _percent_result(percent_units[job.index])
+    except (ValueError, RuntimeError) as e:
+      result = {"error": str(e)}
+    if warnings:
+      result["warnings"] = warnings
+    results.append((job.index, result))
+
+  return results
+
+def group_jobs(jobs: list[tuple[BatchJob, tuple]]) -> list[BatchGroup]:
+  '''
+  Group the jobs by the path file, leftover, build, dimensions and orientation they read with
+  '''
+  groups: dict[tuple, BatchGroup] = {}
+  for job, key in jobs:
+    if key not in groups:
+      groups[key] = BatchGroup(*key)
+    groups[key].jobs.append(job)
+  return list(groups.values())
+
+def _shorten_results(results: dict[int, dict], shortener: Shortener):
+  urls = [url for result in results.values() for url in result.get("urls", [])]
+  if not urls:
+    return
+
+  outputs = shortener.replace_all([result.get("output", "") for result in results.values()], urls)
+  for result, output in zip(results.values(), outputs):
+    result.pop("urls", None)
+    if "output" in result:
+      result["output"] = output
+
+def batch(groups: list[BatchGroup], workers: int, shortener: Shortener | None = None) -> dict[int, dict]:
+  '''
+  Run the groups across a process pool with the urls of every minimal shortened concurrently at the end
+
+  Return:
+      dict[int, dict]: result of each job by the index of the job in the manifest
+  '''
+  results: dict[int, dict] = {}
+
+  if shortener is None:
+    shortener = Shortener()
+
+  if workers <= 1 or len(groups) <= 1:
+    for group in groups:
+      results.update(run_group(group, shortener))
+  else:
+    with ProcessPoolExecutor(max_workers=min(workers, len(groups))) as executor:
+      futures = [executor.submit(run_group, group, shortener) for group in groups]
+      for future in as_completed(futures):
+        results.update(future.result())
+
+  _shorten_results(results, shortener)
+  return results
+
+def write_batch_output(output_path: str, jobs: list[BatchJob], results: dict[int, dict]):
+  output = []
+  for job in jobs:
+    output.append({"id": job.id, "command": job.command, **results[job.index]})
+
+  with open(output_path, 'w', encoding="utf8") as outfile:
+    json.dump({"jobs": output}, outfile, indent=2, ensure_ascii=False)
+    outfile.write('\n')
@@ -0,0 +1,167 @@
+import json
+from collections import Counter
+from dataclasses import dataclass
+from os import path
+from typing import TextIO
+from .saves_reader import SavesReader
+from .utils import queue_val
+from .profiler import Profiler, NULL_PROFILER, STAGE_EXPRESSION_EVALUATION
+from .constants import SAVE_TABLE_SUFFIX
+
+SAVE_TABLE_VERSION = 1
+
+def default_save_table_path(filepath: str) -> str:
+  return filepath + SAVE_TABLE_SUFFIX
+
+@dataclass
+class ChainSetup:
+  '''
+  Setup of a stage, used when the save of the previous stage is the pieces of save
+  '''
+  save: str
+  path_file: str
+  leftover: str
+  build: str
+  width: int
+  height: int
+  hold: int
+  mirror: bool = False
+
+  def metadata(self) -> dict:
+    # the size and modified time of the path file to know when the table is out of date
+    return {
+      "path_file": path.abspath(self.path_file),
+      "size": path.getsize(self.path_file),
+      "mtime": path.getmtime(self.path_file),
+      "leftover": self.leftover,
+      "build": self.build,
+      "width": self.width,
+      "height": self.height,
+      "hold": self.hold,
+      "mirror": self.mirror,
+    }
+
+class SaveTable:
+  '''
+  Number of queues of a setup with each distinct set of saves
+  '''
+  def __init__(self, save_sets: list[tuple[list[str], int]], total: int, metadata: dict):
+    self.save_sets = save_sets
+    self.total = total
+    self.metadata = metadata
+
+  def save(self, filepath: str):
+    with open(filepath, 'w', encoding="utf8") as outfile:
+      json.dump({
+        "version": SAVE_TABLE_VERSION,
+        "metadata": self.metadata,
+        "total": self.total,
+        "save_sets": self.save_sets,
+      }, outfile)
+
+  @classmethod
+  def load(cls, filepath: str) -> "SaveTable | None":
+    if not path.exists(filepath):
+      return None
+    with open(filepath, 'r', encoding="utf8") as infile:
+      try:
+        data = json.load(infile)
+      except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict) or data.get("version") != SAVE_TABLE_VERSION:
+      return None
+    return cls([(saves, count) for saves, count in data["save_sets"]], data["total"], data["metadata"])
+
+def build_save_table(setup: ChainSetup, profiler: Profiler = NULL_PROFILER) -> SaveTable:
+  '''
+  Read the path file once to count the queues with each set of saves, where queues that can't be solved have none
+  '''
+  save_reader = SavesReader(setup.path_file, setup.leftover, setup.build, setup.width, setup.height, setup.hold, profiler, setup.mirror)
+
+  save_sets: Counter[tuple[str, ...]] = Counter()
+  total = 0
+  for row in save_reader.read():
+    total += 1
+    if row.solveable:
+      save_sets[tuple(sorted(set(row.saves), key=queue_val))] += 1
+
+  return SaveTable([(list(saves), count) for saves, count in save_sets.items()], total, setup.metadata())
+
+def get_save_table(setup: ChainSetup, profiler: Profiler = NULL_PROFILER) -> SaveTable:
+  '''
+  Load the table next to the path file if made with the same setup, otherwise build and store it
+  '''
+  table_path = default_save_table_path(setup.path_file)
+  table = SaveTable.load(table_path)
+  if table is not None and table.metadata == setup.metadata():
+    return table
+
+  table = build_save_table(setup, profiler)
+  # the stored table only saves reading the path file again so the chain goes on without it
+  try:
+    table.save(table_path)
+  except OSError:
+    pass
+  return table
+
+@dataclass
+class SetupResult:
+  '''
+  Chance to finish the chain from a setup and the saves of the setup ordered by their chance to finish the rest of the chain
+  '''
+  setup: ChainSetup
+  chance: float
+  policy: list[tuple[str, float]]
+
+def chain(stages: list[list[ChainSetup]], use_tables: bool = True, profiler: Profiler = NULL_PROFILER) -> list[list[SetupResult]]:
+  '''
+  Chance of doing every PC of the stages in order where the save of each PC is the leftover of the next
+
+  Working back from the last stage, the chance of a setup is the chance of its queues where each queue takes
+  the save with the best chance of the next stage, and the last stage only needs to be solved
+  '''
+  results: list[list[SetupResult]] = [[] for _ in stages]
+  next_chances: dict[str, float] | None = None
+
+  for stage_index in range(len(stages) - 1, -1, -1):
+    chances = {}
+    for setup in stages[stage_index]:
+      table = get_save_table(setup, profiler) if use_tables else build_save_table(setup, profiler)
+
+      with profiler.stage(STAGE_EXPRESSION_EVALUATION):
+        policy = []
+        if next_chances is None:
+          successes = sum(count for _, count in table.save_sets)
+        else:
+          successes = 0
+          for saves, count in table.save_sets:
+            successes += count * max((next_chances.get(save, 0) for save in saves), default=0)
+
+          # only the saves with a setup in the next stage as the rest end the chain
+          setup_saves = {save for saves, _ in table.save_sets for save in saves if save in next_chances}
+          policy = sorted(((save, next_chances[save]) for save in setup_saves), key=lambda x: (-x[1], queue_val(x[0])))
+
+        chance = successes / table.total if table.total != 0 else 0
+
+      chances[setup.save] = chance
+      results[stage_index].append(SetupResult(setup, chance, policy))
+    next_chances = chances
+
+  return results
+
+def print_chain(results: list[list[SetupResult]], log_file: TextIO, console_print: bool):
+  output = ""
+  for stage_index, stage_results in enumerate(results, 1):
+    output += f"Stage {stage_index}\n"
+    for result in stage_results:
+      output += f"{result.setup.save}: {result.chance * 100:.2f}% [{path.basename(result.setup.path_file)}]\n"
+      # the priority of the saves to take for the next stage
+      for save, chance in result.policy:
+        output += f"∟ {save} -> {chance * 100:.2f}%\n"
+
+  for result in results[0]:
+    output += f"Chain of {len(results)} PCs from {result.setup.save}: {result.chance * 100:.2f}%\n"
+
+  log_file.write(output)
+
+  if console_print: print(output, end='')
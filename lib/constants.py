@@ -12,6 +12,41 @@ DEFAULT_OUTPUT_DIR = "output"
 DEFAULT_PATH_FILE = path.join(DEFAULT_OUTPUT_DIR, "path.csv")
 DEFAULT_LAST_OUTPUT_FILE = path.join(DEFAULT_OUTPUT_DIR, "last_output.txt")
 DEFAULT_FILTERED_PATH_FILE = path.join(DEFAULT_OUTPUT_DIR, "filtered_path.csv")
+DEFAULT_FILTER_OUTPUT_DIR = path.join(DEFAULT_OUTPUT_DIR, "filter")
+DEFAULT_LATTICE_FILE = path.join(DEFAULT_OUTPUT_DIR, "lattice.json")
+DEFAULT_BATCH_OUTPUT_FILE = path.join(DEFAULT_OUTPUT_DIR, "batch.json")
+DEFAULT_DIFF_FILE = path.join(DEFAULT_OUTPUT_DIR, "diff.csv")
+DEFAULT_TINYURL_CACHE_FILE = path.join(DEFAULT_OUTPUT_DIR, "tinyurl_cache.json")
+DEFAULT_SELECTION_FILE = path.join(DEFAULT_OUTPUT_DIR, "selection.json")
+DEFAULT_RESULT_CACHE_DIR = path.join(DEFAULT_OUTPUT_DIR, "cache")
+DEFAULT_RESULT_CACHE_SIZE_MB = 256
+
+# files stored next to the path file or the log file
+PROFILE_SUFFIX = "_profile.json"
+PREFIX_INDEX_SUFFIX = ".index.json"
+SAVE_TABLE_SUFFIX = ".saves.json"
+
+# number of pieces of the queue the prefix index is by
+DEFAULT_INDEX_DEPTH = 3
+
+# rows measured before the operands of the wanted saves are reordered
+DEFAULT_PLAN_ROWS = 1000
+
+TINYURL_API = "http://tinyurl.com/api-create.php"
+DEFAULT_SHORTENER_TIMEOUT = 10.0
+DEFAULT_SHORTENER_CONCURRENCY = 8
+
+# minimal sets found by the search of this package rather than an installed solver
+COVER_SOLVER_BUILTIN = "builtin"
+COVER_SOLVER_AUTO = "auto"
+# solvers installed outside of this package, tried in this order by auto
+COVER_SOLVER_CHOICES = (COVER_SOLVER_BUILTIN, COVER_SOLVER_AUTO, "pulp", "rc2")
+
+# exact order of a minimal set goes through every subset of its solves
+EXACT_ORDER_MAX_SOLVES = 16
+
+# scores to pick the best minimal set without prompting
+BEST_SET_SCORES = ("coverage", "ranking")
 
 WANTED_SAVE_COMMENT_DELIMITOR = '#'
 WANTED_SAVE_DELIMITOR = ','
@@ -0,0 +1,170 @@
+from os import path
+from typing import Iterator
+from .minimal import Graph, Node
+from .constants import COVER_SOLVER_BUILTIN, COVER_SOLVER_AUTO
+
+# terms of a constraint written on each line of the lp file to keep its lines short
+LP_TERMS_PER_LINE = 16
+
+def _node_ids(graph: Graph) -> dict[Node, int]:
+  return {node: i for i, node in enumerate(graph.nodes, 1)}
+
+def _lp_lines(terms: list[str]) -> Iterator[str]:
+  for i in range(0, len(terms), LP_TERMS_PER_LINE):
+    yield ("  " if i else '') + " + ".join(terms[i:i + LP_TERMS_PER_LINE]) + (" +" if i + LP_TERMS_PER_LINE < len(terms) else '')
+
+def write_cover_lp(graph: Graph, filepath: str):
+  '''
+  Cover as a binary program in lp format minimizing the fumens learned with a constraint for each queue to have a fumen
+  '''
+  node_ids = _node_ids(graph)
+  with open(filepath, 'w', encoding="utf8") as outfile:
+    outfile.write("\\ minimum number of fumens covering every queue\n")
+    for node, node_id in node_ids.items():
+      outfile.write(f"\\ x{node_id} {node.key}\n")
+
+    outfile.write("Minimize\n obj: ")
+    outfile.write("\n ".join(_lp_lines([f"x{node_id}" for node_id in node_ids.values()])) + '\n')
+
+    outfile.write("Subject To\n")
+    for i, edge in enumerate(graph.edges, 1):
+      terms = sorted(node_ids[node] for node in edge.nodes)
+      outfile.write(f" q{i}: " + "\n ".join(_lp_lines([f"x{node_id}" for node_id in terms])) + " >= 1\n")
+
+    outfile.write("Binary\n")
+    for node_id in node_ids.values():
+      outfile.write(f" x{node_id}\n")
+    outfile.write("End\n")
+
+def write_cover_wcnf(graph: Graph, filepath: str):
+  '''
+  Cover as weighted maxsat in dimacs wcnf format with a hard clause for each queue and a soft clause to not learn each fumen
+  '''
+  node_ids = _node_ids(graph)
+  # hard clauses weigh more than breaking every soft clause
+  top = len(node_ids) + 1
+  with open(filepath, 'w', encoding="utf8") as outfile:
+    outfile.write("c minimum number of fumens covering every queue\n")
+    for node, node_id in node_ids.items():
+      outfile.write(f"c {node_id} {node.key}\n")
+
+    outfile.write(f"p wcnf {len(node_ids)} {len(graph.edges) + len(node_ids)} {top}\n")
+    for edge in graph.edges:
+      outfile.write(f"{top} " + ' '.join(str(node_id) for node_id in sorted(node_ids[node] for node in edge.nodes)) + " 0\n")
+    for node_id in node_ids.values():
+      outfile.write(f"1 -{node_id} 0\n")
+
+COVER_FORMATS = {
+  ".lp": write_cover_lp,
+  ".wcnf": write_cover_wcnf,
+}
+
+def export_cover(graph: Graph, filepath: str):
+  '''
+  Write the cover of the reduced graph in the format of the extension of the filepath
+  '''
+  extension = path.splitext(filepath)[1].lower()
+  writer = COVER_FORMATS.get(extension)
+  if writer is None:
+    raise ValueError(f"Cover export supports the extensions {', '.join(COVER_FORMATS)} but got {filepath}")
+  writer(graph, filepath)
+
+class CoverSolver:
+  '''
+  Solver installed outside of this package finding one minimum set of nodes covering every edge of the reduced graph
+  '''
+  name = ""
+
+  def available(self) -> bool:
+    raise NotImplementedError
+
+  def solve(self, graph: Graph) -> list[Node] | None:
+    '''
+    Nodes of a minimum cover, or None if the solver didn't prove one
+    '''
+    raise NotImplementedError
+
+class PulpSolver(CoverSolver):
+  '''
+  Binary program solved by the cbc solver that comes with pulp
+  '''
+  name = "pulp"
+
+  def available(self) -> bool:
+    try:
+      import pulp
+    except ImportError:
+      return False
+    return bool(pulp.PULP_CBC_CMD(msg=False).available())
+
+  def solve(self, graph: Graph) -> list[Node] | None:
+    import pulp
+
+    node_ids = _node_ids(graph)
+    problem = pulp.LpProblem("cover", pulp.LpMinimize)
+    variables = {node: pulp.LpVariable(f"x{node_id}", cat=pulp.LpBinary) for node, node_id in node_ids.items()}
+    problem += pulp.lpSum(variables.values())
+    for i, edge in enumerate(graph.edges, 1):
+      problem += pulp.lpSum(variables[node] for node in edge.nodes) >= 1, f"q{i}"
+
+    status = problem.solve(pulp.PULP_CBC_CMD(msg=False))
+    if pulp.LpStatus[status] != "Optimal":
+      return None
+    return [node for node, variable in variables.items() if (variable.varValue or 0) > 0.5]
+
+class RC2Solver(CoverSolver):
+  '''
+  Weighted maxsat solved by rc2 of python-sat
+  '''
+  name = "rc2"
+
+  def available(self) -> bool:
+    try:
+      from pysat.examples.rc2 import RC2
+    except ImportError:
+      return False
+    return True
+
+  def solve(self, graph: Graph) -> list[Node] | None:
+    from pysat.examples.rc2 import RC2
+    from pysat.formula import WCNF
+
+    node_ids = _node_ids(graph)
+    wcnf = WCNF()
+    for edge in graph.edges:
+      wcnf.append([node_ids[node] for node in edge.nodes])
+    for node_id in node_ids.values():
+      wcnf.append([-node_id], weight=1)
+
+    with RC2(wcnf) as rc2:
+      model = rc2.compute()
+    if model is None:
+      return None
+    chosen = {literal for literal in model if literal > 0}
+    return [node for node, node_id in node_ids.items() if node_id in chosen]
+
+# tried in this order by auto
+COVER_SOLVERS: dict[str, type[CoverSolver]] = {
+  PulpSolver.name: PulpSolver,
+  RC2Solver.name: RC2Solver,
+}
+
+def find_cover_solver(name: str) -> CoverSolver | None:
+  '''
+  Solver of the name if it's installed, the first installed solver for auto, and None for the built-in search
+  '''
+  if name == COVER_SOLVER_BUILTIN:
+    return None
+
+  if name == COVER_SOLVER_AUTO:
+    for solver_class in COVER_SOLVERS.values():
+      solver = solver_class()
+      if solver.available():
+        return solver
+    return None
+
+  solver = COVER_SOLVERS[name]()
+  if not solver.available():
+    print(f"Cover solver {name} is not installed, searching with the built-in search instead")
+    return None
+  return solver
@@ -0,0 +1,212 @@
+import csv
+import heapq
+import tempfile
+from dataclasses import dataclass, field
+from os import path
+from typing import Iterator, TextIO
+from .saves_reader import SavesReader, SavesRow, COLUMN_QUEUE
+from .archive import PathArchive, is_archive
+from .parser import Parser as WantedSavesParser, evaluate_ast
+from .profiler import Profiler, NULL_PROFILER, STAGE_EXPRESSION_EVALUATION, STAGE_OUTPUT_ENCODING
+
+# number of rows sorted in memory at a time for path files not sorted by queue
+DEFAULT_SORT_CHUNK_ROWS = 100000
+
+DIFF_COLUMNS = [COLUMN_QUEUE, "label", "saved by"]
+
+def _queue_column(filepath: str) -> int:
+  if is_archive(filepath):
+    fieldnames = PathArchive(filepath).fieldnames
+  else:
+    with open(filepath, 'r', encoding="utf-8-sig") as infile:
+      fieldnames = next(csv.reader([infile.readline()]))
+  if COLUMN_QUEUE not in fieldnames:
+    raise ValueError(f"Missing required columns: {COLUMN_QUEUE}. Columns found instead: {', '.join(fieldnames)}")
+  return fieldnames.index(COLUMN_QUEUE)
+
+def _line_queue(line: bytes, queue_column: int) -> bytes:
+  # queues are only pieces so they are never quoted
+  return line.split(b',', queue_column + 1)[queue_column].rstrip(b'\r\n')
+
+def _lines(filepath: str) -> Iterator[bytes]:
+  if is_archive(filepath):
+    yield from PathArchive(filepath).csv_lines()
+    return
+
+  with open(filepath, 'rb') as infile:
+    infile.readline()
+    for line in infile:
+      if line.strip():
+        yield line if line.endswith(b'\n') else line + b'\n'
+
+def is_sorted_by_queue(filepath: str) -> bool:
+  '''
+  Scan the queues of the path file without parsing the rest of the rows
+  '''
+  queue_column = _queue_column(filepath)
+  prev = b''
+  for line in _lines(filepath):
+    queue = _line_queue(line, queue_column)
+    if queue < prev:
+      return False
+    prev = queue
+  return True
+
+def _chunk_lines(chunk_path: str) -> Iterator[bytes]:
+  with open(chunk_path, 'rb') as chunk_file:
+    yield from chunk_file
+
+def _write_chunk(chunk: list[bytes], key, tmpdir: str) -> str:
+  chunk.sort(key=key)
+  fd, chunk_path = tempfile.mkstemp(dir=tmpdir)
+  with open(fd, 'wb') as chunk_file:
+    chunk_file.writelines(chunk)
+  return chunk_path
+
+def sorted_lines(filepath: str, tmpdir: str, chunk_rows: int = DEFAULT_SORT_CHUNK_ROWS) -> Iterator[bytes]:
+  '''
+  Lines of the path file sorted by queue, with at most chunk rows in memory at a time
+
+  Sorted path files are given as is. Otherwise each chunk is sorted into a file in tmpdir and the chunks are merged.
+  '''
+  if is_sorted_by_queue(filepath):
+    yield from _lines(filepath)
+    return
+
+  queue_column = _queue_column(filepath)
+  key = lambda line: _line_queue(line, queue_column)
+
+  chunk_paths = []
+  chunk = []
+  for line in _lines(filepath):
+    chunk.append(line)
+    if len(chunk) >= chunk_rows:
+      chunk_paths.append(_write_chunk(chunk, key, tmpdir))
+      chunk = []
+  if chunk:
+    chunk_paths.append(_write_chunk(chunk, key, tmpdir))
+
+  yield from heapq.merge(*(_chunk_lines(chunk_path) for chunk_path in chunk_paths), key=key)
+
+@dataclass
+class DiffCounter:
+  '''
+  Number of queues in both path files saving a wanted save in each, both or neither
+  '''
+  label: str
+  first: int = 0
+  second: int = 0
+  both: int = 0
+
+  @property
+  def either(self) -> int:
+    return self.first + self.second - self.both
+
+@dataclass
+class DiffResult:
+  names: tuple[str, str]
+  counters: list[DiffCounter]
+  matched: int = 0
+  unmatched: list[int] = field(default_factory=lambda: [0, 0])
+
+def _saves(asts, row: SavesRow) -> list[bool]:
+  if len(row.saves) == 0:
+    return [False] * len(asts)
+  return [evaluate_ast(ast, row.saves) for ast in asts]
+
+def diff(
+  filepaths: tuple[str, str],
+  wanted_saves: list[str],
+  labels: list[str],
+  leftovers: tuple[str, str],
+  builds: tuple[str, str],
+  width: int,
+  height: int,
+  hold: int,
+  diff_file: TextIO | None = None,
+  chunk_rows: int = DEFAULT_SORT_CHUNK_ROWS,
+  profiler: Profiler = NULL_PROFILER
+) -> DiffResult:
+  '''
+  Merge join the rows of two path files on the queue, counting the queues of each wanted save
+  saved by either setup and writing the queues saved by only one of the setups into the diff file
+  '''
+  wanted_saves_parser = WantedSavesParser()
+  asts = [wanted_saves_parser.parse(wanted_save) for wanted_save in wanted_saves]
+
+  names = tuple(path.basename(filepath) for filepath in filepaths)
+  if names[0] == names[1]:
+    names = filepaths
+  result = DiffResult(names, [DiffCounter(label) for label in labels])
+
+  writer = None
+  if diff_file is not None:
+    writer = csv.writer(diff_file)
+    writer.writerow(DIFF_COLUMNS)
+
+  with tempfile.TemporaryDirectory() as tmpdir:
+    readers = [
+      SavesReader(filepath, leftover, build, width, height, hold, profiler)
+      for filepath, leftover, build in zip(filepaths, leftovers, builds)
+    ]
+    rows = [reader.read_lines(sorted_lines(filepath, tmpdir, chunk_rows)) for reader, filepath in zip(readers, filepaths)]
+
+    first = next(rows[0], None)
+    second = next(rows[1], None)
+    while first is not None and second is not None:
+      if first.queue < second.queue:
+        result.unmatched[0] += 1
+        first = next(rows[0], None)
+        continue
+      if second.queue < first.queue:
+        result.unmatched[1] += 1
+        second = next(rows[1], None)
+        continue
+
+      result.matched += 1
+      with profiler.stage(STAGE_EXPRESSION_EVALUATION):
+        for counter, first_saves, second_saves in zip(result.counters, _saves(asts, first), _saves(asts, second)):
+          counter.first += first_saves
+          counter.second += second_saves
+          counter.both += first_saves and second_saves
+
+          if writer is not None and first_saves != second_saves:
+            writer.writerow([first.queue, counter.label, names[0] if first_saves else names[1]])
+
+      first = next(rows[0], None)
+      second = next(rows[1], None)
+
+    # rest of the queues only in one path file
+    while first is not None:
+      result.unmatched[0] += 1
+      first = next(rows[0], None)
+    while second is not None:
+      result.unmatched[1] += 1
+      second = next(rows[1], None)
+
+  return result
+
+def print_diff(result: DiffResult, log_file: TextIO, console_print: bool, profiler: Profiler = NULL_PROFILER):
+  with profiler.stage(STAGE_OUTPUT_ENCODING):
+    output = ""
+    total = result.matched
+    for counter in result.counters:
+      output += f"{counter.label}:\n"
+      for name, count in (
+        (result.names[0], counter.first),
+        (result.names[1], counter.second),
+        ("both", counter.both),
+        ("either", counter.either),
+        (f"only {result.names[0]}", counter.first - counter.both),
+        (f"only {result.names[1]}", counter.second - counter.both),
+      ):
+        save_percent = count / total * 100 if total != 0 else 0
+        output += f"∟ {name} -> {save_percent:.2f}% [{count}/{total}]\n"
+
+    for name, unmatched in zip(result.names, result.unmatched):
+      if unmatched:
+        output += f"Queues only in {name}: {unmatched}\n"
+
+    log_file.write(output)
+
+    if console_print: print(output, end='')
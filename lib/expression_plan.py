@@ -0,0 +1,168 @@
+import re
+import time
+from collections import Counter
+from collections.abc import Callable
+from typing import Iterator
+from .parser import AST, BinaryOp, UnaryOp, PiecesLiteral, RegexLiteral
+from .constants import DEFAULT_PLAN_ROWS
+
+# keeps an operand that is never decisive in the sample ordered by its cost
+MIN_DECISIVE_RATE = 1e-6
+
+class _PlanNode:
+  '''
+  Sub expression with its operands flattened for and and or, and how it evaluated on the sampled rows
+  '''
+  def __init__(self, kind: str, children: list["_PlanNode"], value: str = ''):
+    self.kind = kind
+    self.children = children
+    self.value = value
+    self.evaluations = 0
+    self.trues = 0
+    self.seconds = 0.0
+
+    if kind == "PIECES":
+      self.counter = Counter(value)
+    elif kind == "REGEX":
+      try:
+        self.pattern = re.compile(value)
+      except re.error as e:
+        raise ValueError(f"Invalid regex: '{value}' - {e}")
+
+  def label(self) -> str:
+    if self.kind == "PIECES":
+      return self.value
+    if self.kind == "REGEX":
+      return f"/{self.value}/"
+    if self.kind == "NOT":
+      return '!' + self.children[0].wrapped_label()
+    if self.kind == "AVOID":
+      return '^' + self.children[0].wrapped_label()
+    delimitor = " && " if self.kind == "AND" else " || "
+    return delimitor.join(child.wrapped_label() for child in self.children)
+
+  def wrapped_label(self) -> str:
+    return f"({self.label()})" if self.kind in ("AND", "OR") else self.label()
+
+  def cost(self) -> float:
+    return self.seconds / self.evaluations if self.evaluations else 0.0
+
+  def decisive_rate(self, kind: str) -> float:
+    '''
+    Rate this operand decides its and or or, which is being false for and and true for or
+    '''
+    if not self.evaluations:
+      return MIN_DECISIVE_RATE
+    true_rate = self.trues / self.evaluations
+    return max(true_rate if kind == "OR" else 1 - true_rate, MIN_DECISIVE_RATE)
+
+def _to_plan_node(node: AST) -> _PlanNode:
+  if isinstance(node, PiecesLiteral):
+    return _PlanNode("PIECES", [], node.value)
+  if isinstance(node, RegexLiteral):
+    return _PlanNode("REGEX", [], node.value)
+  if isinstance(node, UnaryOp):
+    return _PlanNode(node.op, [_to_plan_node(node.expr)])
+  if isinstance(node, BinaryOp):
+    # a chain of the same operator is one and or or of all of its operands so any of them can go first
+    children = []
+    for side in (node.left, node.right):
+      child = _to_plan_node(side)
+      children += child.children if child.kind == node.op else [child]
+    return _PlanNode(node.op, children)
+  raise ValueError(f"Unknown AST node type or operation: {type(node)}")
+
+def _compile(node: _PlanNode) -> Callable[[list[str]], bool]:
+  if node.kind == "PIECES":
+    counter = node.counter
+    return lambda saves: any(counter <= Counter(save) for save in saves)
+  if node.kind == "REGEX":
+    search = node.pattern.search
+    return lambda saves: any(search(save) for save in saves)
+
+  functions = [_compile(child) for child in node.children]
+  if node.kind == "NOT":
+    function = functions[0]
+    return lambda saves: not function(saves)
+  if node.kind == "AVOID":
+    function = functions[0]
+    # if there is at least one that is not the expression
+    return lambda saves: any(not function([save]) for save in saves)
+  if node.kind == "AND":
+    return lambda saves: all(function(saves) for function in functions)
+  return lambda saves: any(function(saves) for function in functions)
+
+def _measure(node: _PlanNode, saves: list[str]) -> bool:
+  '''
+  Evaluate every operand without short circuiting so each has its rate over all of the sampled rows
+  '''
+  start = time.perf_counter()
+  if node.kind == "PIECES":
+    result = any(node.counter <= Counter(save) for save in saves)
+  elif node.kind == "REGEX":
+    result = any(node.pattern.search(save) for save in saves)
+  elif node.kind == "NOT":
+    result = not _measure(node.children[0], saves)
+  elif node.kind == "AVOID":
+    result = any([not _measure(node.children[0], [save]) for save in saves])
+  elif node.kind == "AND":
+    result = all([_measure(child, saves) for child in node.children])
+  else:
+    result = any([_measure(child, saves) for child in node.children])
+
+  node.seconds += time.perf_counter() - start
+  node.evaluations += 1
+  node.trues += result
+  return result
+
+def _reorder(node: _PlanNode):
+  for child in node.children:
+    _reorder(child)
+  if node.kind in ("AND", "OR"):
+    # cheapest per row decided first, where ties keep the written order
+    node.children.sort(key=lambda child: child.cost() / child.decisive_rate(node.kind))
+
+class ExpressionPlan:
+  '''
+  Order the operands of each and and or of a wanted save are evaluated in, planned from how they evaluate on the path file
+
+  The first rows evaluate every operand to measure how often each is true and how long it takes. The rest of the rows
+  short circuit with the operands of or that are most often true for their cost first and of and that are most often
+  false for their cost first. Reordering never changes whether the wanted save is satisfied.
+  '''
+  def __init__(self, ast: AST, plan_rows: int = DEFAULT_PLAN_ROWS):
+    self.root = _to_plan_node(ast)
+    self.plan_rows = plan_rows
+    self.sampled = 0
+    self._evaluate = _compile(self.root) if plan_rows <= 0 else None
+
+  def evaluate(self, saves: list[str]) -> bool:
+    if self._evaluate is not None:
+      return self._evaluate(saves)
+
+    result = _measure(self.root, saves)
+    self.sampled += 1
+    if self.sampled >= self.plan_rows:
+      _reorder(self.root)
+      self._evaluate = _compile(self.root)
+    return result
+
+  def explain(self) -> str:
+    '''
+    The plan as a tree of the sub expressions in the order they are evaluated with their rates and times in the sample
+    '''
+    if self.sampled == 0:
+      return f"{self.root.label()} as written without measuring any rows\n"
+    if self._evaluate is None:
+      # the sample never finished so every row was measured in the order written
+      output = f"{self.root.label()} as written measured in all {self.sampled} rows, fewer than the {self.plan_rows} rows to plan from\n"
+    else:
+      output = f"{self.root.label()} planned from {self.sampled} rows\n"
+    return output + ''.join(self._explain_lines(self.root, 0))
+
+  def _explain_lines(self, node: _PlanNode, depth: int) -> Iterator[str]:
+    true_rate = node.trues / node.evaluations * 100 if node.evaluations else 0
+    name = node.kind if node.kind in ("AND", "OR", "NOT", "AVOID") else node.label()
+    yield f"{'  ' * depth}∟ {name} -> {true_rate:.2f}% true [{node.trues}/{node.evaluations}], {node.cost() * 1e6:.2f}us\n"
+    for child in node.children:
+      yield from self._explain_lines(child, depth + 1)
@@ -1,12 +1,88 @@
+import io
+import re
 import csv
+import heapq
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from os import path
 from typing import TextIO
+from .selection import RowSelection, SelectionBuilder
+from .result_cache import ResultCache, selection_key
 from .saves_reader import SavesReader, COLUMN_QUEUE, COLUMN_FUMEN_COUNT, COLUMN_USED_PIECES, COLUMN_UNUSED_PIECES, COLUMN_FUMENS, COLUMN_UNUSED_PIECES_DELIMITOR, COLUMN_FUMENS_DELIMITOR
-from .parser import Parser as WantedSavesParser, evaluate_ast_all
-from .utils import fumen_combine, fumen_combine_comments, make_fumen_url, make_tiny
-from .minimal import fumens_to_graph, find_minimal_nodes, find_best_set
+from .parser import Parser as WantedSavesParser, AST, evaluate_ast_all
+from .utils import fumen_combine_chunks, fumen_combine_comments_chunks, make_fumen_url
+from .shortener import Shortener, TINYURL_FAILED
+from .row_store import RowStore, RowStoreHandle
+from .minimal import MinimalSearch, search_minimals, fumens_to_graph, find_best_set, coverage_scores, ranking_scores
+from .constants import EXACT_ORDER_MAX_SOLVES, COVER_SOLVER_BUILTIN
+from .profiler import Profiler, NULL_PROFILER, STAGE_EXPRESSION_EVALUATION, STAGE_GRAPH_REDUCTION, STAGE_BEST_SET_SELECTION, STAGE_COVERAGE_ORDERING, STAGE_OUTPUT_ENCODING, CACHE_RESULTS
 
 PATH_COLUMNS = [COLUMN_QUEUE, COLUMN_FUMEN_COUNT, COLUMN_USED_PIECES, COLUMN_UNUSED_PIECES, COLUMN_FUMENS]
 
+def satisfied_indicies(asts: list[AST], saves: list[str]) -> list[int]:
+  '''
+  Indicies of the saves satisfying the first wanted save that any of the saves satisfies
+  '''
+  for ast in asts:
+    indicies = evaluate_ast_all(ast, saves)
+    if len(indicies) > 0:
+      return indicies
+  return []
+
+class FilterCollector:
+  '''
+  Solves of the rows satisfying a wanted save kept for unique or minimal output
+  '''
+  def __init__(self, output_type: str):
+    self.output_type = output_type
+    self.unique_fumens: set[str] = set()
+    self.line_queue_fumens_map: dict[str, list[str]] = {}
+    self.line_fumens: list[list[str]] = []
+    self.line_queues: list[str] = []
+    self.total = 0
+
+  def add(self, queue: str, new_fumens: list[str]):
+    if self.output_type == "unique":
+      self.unique_fumens |= set(new_fumens)
+    elif self.output_type == "minimal" and len(new_fumens) > 0:
+      self.line_queue_fumens_map[queue] = new_fumens
+      self.line_fumens.append(new_fumens)
+      self.line_queues.append(queue)
+
+    self.total += 1
+
+  def to_dict(self) -> dict:
+    # fumens are in many rows so each is stored once
+    fumen_ids: dict[str, int] = {}
+    data = {"total": self.total}
+    if self.output_type == "unique":
+      data["unique"] = [fumen_ids.setdefault(fumen, len(fumen_ids)) for fumen in self.unique_fumens]
+    else:
+      data["lines"] = [[queue, [fumen_ids.setdefault(fumen, len(fumen_ids)) for fumen in fumens]] for queue, fumens in zip(self.line_queues, self.line_fumens)]
+    data["fumens"] = list(fumen_ids)
+    return data
+
+  @classmethod
+  def from_dict(cls, output_type: str, data: dict) -> "FilterCollector":
+    collector = cls(output_type)
+    fumens = data["fumens"]
+    collector.unique_fumens = {fumens[i] for i in data.get("unique", [])}
+    for queue, fumen_ids in data.get("lines", []):
+      collector.add(queue, [fumens[i] for i in fumen_ids])
+    collector.total = data["total"]
+    return collector
+
+def _filtered_line(line: dict[str, str], indicies: list[int], new_fumens: list[str]) -> dict[str, str]:
+  line = dict(line)
+  line[COLUMN_FUMENS] = COLUMN_FUMENS_DELIMITOR.join(new_fumens)
+
+  unused_pieces = line[COLUMN_UNUSED_PIECES].split(COLUMN_UNUSED_PIECES_DELIMITOR)
+  line[COLUMN_UNUSED_PIECES] = COLUMN_UNUSED_PIECES_DELIMITOR.join([unused_pieces[i] for i in indicies])
+
+  line[COLUMN_FUMEN_COUNT] = str(len(new_fumens))
+  line[COLUMN_USED_PIECES] = '' # empty as not useful
+  return line
+
 def filter(
   filepath: str, 
   wanted_saves: list[str],
@@ -21,19 +97,61 @@ def filter(
   cumulative_percent: bool = False,
   output_type: str = "minimal",
   output_path: str = "",
-  tinyurl: bool = True
+  tinyurl: bool = True,
+  profiler: Profiler = NULL_PROFILER,
+  mirror: bool = False,
+  exact_order: bool = False,
+  best_set_score: str | None = None,
+  ranking_path: str | None = None,
+  shortener: Shortener | None = None,
+  chunk_pages: int = 0,
+  selection: RowSelection | None = None,
+  result_cache: ResultCache | None = None,
+  cover_solver: str = COVER_SOLVER_BUILTIN,
+  cover_export: str | None = None
 ):
-  unique_fumens = set()
-  line_queue_fumens_map = {}
-  line_fumens = []
-  total = 0
+  '''
+  Filter the path file for the solves of the rows satisfying the first wanted save that the row satisfies
+
+  Selection output type saves the rows satisfying any of the wanted saves as a selection to output path.
+  Unique and minimal are served from the result cache with the solves and minimal sets of an earlier run of the same filter.
+  Minimal writes the cover of its reduced graph to cover export if given.
+  '''
+  cache_key = None
+  if result_cache is not None and output_type in ("unique", "minimal"):
+    query = {
+      "wanted_saves": wanted_saves,
+      "leftover": leftover,
+      "build": build,
+      "width": width,
+      "height": height,
+      "hold": hold,
+      "output_type": output_type,
+      "mirror": mirror,
+      "selection": selection_key(selection),
+      "cover_solver": cover_solver,
+    }
+    cache_key = result_cache.key("filter", filepath, query)
+    cached = result_cache.get(cache_key)
+    profiler.add_cache(CACHE_RESULTS, cached is not None, cached is None)
+    if cached is not None:
+      for warn in cached["warnings"]:
+        print(warn)
+      # only the output is redone, which replays the prompts between the minimal sets
+      collector = FilterCollector.from_dict(output_type, cached["solves"])
+      search = MinimalSearch.from_dict(cached["search"]) if cached["search"] is not None else None
+      output_filter(output_type, labels, collector.unique_fumens, collector.line_fumens, collector.line_queue_fumens_map, collector.total, log_file, console_print, tinyurl, cumulative_percent, profiler, exact_order=exact_order, best_set_score=best_set_score, ranking_path=ranking_path, shortener=shortener, chunk_pages=chunk_pages, search=search, cover_solver=cover_solver, cover_export=cover_export)
+      return
+
+  collector = FilterCollector(output_type)
+  builder = SelectionBuilder(filepath, selection_expression(wanted_saves))
 
   wanted_saves_parser = WantedSavesParser() 
   asts = []
   for wanted_save in wanted_saves:
     asts.append(wanted_saves_parser.parse(wanted_save))
 
-  save_reader = SavesReader(filepath, leftover, build, width, height, hold)
+  save_reader = SavesReader(filepath, leftover, build, width, height, hold, profiler, mirror, selection)
 
   outfile = None
   filtered_path = None
@@ -42,21 +160,19 @@ def filter(
     filtered_path = csv.DictWriter(outfile, PATH_COLUMNS)
     filtered_path.writeheader()
 
-  warnings = set()
+  warnings = []
 
   for row in save_reader.read(assign_fumens=True, assign_line=True):
     if row.warn is not None and row.warn not in warnings:
-      warnings.add(row.warn)
+      warnings.append(row.warn)
       print(row.warn)
 
     # get first index that satisfies the save
     indicies = []
 
     if row.solveable:
-      for ast in asts:
-        indicies = evaluate_ast_all(ast, row.saves)
-        if len(indicies) > 0:
-          break
+      with profiler.stage(STAGE_EXPRESSION_EVALUATION):
+        indicies = satisfied_indicies(asts, row.saves)
 
     if row.fumens is None:
       raise RuntimeError("Expected fumens to be populated from save reader")
@@ -67,29 +183,281 @@ def filter(
     for i in indicies:
       new_fumens += row.fumens[i]
 
-    if output_type == "unique":
-      unique_fumens |= set(new_fumens)
+    collector.add(row.queue, new_fumens)
+    if output_type == "selection":
+      builder.add(save_reader.row_index, len(indicies) > 0)
 
-    elif output_type == "minimal" and len(new_fumens) > 0:
-      line_queue_fumens_map[row.queue] = new_fumens
-      line_fumens.append(new_fumens)
+    if filtered_path is not None:
+      with profiler.stage(STAGE_OUTPUT_ENCODING):
+        filtered_path.writerow(_filtered_line(row.line, indicies, new_fumens))
 
-    elif filtered_path is not None:
-      row.line[COLUMN_FUMENS] = COLUMN_FUMENS_DELIMITOR.join(new_fumens)
-      
-      unused_pieces = row.line[COLUMN_UNUSED_PIECES].split(COLUMN_UNUSED_PIECES_DELIMITOR)
-      row.line[COLUMN_UNUSED_PIECES] = COLUMN_UNUSED_PIECES_DELIMITOR.join([unused_pieces[i] for i in indicies])
-      
-      row.line[COLUMN_FUMEN_COUNT] = str(len(new_fumens))
-      row.line[COLUMN_USED_PIECES] = '' # empty as not useful
-   
-      filtered_path.writerow(row.line)
+  if outfile is not None:
+    outfile.close()
 
-    total += 1
+  if output_type == "selection":
+    output_selection(builder, labels, output_path, selection, log_file, console_print)
+    return
 
-  if outfile is not None:
+  search = None
+  if result_cache is not None and cache_key is not None:
+    # cached before the prompts so stopping at a prompt still keeps the minimal sets
+    if output_type == "minimal" and len(collector.line_fumens) > 0:
+      search = search_minimals(collector.line_fumens, profiler, cover_solver)
+    result_cache.put(cache_key, {"solves": collector.to_dict(), "search": search.to_dict() if search is not None else None, "warnings": warnings})
+
+  output_filter(output_type, labels, collector.unique_fumens, collector.line_fumens, collector.line_queue_fumens_map, collector.total, log_file, console_print, tinyurl, cumulative_percent, profiler, exact_order=exact_order, best_set_score=best_set_score, ranking_path=ranking_path, shortener=shortener, chunk_pages=chunk_pages, search=search, cover_solver=cover_solver, cover_export=cover_export)
+
+def selection_expression(wanted_saves: list[str]) -> str:
+  # a row is selected by the first wanted save it satisfies so by any of them
+  if len(wanted_saves) == 1:
+    return wanted_saves[0]
+  return " || ".join(f"({wanted_save})" for wanted_save in wanted_saves)
+
+def output_selection(builder: SelectionBuilder, labels: list[str], output_path: str, selection: RowSelection | None, log_file: TextIO, console_print: bool):
+  '''
+  Save the rows selected by the wanted saves, where rows outside of the selection read from aren't selected
+  '''
+  row_selection = builder.build(selection.rows if selection is not None else None)
+  if selection is not None:
+    row_selection.expression = f"({selection.expression}) && ({row_selection.expression})"
+  row_selection.save(output_path)
+
+  output = f"{','.join(labels)}: {row_selection.count()}/{row_selection.rows} rows selected into {output_path}\n"
+  log_file.write(output)
+  if console_print: print(output, end='')
+
+def label_filename(index: int, label: str) -> str:
+  '''
+  Name of the output file of a wanted save that is safe for any label
+  '''
+  name = re.sub(r'[^0-9A-Za-z]+', '_', label).strip('_')
+  return f"{index}_{name}" if name else str(index)
+
+def _output_label(
+  output_type: str,
+  label: str,
+  collector: FilterCollector,
+  output_path: str,
+  console_print: bool,
+  tinyurl: bool,
+  cumulative_percent: bool,
+  interactive: bool,
+  exact_order: bool,
+  best_set_score: str | None,
+  ranking_path: str | None,
+  chunk_pages: int,
+  cover_solver: str,
+  shortener: Shortener | None
+):
+  with open(output_path, 'w', encoding="utf8") as label_file:
+    output_filter(output_type, [label], collector.unique_fumens, collector.line_fumens, collector.line_queue_fumens_map, collector.total, label_file, console_print, tinyurl, cumulative_percent, interactive=interactive, exact_order=exact_order, best_set_score=best_set_score, ranking_path=ranking_path, shortener=shortener, chunk_pages=chunk_pages, cover_solver=cover_solver)
+
+def _output_label_captured(*args) -> tuple[str, list[str]]:
+  # the console output of each worker is printed by the main process so the workers don't interleave
+  console = io.StringIO()
+  with contextlib.redirect_stdout(console):
+    _output_label(*args)
+
+  # urls left for the main process to shorten together
+  shortener = args[-1]
+  return console.getvalue(), shortener.pending if shortener is not None else []
+
+def _filter_label_shared(
+  handle: RowStoreHandle,
+  wanted_save: str,
+  output_type: str,
+  label: str,
+  output_path: str,
+  tinyurl: bool,
+  cumulative_percent: bool,
+  exact_order: bool,
+  best_set_score: str | None,
+  ranking_path: str | None,
+  chunk_pages: int,
+  cover_solver: str,
+  shortener: Shortener | None
+) -> tuple[str, list[str]]:
+  # the rows are read from the store shared by every worker instead of parsing the path file again
+  store = RowStore.attach(handle)
+  try:
+    ast = WantedSavesParser().parse(wanted_save)
+    collector = FilterCollector(output_type)
+    for row in store.rows(assign_fumens=True):
+      indicies = evaluate_ast_all(ast, row.saves) if row.solveable else []
+      collector.add(row.queue, [fumen for i in indicies for fumen in (row.fumens or [])[i]])
+  finally:
+    store.close()
+
+  return _output_label_captured(output_type, label, collector, output_path, True, tinyurl, cumulative_percent, False, exact_order, best_set_score, ranking_path, chunk_pages, cover_solver, shortener)
+
+def filter_all_expressions(
+  filepath: str,
+  wanted_saves: list[str],
+  labels: list[str],
+  leftover: str,
+  build: str,
+  width: int,
+  height: int,
+  hold: int,
+  log_file: TextIO,
+  output_dir: str,
+  console_print: bool = True,
+  cumulative_percent: bool = False,
+  output_type: str = "minimal",
+  tinyurl: bool = True,
+  workers: int = 1,
+  profiler: Profiler = NULL_PROFILER,
+  mirror: bool = False,
+  exact_order: bool = False,
+  best_set_score: str | None = None,
+  ranking_path: str | None = None,
+  shortener: Shortener | None = None,
+  chunk_pages: int = 0,
+  selection: RowSelection | None = None,
+  cover_solver: str = COVER_SOLVER_BUILTIN
+):
+  '''
+  Filter each wanted save separately in one pass of the path file with the output of each in its own file in output dir
+
+  Unique and minimal with more than one worker parse the path file once into shared memory, then each worker filters
+  and outputs its wanted saves from it without prompting for the best set unless scored
+  '''
+  names = [label_filename(i, label) for i, label in enumerate(labels)]
+  extension = {"file": ".csv", "selection": ".json"}.get(output_type, ".txt")
+  output_paths = [path.join(output_dir, name + extension) for name in names]
+
+  if workers > 1 and len(wanted_saves) > 1 and output_type in ("unique", "minimal"):
+    save_reader = SavesReader(filepath, leftover, build, width, height, hold, profiler, mirror, selection)
+    store, warnings = RowStore.load(save_reader)
+    for warn in warnings:
+      print(warn)
+
+    if tinyurl and shortener is None:
+      shortener = Shortener()
+    deferred = shortener.deferred() if tinyurl and shortener is not None else None
+
+    try:
+      with ProcessPoolExecutor(max_workers=min(workers, len(wanted_saves))) as executor:
+        futures = [
+          executor.submit(_filter_label_shared, store.handle, wanted_save, output_type, label, output_path, tinyurl, cumulative_percent, exact_order, best_set_score, ranking_path, chunk_pages, cover_solver, deferred)
+          for wanted_save, label, output_path in zip(wanted_saves, labels, output_paths)
+        ]
+        results = [future.result() for future in futures]
+    finally:
+      store.close()
+
+    consoles = [console for console, _ in results]
+    urls = [url for _, pending in results for url in pending]
+    if shortener is not None and urls:
+      for output_path in output_paths:
+        with open(output_path, 'r', encoding="utf8") as label_file:
+          text = label_file.read()
+        with open(output_path, 'w', encoding="utf8") as label_file:
+          label_file.write(shortener.replace_all([text], urls)[0])
+      consoles = shortener.replace_all(consoles, urls)
+
+    if console_print:
+      # the same as printed without workers, including the lines only printed to console
+      for label, console in zip(labels, consoles):
+        print(f"[{label}]")
+        print(console, end='')
+
+    _output_label_paths(labels, output_paths, log_file, console_print)
+    return
+
+  wanted_saves_parser = WantedSavesParser()
+  asts = [wanted_saves_parser.parse(wanted_save) for wanted_save in wanted_saves]
+  collectors = [FilterCollector(output_type) for _ in asts]
+  builders = [SelectionBuilder(filepath, wanted_save) for wanted_save in wanted_saves]
+
+  save_reader = SavesReader(filepath, leftover, build, width, height, hold, profiler, mirror, selection)
+
+  outfiles = []
+  filtered_paths = []
+  if output_type == "file":
+    for name in names:
+      outfile = open(path.join(output_dir, name + ".csv"), 'w')
+      filtered_path = csv.DictWriter(outfile, PATH_COLUMNS)
+      filtered_path.writeheader()
+      outfiles.append(outfile)
+      filtered_paths.append(filtered_path)
+
+  warnings = set()
+
+  for row in save_reader.read(assign_fumens=True, assign_line=output_type == "file"):
+    if row.warn is not None and row.warn not in warnings:
+      warnings.add(row.warn)
+      print(row.warn)
+
+    if row.fumens is None:
+      raise RuntimeError("Expected fumens to be populated from save reader")
+
+    for i, (ast, collector) in enumerate(zip(asts, collectors)):
+      indicies = []
+      if row.solveable:
+        with profiler.stage(STAGE_EXPRESSION_EVALUATION):
+          indicies = evaluate_ast_all(ast, row.saves)
+
+      new_fumens = []
+      for j in indicies:
+        new_fumens += row.fumens[j]
+
+      collector.add(row.queue, new_fumens)
+      if output_type == "selection":
+        builders[i].add(save_reader.row_index, len(indicies) > 0)
+
+      if output_type == "file" and row.line is not None:
+        with profiler.stage(STAGE_OUTPUT_ENCODING):
+          filtered_paths[i].writerow(_filtered_line(row.line, indicies, new_fumens))
+
+  for outfile in outfiles:
     outfile.close()
 
+  if output_type == "selection":
+    for builder, label, output_path in zip(builders, labels, output_paths):
+      output_selection(builder, [label], output_path, selection, log_file, console_print)
+    return
+
+  if output_type != "file":
+    for label, collector, output_path in zip(labels, collectors, output_paths):
+      if console_print:
+        print(f"[{label}]")
+      _output_label(output_type, label, collector, output_path, console_print, tinyurl, cumulative_percent, True, exact_order, best_set_score, ranking_path, chunk_pages, cover_solver, shortener)
+
+  _output_label_paths(labels, output_paths, log_file, console_print)
+
+def _output_label_paths(labels: list[str], output_paths: list[str], log_file: TextIO, console_print: bool):
+  output = ''.join(f"{label}: {output_path}\n" for label, output_path in zip(labels, output_paths))
+  log_file.write(output)
+  if console_print: print(output, end='')
+
+def output_filter(
+  output_type: str,
+  labels: list[str],
+  unique_fumens: set[str],
+  line_fumens: list[list[str]],
+  line_queue_fumens_map: dict[str, list[str]],
+  total: int,
+  log_file: TextIO,
+  console_print: bool,
+  tinyurl: bool,
+  cumulative_percent: bool,
+  profiler: Profiler = NULL_PROFILER,
+  interactive: bool = True,
+  exact_order: bool = False,
+  best_set_score: str | None = None,
+  ranking_path: str | None = None,
+  shortener: Shortener | None = None,
+  chunk_pages: int = 0,
+  search: MinimalSearch | None = None,
+  cover_solver: str = COVER_SOLVER_BUILTIN,
+  cover_export: str | None = None
+):
+  '''
+  Output the solves collected by filter for unique or minimal, split into fumens of chunk pages if not 0
+
+  Minimal output searches for the minimal sets unless given the search of an earlier run
+  '''
   # No solutions
   if (output_type == "unique" and len(unique_fumens) == 0) or (output_type == "minimal" and len(line_fumens) == 0):
     log_file.write("No solutions found")
@@ -99,12 +467,84 @@ def filter(
 
   if output_type == "unique":
     # combine all the fumens together
-    unique_solves = fumen_combine(list(unique_fumens))
-    log_file.write(unique_solves)
-    if console_print:
-      print(unique_solves)
+    # each chunk is output as soon as it's encoded
+    with profiler.stage(STAGE_OUTPUT_ENCODING):
+      for i, unique_solves in enumerate(fumen_combine_chunks(unique_fumens, chunk_pages)):
+        log_file.write(('\n' if i else '') + unique_solves)
+        if console_print:
+          print(unique_solves)
   elif output_type == "minimal":
-    generate_minimals(labels, line_fumens, line_queue_fumens_map, total, log_file, console_print, tinyurl, cumulative_percent)
+    generate_minimals(labels, line_fumens, line_queue_fumens_map, total, log_file, console_print, tinyurl, cumulative_percent, profiler, interactive, exact_order, best_set_score, ranking_path, shortener, chunk_pages, search, cover_solver, cover_export)
+
+def queue_masks(cover_queues: list[set[str]]) -> list[int]:
+  '''
+  Queues covered by each solve as a bitmask with a bit for each queue
+  '''
+  queue_bits: dict[str, int] = {}
+  masks = []
+  for queues in cover_queues:
+    mask = 0
+    for queue in queues:
+      bit = queue_bits.setdefault(queue, len(queue_bits))
+      mask |= 1 << bit
+    masks.append(mask)
+  return masks
+
+def greedy_coverage_order(masks: list[int]) -> list[int]:
+  '''
+  Order of the solves where each next solve covers the most queues not yet covered, first index on ties
+
+  The queues a solve adds can only shrink as more are covered so a solve is only recounted when it's at the top of the heap
+  '''
+  heap = [(-mask.bit_count(), i) for i, mask in enumerate(masks)]
+  heapq.heapify(heap)
+
+  covered = 0
+  indicies = []
+  while heap:
+    _, i = heapq.heappop(heap)
+    entry = (-(masks[i] & ~covered).bit_count(), i)
+    if heap and entry > heap[0]:
+      heapq.heappush(heap, entry)
+      continue
+
+    if entry[0] == 0:
+      raise RuntimeError("Somehow minimal set isn't minimal")
+
+    covered |= masks[i]
+    indicies.append(i)
+
+  return indicies
+
+def exact_coverage_order(masks: list[int]) -> list[int]:
+  '''
+  Order of the solves with the most queues covered summed over each number of solves learned
+
+  Best order of each subset of the solves is found from the best of the subset without its last solve
+  '''
+  count = len(masks)
+  unions = [0] * (1 << count)
+  areas = [0] * (1 << count)
+  lasts = [0] * (1 << count)
+  for subset in range(1, 1 << count):
+    low = subset & -subset
+    unions[subset] = unions[subset ^ low] | masks[low.bit_length() - 1]
+
+    best_area = -1
+    for i in range(count):
+      bit = 1 << i
+      if subset & bit and areas[subset ^ bit] > best_area:
+        best_area = areas[subset ^ bit]
+        lasts[subset] = i
+    areas[subset] = best_area + unions[subset].bit_count()
+
+  indicies = []
+  subset = (1 << count) - 1
+  while subset:
+    indicies.append(lasts[subset])
+    subset ^= 1 << lasts[subset]
+  indicies.reverse()
+  return indicies
 
 def generate_minimals(
   labels: list[str], 
@@ -114,17 +554,49 @@ def generate_minimals(
   log_file: TextIO, 
   console_print: bool, 
   tinyurl: bool, 
-  cumulative_percent: bool
+  cumulative_percent: bool,
+  profiler: Profiler = NULL_PROFILER,
+  interactive: bool = True,
+  exact_order: bool = False,
+  best_set_score: str | None = None,
+  ranking_path: str | None = None,
+  shortener: Shortener | None = None,
+  chunk_pages: int = 0,
+  search: MinimalSearch | None = None,
+  cover_solver: str = COVER_SOLVER_BUILTIN,
+  cover_export: str | None = None
 ):
-  graph = fumens_to_graph(line_fumens)
-
-  log_file.write(f"{len(graph.edges)} edges, {len(graph.nodes)} nodes\n")
-  print(f"{len(graph.edges)} edges, {len(graph.nodes)} nodes")
-
-  minimal_sets = find_minimal_nodes(graph.edges)
-  print(f'You must learn {minimal_sets.count} solutions to cover all queues. There are {len(minimal_sets.sets)} combinations of solutions to cover all patterns.');
+  if cover_export is not None:
+    from .cover_solver import export_cover
+    with profiler.stage(STAGE_GRAPH_REDUCTION):
+      graph = fumens_to_graph(line_fumens)
+    export_cover(graph, cover_export)
+    print(f"Cover of {len(graph.edges)} queues by {len(graph.nodes)} fumens written to {cover_export}")
+
+  # the graph and minimal sets of an earlier run only need the prompts replayed
+  if search is None:
+    search = search_minimals(line_fumens, profiler, cover_solver)
+  minimal_sets = search.minimal_sets
+
+  log_file.write(f"{search.edges} edges, {search.nodes} nodes\n")
+  print(f"{search.edges} edges, {search.nodes} nodes")
+
+  if search.solver is not None:
+    print(f'You must learn {minimal_sets.count} solutions to cover all queues. Found one combination of solutions to cover all patterns with {search.solver}.')
+  else:
+    print(f'You must learn {minimal_sets.count} solutions to cover all queues. There are {len(minimal_sets.sets)} combinations of solutions to cover all patterns.');
   
-  best_set = find_best_set(minimal_sets.sets, log_file)
+  # includes the time waiting on the prompts
+  with profiler.stage(STAGE_BEST_SET_SELECTION):
+    if best_set_score == "coverage":
+      best_set = find_best_set(minimal_sets.sets, log_file, coverage_scores(line_queue_fumens_map))
+    elif best_set_score == "ranking" and ranking_path is not None:
+      best_set = find_best_set(minimal_sets.sets, log_file, ranking_scores(ranking_path))
+    elif interactive:
+      best_set = find_best_set(minimal_sets.sets, log_file)
+    else:
+      # can't prompt so take the first of the sets
+      best_set = minimal_sets.sets[0]
   fumen_set = set(map(lambda n: n.key, best_set))
 
   fumen_queue_map = {}
@@ -143,34 +615,22 @@ def generate_minimals(
   cover_queues = list(fumen_queue_map.values())
   if cumulative_percent:
 
-    queue_set = set()
+    with profiler.stage(STAGE_COVERAGE_ORDERING):
+      masks = queue_masks(cover_queues)
+      if exact_order and len(masks) <= EXACT_ORDER_MAX_SOLVES:
+        indicies = exact_coverage_order(masks)
+      else:
+        if exact_order:
+          print(f"Exact order is limited to {EXACT_ORDER_MAX_SOLVES} solves, ordering greedily instead")
+        indicies = greedy_coverage_order(masks)
 
-    # greedy find the solve with most coverage
-    # first one, always first fumen has equally most coverage
-    indicies = []
-    queue_set = set()
-
-    # get the solve with largest remaining cover
-    for _ in range(len(cover_queues)):
-      largest_size = 0
-      largest_index = -1
-      for i in range(len(cover_queues)):
-        if i in indicies:
-          continue
-        size = len(cover_queues[i] - queue_set)
-        if size > largest_size:
-          largest_size = size
-          largest_index = i
-
-      if largest_index == -1:
-        raise RuntimeError("Somehow minimal set isn't minimal")
-
-      queue_set |= cover_queues[largest_index]
-      cover_count = len(queue_set)
+    covered = 0
+    for i in indicies:
+      covered |= masks[i]
+      cover_count = covered.bit_count()
       percent = cover_count / total * 100
       percent = f': {percent:.2f}% ({cover_count}/{total})'
       percents.append(percent)
-      indicies.append(largest_index)
 
     fumens = list(fumen_queue_map.keys())
     fumens = [fumens[i] for i in indicies]
@@ -186,18 +646,22 @@ def generate_minimals(
       percent = f': {percent:.2f}% ({cover_count}/{total})'
       percents.append(percent)
 
-  minimal_fumen = fumen_combine_comments(fumens, percents, True)
-  
-  line = minimal_fumen
-  if tinyurl:
-    try:
-      line = make_tiny(make_fumen_url(minimal_fumen))
-    except:
-      line = "Tinyurl did not accept fumen due to url length"
-  
-  line = f"True minimal for {','.join(labels)}:\n{line}"
-  
-  log_file.write(line + '\n')
+  header = f"True minimal for {','.join(labels)}:"
+  log_file.write(header + '\n')
   if console_print:
-    print(line)
+    print(header)
+
+  # each chunk is output as soon as it's encoded
+  with profiler.stage(STAGE_OUTPUT_ENCODING):
+    for minimal_fumen in fumen_combine_comments_chunks(fumens, percents, True, chunk_pages):
+      line = minimal_fumen
+      if tinyurl:
+        if shortener is None:
+          shortener = Shortener()
+        short_url = shortener.shorten(make_fumen_url(minimal_fumen))
+        line = short_url if short_url is not None else TINYURL_FAILED
+
+      log_file.write(line + '\n')
+      if console_print:
+        print(line)
   
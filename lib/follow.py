@@ -0,0 +1,187 @@
+import hashlib
+import json
+import time
+from os import path
+from typing import TextIO
+from .saves_reader import SavesReader
+from .parser import Parser as WantedSavesParser
+from .percent import PercentCounter, FailsWriter, first_saveable_index, open_fails_file, print_percent
+from .profiler import Profiler, NULL_PROFILER, STAGE_EXPRESSION_EVALUATION, STAGE_TREE_UPDATE, STAGE_OUTPUT_ENCODING
+
+CHECKPOINT_VERSION = 2
+CHECKPOINT_SUFFIX = "_checkpoint.json"
+DEFAULT_FOLLOW_INTERVAL = 10.0
+# seconds to wait for more rows to be written
+FOLLOW_POLL_INTERVAL = 0.5
+# bytes at the start of the path file hashed to know it wasn't rewritten
+HEAD_HASH_SIZE = 1 << 16
+
+def _head_hash(filepath: str, offset: int) -> str:
+  with open(filepath, 'rb') as infile:
+    return hashlib.sha1(infile.read(min(offset, HEAD_HASH_SIZE))).hexdigest()
+
+def _load_checkpoint(checkpoint_path: str, query: dict) -> dict | None:
+  if not path.exists(checkpoint_path):
+    return None
+  with open(checkpoint_path, 'r', encoding="utf8") as infile:
+    try:
+      checkpoint = json.load(infile)
+    except json.JSONDecodeError:
+      return None
+
+  if not isinstance(checkpoint, dict) or checkpoint.get("version") != CHECKPOINT_VERSION or checkpoint.get("query") != query:
+    return None
+
+  # path file was replaced by another run of sfinder
+  offset = checkpoint["offset"]
+  filepath = query["path_file"]
+  if path.getsize(filepath) < offset or _head_hash(filepath, offset) != checkpoint["head_hash"]:
+    return None
+
+  return checkpoint
+
+def _save_checkpoint(checkpoint_path: str, query: dict, offset: int, counters: list[PercentCounter]):
+  checkpoint = {
+    "version": CHECKPOINT_VERSION,
+    "query": query,
+    "offset": offset,
+    "head_hash": _head_hash(query["path_file"], offset),
+    "counters": [counter.to_dict() for counter in counters],
+    # the fails were already written out so only how many is kept
+    "num_fails": [counter.fails_writer.num_fails for counter in counters],
+  }
+  with open(checkpoint_path, 'w', encoding="utf8") as outfile:
+    json.dump(checkpoint, outfile)
+
+def follow_percent(
+  filepath: str,
+  wanted_saves: list[str],
+  labels: list[str],
+  leftover: str,
+  build: str,
+  width: int,
+  height: int,
+  hold: int,
+  log_file: TextIO,
+  checkpoint_path: str,
+  console_print: bool = True,
+  include_fails: bool = False,
+  over_solves: bool = False,
+  best_save: bool = False,
+  tree_depth: int = 0,
+  interval: float = DEFAULT_FOLLOW_INTERVAL,
+  idle_timeout: float | None = None,
+  profiler: Profiler = NULL_PROFILER,
+  mirror: bool = False,
+  fails_path: str = ''
+):
+  '''
+  Percent of a path file as rows are appended to it, resuming from the checkpoint of the same query
+
+  Updated percents are output every interval seconds with the checkpoint saved. Stops once no rows
+  were added for idle timeout seconds (0 stops as soon as caught up) or when interrupted. Fails are
+  written as they are found, appending to the fails file when resuming.
+  '''
+  wanted_saves_parser = WantedSavesParser()
+  asts = [wanted_saves_parser.parse(wanted_save) for wanted_save in wanted_saves]
+
+  # each wanted save is its own percent unless prioritized with best save
+  if best_save:
+    groups = [(list(range(len(asts))), labels)]
+  else:
+    groups = [([i], [label]) for i, label in enumerate(labels)]
+
+  query = {
+    "path_file": path.abspath(filepath),
+    "wanted_saves": wanted_saves,
+    "leftover": leftover,
+    "build": build,
+    "width": width,
+    "height": height,
+    "hold": hold,
+    "include_fails": include_fails,
+    "over_solves": over_solves,
+    "best_save": best_save,
+    "tree_depth": tree_depth,
+    "mirror": mirror,
+    "fails_path": path.abspath(fails_path) if fails_path else '',
+  }
+
+  save_reader = SavesReader(filepath, leftover, build, width, height, hold, profiler, mirror)
+  checkpoint = _load_checkpoint(checkpoint_path, query)
+  fails_file = open_fails_file(fails_path, checkpoint is not None) if fails_path else None
+  # fails are streamed out so neither memory nor the checkpoint grows with the number of fails
+  counters = [
+    PercentCounter(len(indicies), tree_depth, include_fails, FailsWriter(group_labels, log_file, console_print, fails_file, fails_path))
+    for indicies, group_labels in groups
+  ]
+
+  offset = None
+  if checkpoint is not None:
+    offset = checkpoint["offset"]
+    for counter, counter_dict, num_fails in zip(counters, checkpoint["counters"], checkpoint["num_fails"]):
+      counter.load_dict(counter_dict)
+      counter.fails_writer.num_fails = num_fails
+
+  def output(final: bool = False):
+    # the checkpoint only counts the fails that made it into the fails file
+    if fails_file is not None:
+      fails_file.flush()
+    _save_checkpoint(checkpoint_path, query, save_reader.offset, counters)
+    with profiler.stage(STAGE_OUTPUT_ENCODING):
+      for counter, (_, group_labels) in zip(counters, groups):
+        if final:
+          counter.fails_writer.close()
+        print_percent(group_labels, counter.saveable_counters, counter.total, log_file, console_print, [], tree_depth)
+    log_file.flush()
+
+  warnings = set()
+  last_output = time.monotonic()
+  last_row = time.monotonic()
+  changed = checkpoint is None
+
+  def count(row):
+    if row.warn is not None and row.warn not in warnings:
+      warnings.add(row.warn)
+      print(row.warn)
+
+    if over_solves and not row.solveable:
+      return
+
+    for counter, (indicies, _) in zip(counters, groups):
+      with profiler.stage(STAGE_EXPRESSION_EVALUATION):
+        index = first_saveable_index([asts[i] for i in indicies], row.saves)
+      with profiler.stage(STAGE_TREE_UPDATE):
+        counter.add(row.queue, index)
+
+  try:
+    while True:
+      for row in save_reader.read_appended(offset):
+        count(row)
+        changed = True
+        last_row = time.monotonic()
+
+        if time.monotonic() - last_output >= interval:
+          output()
+          last_output = time.monotonic()
+          changed = False
+      offset = save_reader.offset
+
+      if idle_timeout is not None and time.monotonic() - last_row >= idle_timeout:
+        # sfinder is done writing so a last row without a newline is complete
+        for row in save_reader.read_appended(offset, final=True):
+          count(row)
+        break
+
+      if changed and time.monotonic() - last_output >= interval:
+        output()
+        last_output = time.monotonic()
+        changed = False
+
+      time.sleep(FOLLOW_POLL_INTERVAL)
+  except KeyboardInterrupt:
+    pass
+
+  output(True)
+  if fails_file is not None:
+    fails_file.close()
@@ -0,0 +1,217 @@
+import json
+import math
+from typing import TextIO
+from collections import Counter
+from itertools import combinations
+from os import path
+from .saves_reader import SavesReader
+from .parser import Parser as WantedSavesParser, PiecesLiteral
+from .percent import PercentNode, print_percent
+from .constants import BAG
+from .profiler import Profiler, NULL_PROFILER, STAGE_EXPRESSION_EVALUATION
+
+LATTICE_VERSION = 1
+
+Multiset = tuple[int, ...]
+
+def _to_multiset(pieces: str) -> Multiset:
+  counter = Counter(pieces)
+  return tuple(counter[piece] for piece in BAG)
+
+def _is_submultiset(a: Multiset, b: Multiset) -> bool:
+  return all(x <= y for x, y in zip(a, b))
+
+def _maximal_saves(saves: list[str]) -> frozenset[Multiset]:
+  '''
+  Saves that aren't contained in another save of the row as those don't change what the row can save
+  '''
+  multisets = set(map(_to_multiset, saves))
+  return frozenset(a for a in multisets if not any(a != b and _is_submultiset(a, b) for b in multisets))
+
+def _lattice_metadata(filepath: str, leftover: str, build: str, width: int, height: int, hold: int, over_solves: bool, mirror: bool) -> dict:
+  # the size and modified time of the path file to know when the lattice is out of date
+  return {
+    "path_file": path.abspath(filepath),
+    "size": path.getsize(filepath),
+    "mtime": path.getmtime(filepath),
+    "leftover": leftover,
+    "build": build,
+    "width": width,
+    "height": height,
+    "hold": hold,
+    "over_solves": over_solves,
+    "mirror": mirror,
+  }
+
+class SaveLattice:
+  '''
+  Number of queues able to save each multiset of pieces up to the longest save
+
+  The multisets are packed into an index with a mixed radix of the max count of each piece in TILJSZO order
+  '''
+  def __init__(self, radix: list[int], counts: list[int], total: int, metadata: dict):
+    self.radix = radix
+    self.counts = counts
+    self.total = total
+    self.metadata = metadata
+
+    self._strides = []
+    stride = 1
+    for size in radix:
+      self._strides.append(stride)
+      stride *= size
+
+  def index(self, multiset: Multiset) -> int | None:
+    if any(count >= size for count, size in zip(multiset, self.radix)):
+      return None
+    return sum(count * stride for count, stride in zip(multiset, self._strides))
+
+  def count(self, pieces: str) -> int:
+    '''
+    Number of queues with a save containing all of the pieces
+    '''
+    i = self.index(_to_multiset(pieces))
+    return 0 if i is None else self.counts[i]
+
+  def save(self, filepath: str):
+    with open(filepath, 'w', encoding="utf8") as outfile:
+      json.dump({
+        "version": LATTICE_VERSION,
+        "metadata": self.metadata,
+        "total": self.total,
+        "radix": self.radix,
+        "counts": self.counts,
+      }, outfile)
+
+  @classmethod
+  def load(cls, filepath: str) -> "SaveLattice | None":
+    if not path.exists(filepath):
+      return None
+    with open(filepath, 'r', encoding="utf8") as infile:
+      try:
+        data = json.load(infile)
+      except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict) or data.get("version") != LATTICE_VERSION:
+      return None
+    return cls(data["radix"], data["counts"], data["total"], data["metadata"])
+
+def _superset_sum(counts: list[int], radix: list[int]):
+  '''
+  Zeta transform in place so each multiset has the sum of the values of all multisets containing it
+  '''
+  stride = 1
+  for size in radix:
+    block = stride * size
+    for start in range(0, len(counts), block):
+      # suffix sum along this piece from the largest count down
+      for k in range(size - 2, -1, -1):
+        base = start + k * stride
+        for i in range(base, base + stride):
+          counts[i] += counts[i + stride]
+    stride = block
+
+def build_save_lattice(
+  filepath: str,
+  leftover: str,
+  build: str,
+  width: int,
+  height: int,
+  hold: int,
+  over_solves: bool = False,
+  profiler: Profiler = NULL_PROFILER,
+  mirror: bool = False
+) -> SaveLattice:
+  '''
+  Read the path file once to count the queues able to save every multiset of pieces
+  '''
+  save_reader = SavesReader(filepath, leftover, build, width, height, hold, profiler, mirror)
+
+  # rows share the same maximal saves often so only count each distinct set
+  maximal_saves_counts: Counter[frozenset[Multiset]] = Counter()
+  total = 0
+  for row in save_reader.read():
+    if over_solves and not row.solveable:
+      continue
+    total += 1
+    if row.saves:
+      maximal_saves_counts[_maximal_saves(row.saves)] += 1
+
+  with profiler.stage(STAGE_EXPRESSION_EVALUATION):
+    # a queue can save a multiset if any of its saves contains it, which by inclusion-exclusion
+    # is adding each save and alternating subtracting and adding the intersections of the saves
+    exact_counts: Counter[Multiset] = Counter()
+    for maximal_saves, count in maximal_saves_counts.items():
+      saves = list(maximal_saves)
+      for size in range(1, len(saves) + 1):
+        sign = 1 if size % 2 == 1 else -1
+        for subset in combinations(saves, size):
+          meet = tuple(map(min, zip(*subset)))
+          exact_counts[meet] += sign * count
+
+    radix = [max((multiset[i] for multiset in exact_counts), default=0) + 1 for i in range(len(BAG))]
+    metadata = _lattice_metadata(filepath, leftover, build, width, height, hold, over_solves, mirror)
+    lattice = SaveLattice(radix, [0] * math.prod(radix), total, metadata)
+    for multiset, count in exact_counts.items():
+      lattice.counts[lattice.index(multiset)] += count
+
+    _superset_sum(lattice.counts, radix)
+
+  return lattice
+
+def get_save_lattice(
+  filepath: str,
+  lattice_path: str,
+  leftover: str,
+  build: str,
+  width: int,
+  height: int,
+  hold: int,
+  over_solves: bool = False,
+  profiler: Profiler = NULL_PROFILER,
+  mirror: bool = False
+) -> SaveLattice:
+  '''
+  Load the lattice from lattice path if made from the same path file and options, otherwise build and store it
+  '''
+  lattice = SaveLattice.load(lattice_path)
+  metadata = _lattice_metadata(filepath, leftover, build, width, height, hold, over_solves, mirror)
+  if lattice is not None and lattice.metadata == metadata:
+    return lattice
+
+  lattice = build_save_lattice(filepath, leftover, build, width, height, hold, over_solves, profiler, mirror)
+  # the stored lattice only saves reading the path file again so the percents are still output without it
+  try:
+    lattice.save(lattice_path)
+  except OSError:
+    pass
+  return lattice
+
+def lattice_percent(
+  filepath: str,
+  lattice_path: str,
+  wanted_saves: list[str],
+  labels: list[str],
+  leftover: str,
+  build: str,
+  width: int,
+  height: int,
+  hold: int,
+  log_file: TextIO,
+  console_print: bool = True,
+  over_solves: bool = False,
+  profiler: Profiler = NULL_PROFILER,
+  mirror: bool = False
+):
+  '''
+  Percent of each wanted save looked up in the save lattice instead of evaluated on each queue
+  '''
+  wanted_saves_parser = WantedSavesParser()
+  for wanted_save in wanted_saves:
+    if not isinstance(wanted_saves_parser.parse(wanted_save), PiecesLiteral):
+      raise ValueError(f"Expression {wanted_save} must be only pieces to use the lattice")
+
+  lattice = get_save_lattice(filepath, lattice_path, leftover, build, width, height, hold, over_solves, profiler, mirror)
+
+  saveable_counters = [PercentNode(lattice.count(wanted_save)) for wanted_save in wanted_saves]
+  print_percent(labels, saveable_counters, PercentNode(lattice.total), log_file, console_print, [], 0)
@@ -1,13 +1,14 @@
 # code based on https://github.com/eight04/sfinder-strict-minimal/blob/master/index.js
 
+import sys
 from dataclasses import dataclass
-from typing import Iterable, TextIO
+from typing import Iterable, Iterator, TextIO
 from shutil import get_terminal_size
 from .utils import display_fumen, SQUARECHARWIDTH
-from .constants import DEFAULT_WIDTH
+from .constants import DEFAULT_WIDTH, COVER_SOLVER_BUILTIN
+from .profiler import Profiler, NULL_PROFILER, STAGE_GRAPH_REDUCTION, STAGE_MINIMAL_SEARCH, COUNTER_MINIMAL_SEARCH_STEPS
 
-import sys
-sys.setrecursionlimit(5000)
+MIN_RECURSION_LIMIT = 5000
 
 class Node:
   def __init__(self, key: str, edges: set["Edge"], color: int, alter: list["Node"], redundant: bool = False):
@@ -33,8 +34,51 @@ class MinimalSets:
   count: int
   sets: list[list[Node]]
 
+@dataclass
+class MinimalSearch:
+  '''
+  Size of the reduced graph and its minimal sets, which is all of the minimal output that doesn't depend on the prompts
+
+  Sets found by an installed solver are only one of the minimal sets, with the name of the solver.
+  '''
+  edges: int
+  nodes: int
+  minimal_sets: MinimalSets
+  solver: str | None = None
+
+  def to_dict(self) -> dict:
+    fumen_ids: dict[str, int] = {}
+    sets = [[fumen_ids.setdefault(node.key, len(fumen_ids)) for node in node_set] for node_set in self.minimal_sets.sets]
+    return {"edges": self.edges, "nodes": self.nodes, "count": self.minimal_sets.count, "fumens": list(fumen_ids), "sets": sets, "solver": self.solver}
+
+  @classmethod
+  def from_dict(cls, data: dict) -> "MinimalSearch":
+    # the sets share nodes as the prompts find nodes by identity
+    nodes = [Node(fumen, set(), 0, []) for fumen in data["fumens"]]
+    sets = [[nodes[i] for i in node_set] for node_set in data["sets"]]
+    return cls(data["edges"], data["nodes"], MinimalSets(data["count"], sets), data.get("solver"))
+
+def search_minimals(line_fumens: list[list[str]], profiler: Profiler = NULL_PROFILER, cover_solver: str = COVER_SOLVER_BUILTIN) -> MinimalSearch:
+  '''
+  Minimal sets of the reduced graph by the cover solver if it's installed and proves a minimum, otherwise by the built-in search
+  '''
+  with profiler.stage(STAGE_GRAPH_REDUCTION):
+    graph = fumens_to_graph(line_fumens)
+
+  with profiler.stage(STAGE_MINIMAL_SEARCH):
+    if cover_solver != COVER_SOLVER_BUILTIN:
+      from .cover_solver import find_cover_solver
+      solver = find_cover_solver(cover_solver)
+      cover = solver.solve(graph) if solver is not None else None
+      if solver is not None and cover is not None:
+        return MinimalSearch(len(graph.edges), len(graph.nodes), MinimalSets(len(cover), [cover]), solver.name)
+
+    minimal_sets = find_minimal_nodes(graph.edges, profiler)
+  return MinimalSearch(len(graph.edges), len(graph.nodes), minimal_sets)
+
 class FumenStore:
-  fumen_map: dict[str, Node] = {}
+  def __init__(self):
+    self.fumen_map: dict[str, Node] = {}
 
   def fumen_to_node(self, fumen: str) -> Node:
     if (fumen in self.fumen_map):
@@ -101,13 +145,19 @@ def fumens_to_graph(fumens: list[list[str]]):
     list(filter(lambda n: not n.redundant, clean_nodes))
   )
 
-def find_minimal_nodes(edges: list[Edge]) -> MinimalSets:
+def find_minimal_nodes(edges: list[Edge], profiler: Profiler = NULL_PROFILER) -> MinimalSets:
+  # the search recurses once per edge so only raise the limit when actually searching
+  if sys.getrecursionlimit() < MIN_RECURSION_LIMIT:
+    sys.setrecursionlimit(MIN_RECURSION_LIMIT)
+
   current_nodes: list[Node] = []
   result_count = float("inf")
   result_node_set: list[list[Node]] = []
+  steps = 0
 
   def digest(index: int = 0) -> None:
-    nonlocal result_count, result_node_set
+    nonlocal result_count, result_node_set, steps
+    steps += 1
     if (len(current_nodes) > result_count): return;
     
     if (index >= len(edges)):
@@ -138,6 +188,7 @@ def find_minimal_nodes(edges: list[Edge]) -> MinimalSets:
       node.color -= 1
 
   digest()
+  profiler.add_count(COUNTER_MINIMAL_SEARCH_STEPS, steps)
   return MinimalSets(int(result_count), result_node_set)
 
 def set_first(s: set):
@@ -155,20 +206,95 @@ def pretty_print_fumens(fumens: Iterable[str]) -> str:
   return '\n\n'.join(['\n'.join([delimitor.join(col) for col in zip(*chunk)]) for chunk in chunks])
 
 # prompting for getting set
-def find_best_set(sets: list[list[Node]], log_file: TextIO | None = None) -> list[Node]:
-  while len(sets) > 1:
-    output = f"Try to find the best set. There are {len(sets)} sets\n"
-
-    # find common nodes?
-    set0 = set(sets[0])
-    set1 = set(sets[1])
-    diffA = set0 - set1
-    diffB = set1 - set0
+class SetIndex:
+  '''
+  Sets of nodes as bitmaps of their nodes and each node as a bitmap of the sets containing it
+  '''
+  def __init__(self, sets: list[list[Node]]):
+    self.sets = sets
+    self.nodes: list[Node] = []
+    node_ids: dict[Node, int] = {}
+    self.set_masks: list[int] = []
+    self.node_sets: list[int] = []
+
+    for set_id, node_set in enumerate(sets):
+      mask = 0
+      for node in node_set:
+        node_id = node_ids.get(node)
+        if node_id is None:
+          node_id = node_ids[node] = len(self.nodes)
+          self.nodes.append(node)
+          self.node_sets.append(0)
+        mask |= 1 << node_id
+        self.node_sets[node_id] |= 1 << set_id
+      self.set_masks.append(mask)
+
+    # sets still in consideration
+    self.alive = (1 << len(sets)) - 1
+
+  def count(self) -> int:
+    return self.alive.bit_count()
+
+  def alive_ids(self) -> Iterator[int]:
+    alive = self.alive
+    while alive:
+      low = alive & -alive
+      yield low.bit_length() - 1
+      alive ^= low
+
+  def mask_nodes(self, mask: int) -> list[Node]:
+    return [node for node_id, node in enumerate(self.nodes) if mask >> node_id & 1]
+
+  def keep_containing(self, mask: int):
+    '''
+    Drop the sets that don't have every node of the mask
+    '''
+    while mask:
+      low = mask & -mask
+      self.alive &= self.node_sets[low.bit_length() - 1]
+      mask ^= low
+
+def coverage_scores(line_queue_fumens_map: dict[str, list[str]]) -> dict[str, float]:
+  '''
+  Number of queues each fumen solves
+  '''
+  scores: dict[str, float] = {}
+  for fumens in line_queue_fumens_map.values():
+    for fumen in fumens:
+      scores[fumen] = scores.get(fumen, 0) + 1
+  return scores
+
+def ranking_scores(ranking_path: str) -> dict[str, float]:
+  '''
+  Fumens of the ranking file with one fumen per line from best to worst, where unranked fumens score 0
+  '''
+  with open(ranking_path, 'r', encoding="utf8") as ranking_file:
+    fumens = [line.strip() for line in ranking_file if line.strip()]
+  return {fumen: len(fumens) - rank for rank, fumen in reversed(list(enumerate(fumens)))}
+
+def find_best_set(sets: list[list[Node]], log_file: TextIO | None = None, scores: dict[str, float] | None = None) -> list[Node]:
+  '''
+  Pick the set with the highest total score of its fumens if given scores, first on ties, otherwise prompt between two sets at a time
+  '''
+  index = SetIndex(sets)
+
+  if scores is not None:
+    best_id = max(index.alive_ids(), key=lambda set_id: (sum(scores.get(node.key, 0) for node in sets[set_id]), -set_id))
+    return sets[best_id]
+
+  while index.count() > 1:
+    output = f"Try to find the best set. There are {index.count()} sets\n"
+
+    alive_ids = index.alive_ids()
+    mask0 = index.set_masks[next(alive_ids)]
+    mask1 = index.set_masks[next(alive_ids)]
+    diffA = mask0 & ~mask1
+    diffB = mask1 & ~mask0
    
     output += "Option 1:\n"
-    output += pretty_print_fumens(map(lambda n: n.key, diffA)) + '\n'
+    output += pretty_print_fumens(map(lambda n: n.key, index.mask_nodes(diffA))) + '\n'
     output += "Option 2:\n"
-    output += pretty_print_fumens(map(lambda n: n.key, diffB)) + '\n'
+    output += pretty_print_fumens(map(lambda n: n.key, index.mask_nodes(diffB))) + '\n'
 
     print(output)
 
@@ -178,8 +304,7 @@ def find_best_set(sets: list[list[Node]], log_file: TextIO | None = None) -> lis
       output += "Which is better? 1 or 2: " + result + '\n'
       log_file.write(output)
 
-    dropNodes = diffB if result == '2' else diffA;
-    sets = list(filter(lambda s: dropNodes.issubset(s), sets));
+    index.keep_containing(diffB if result == '2' else diffA)
 
-  return sets[0]
+  return sets[next(index.alive_ids())]
 
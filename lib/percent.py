@@ -1,8 +1,20 @@
+import io
+import sys
+import math
+from statistics import NormalDist
 from typing import TextIO
+from collections import Counter
+from collections.abc import Callable
 from dataclasses import dataclass
-from .saves_reader import SavesReader
-from .parser import Parser as WantedSavesParser, evaluate_ast
-from .utils import any_index, queue_val, sort_queue
+from .selection import RowSelection
+from .result_cache import ResultCache, selection_key
+from .saves_reader import SavesReader, SavesRow
+from .parser import Parser as WantedSavesParser, AST, evaluate_ast
+from .utils import any_index, mirror_queue, queue_val, sort_queue
+from .prefix_index import default_index_path, get_prefix_index
+from .expression_plan import ExpressionPlan
+from .constants import DEFAULT_INDEX_DEPTH, DEFAULT_PLAN_ROWS
+from .profiler import Profiler, NULL_PROFILER, STAGE_EXPRESSION_EVALUATION, STAGE_TREE_UPDATE, STAGE_OUTPUT_ENCODING, CACHE_RESULTS
 
 @dataclass
 class PercentNode:
@@ -33,6 +45,19 @@ class PercentNode:
         f"'{type(self).__name__}' and '{type(other).__name__}'"
       )
 
+  def to_dict(self) -> dict:
+    node = {"count": self.count}
+    if self.children is not None:
+      node["children"] = {piece: child.to_dict() for piece, child in self.children.items()}
+    return node
+
+  @classmethod
+  def from_dict(cls, node: dict) -> "PercentNode":
+    children = node.get("children")
+    if children is not None:
+      children = {piece: cls.from_dict(child) for piece, child in children.items()}
+    return cls(node["count"], children)
+
 def _get_nodes(queue: str, node: PercentNode, depth: int):
   # create the nodes if not exist
   nodes = [node]
@@ -45,6 +70,204 @@ def _get_nodes(queue: str, node: PercentNode, depth: int):
     nodes.append(node)
   return nodes
 
+def open_fails_file(fails_path: str, append: bool = False) -> TextIO:
+  '''
+  Fails file of the fails path, compressed when the fails path ends with .gz
+  '''
+  mode = 'at' if append else 'wt'
+  if fails_path.endswith(".gz"):
+    import gzip
+    return gzip.open(fails_path, mode, encoding="utf8")
+  return open(fails_path, mode, encoding="utf8")
+
+class FailsWriter:
+  '''
+  Writes the fail queues as they are found instead of keeping them in memory
+
+  Without a fails file, the fails go into the log in the same format as print_percent. Otherwise the log
+  only has the number of fails and the fails file has one queue per line after a line of the labels.
+  '''
+  def __init__(self, labels: list[str], log_file: TextIO, console_print: bool, fails_file: TextIO | None = None, fails_path: str = ''):
+    self.labels = labels
+    self.log_file = log_file
+    self.console_print = console_print
+    self.fails_file = fails_file
+    self.fails_path = fails_path
+    self.num_fails = 0
+
+  def _output(self, text: str):
+    self.log_file.write(text)
+    if self.console_print: sys.stdout.write(text)
+
+  def write(self, queue: str):
+    if self.fails_file is not None:
+      if self.num_fails == 0:
+        self.fails_file.write(f"# {', '.join(self.labels)}\n")
+      self.fails_file.write(queue + '\n')
+    else:
+      if self.num_fails == 0:
+        self._output("Fails:\n")
+      self._output(queue + '\n')
+    self.num_fails += 1
+
+  def close(self):
+    if self.num_fails == 0:
+      return
+    if self.fails_file is not None:
+      self._output(f"Fails: {self.num_fails} written to {self.fails_path}\n")
+    self._output("\n")
+
+class PercentCounter:
+  '''
+  Counts for each wanted save and the total, split into trees by the first pieces of the queue up to the tree depth
+  '''
+  def __init__(self, num_saves: int, tree_depth: int = 0, include_fails: bool = False, fails_writer: FailsWriter | None = None):
+    self.saveable_counters = [PercentNode() for _ in range(num_saves)]
+    self.total: PercentNode = PercentNode(0)
+    self.fails: list[str] = []
+    self.tree_depth = tree_depth
+    self.include_fails = include_fails
+    self.fails_writer = fails_writer
+
+  def add(self, queue: str, index: int | None):
+    '''
+    Count the queue for the wanted save at index, or only the total if no wanted save was satisfied
+    '''
+    if index is not None:
+      for node in _get_nodes(queue, self.saveable_counters[index], self.tree_depth):
+        node += 1
+    elif self.include_fails:
+      if self.fails_writer is not None:
+        self.fails_writer.write(queue)
+      else:
+        self.fails.append(queue)
+
+    for node in _get_nodes(queue, self.total, self.tree_depth):
+      node += 1
+
+  def to_dict(self) -> dict:
+    return {
+      "saveable_counters": [node.to_dict() for node in self.saveable_counters],
+      "total": self.total.to_dict(),
+      "fails": self.fails,
+    }
+
+  def load_dict(self, counter: dict):
+    self.saveable_counters = [PercentNode.from_dict(node) for node in counter["saveable_counters"]]
+    self.total = PercentNode.from_dict(counter["total"])
+    self.fails = counter["fails"]
+
+def first_saveable_index(asts: list[AST], saves: list[str]) -> int | None:
+  '''
+  Index of the first wanted save satisfied by the saves
+  '''
+  if len(saves) == 0:
+    return None
+  return any_index(map(lambda ast: evaluate_ast(ast, saves), asts))
+
+def first_planned_index(plans: list[ExpressionPlan], saves: list[str]) -> int | None:
+  '''
+  Index of the first wanted save satisfied by the saves, evaluated by the plan of each wanted save
+  '''
+  if len(saves) == 0:
+    return None
+  return any_index(map(lambda plan: plan.evaluate(saves), plans))
+
+# key of the rows with nothing for the group by
+NO_GROUP_KEY = '-'
+GROUP_BY_SAVE_PREFIX = "save:"
+GROUP_BY_NAMES = ["held", "unused-leftover", "num-saves", "fumen", GROUP_BY_SAVE_PREFIX + "<expression>"]
+
+@dataclass
+class GroupBy:
+  '''
+  Breakdown of the percent by the keys of the groups each row belongs to
+  '''
+  name: str
+  keys: Callable[[SavesRow], list[str]]
+  sort_key: Callable[[str], int | str] | None = None # None keeps the order the keys are first seen
+  assign_fumens: bool = False
+
+def _held_keys(row: SavesRow) -> list[str]:
+  # each piece the queue can end with unused in hold
+  return sorted(set(row.unused_pieces), key=queue_val) or [NO_GROUP_KEY]
+
+def _unused_leftover_keys(unused_leftover: Counter) -> Callable[[SavesRow], list[str]]:
+  def keys(row: SavesRow) -> list[str]:
+    # each number of leftover pieces a solve of the queue ends with unused
+    return sorted({str((Counter(unused_piece) & unused_leftover).total()) for unused_piece in row.unused_pieces}, key=int) or [NO_GROUP_KEY]
+  return keys
+
+def _num_saves_keys(row: SavesRow) -> list[str]:
+  return [str(len(set(row.saves)))]
+
+def _fumen_keys(row: SavesRow) -> list[str]:
+  # each solve of the queue once
+  return list(dict.fromkeys(fumen for fumens in row.fumens or [] for fumen in fumens))
+
+def parse_group_by(spec: str, parser: WantedSavesParser, unused_leftover: Counter) -> GroupBy:
+  if spec == "held":
+    return GroupBy(spec, _held_keys, lambda key: queue_val(key) if key != NO_GROUP_KEY else -1)
+  if spec == "unused-leftover":
+    return GroupBy(spec, _unused_leftover_keys(unused_leftover), lambda key: int(key) if key != NO_GROUP_KEY else -1)
+  if spec == "num-saves":
+    return GroupBy(spec, _num_saves_keys, int)
+  if spec == "fumen":
+    return GroupBy(spec, _fumen_keys, assign_fumens=True)
+  if spec.startswith(GROUP_BY_SAVE_PREFIX):
+    expression = spec[len(GROUP_BY_SAVE_PREFIX):]
+    ast = parser.parse(expression)
+    keys = (expression, f"!{expression}")
+    return GroupBy(expression, lambda row: [keys[not (len(row.saves) > 0 and evaluate_ast(ast, row.saves))]], keys.index)
+  raise ValueError(f"Unknown group by {spec}. Expected one of {', '.join(GROUP_BY_NAMES)}")
+
+class GroupCounter:
+  '''
+  Counts of each wanted save for every key of a group by, with the keys stored as integer ids into lists
+  '''
+  def __init__(self, group_by: GroupBy, num_saves: int):
+    self.group_by = group_by
+    self.key_ids: dict[str, int] = {}
+    self.keys: list[str] = []
+    self.totals: list[int] = []
+    self.saveable_counts: list[list[int]] = [[] for _ in range(num_saves)]
+
+  def add(self, row: SavesRow, index: int | None):
+    for key in self.group_by.keys(row):
+      key_id = self.key_ids.get(key)
+      if key_id is None:
+        key_id = self.key_ids[key] = len(self.keys)
+        self.keys.append(key)
+        self.totals.append(0)
+        for counts in self.saveable_counts:
+          counts.append(0)
+
+      self.totals[key_id] += 1
+      if index is not None:
+        self.saveable_counts[index][key_id] += 1
+
+  def sorted_key_ids(self) -> list[int]:
+    key_ids = list(range(len(self.keys)))
+    sort_key = self.group_by.sort_key
+    if sort_key is not None:
+      key_ids.sort(key=lambda key_id: sort_key(self.keys[key_id]))
+    return key_ids
+
+def print_group_percent(labels: list[str], group_counters: list[GroupCounter], log_file: TextIO, console_print: bool):
+  output = ""
+  for group_counter in group_counters:
+    key_ids = group_counter.sorted_key_ids()
+    for label, counts in zip(labels, group_counter.saveable_counts):
+      output += f"{label} by {group_counter.group_by.name}:\n"
+      for key_id in key_ids:
+        total = group_counter.totals[key_id]
+        save_percent = counts[key_id] / total * 100 if total != 0 else 0
+        output += f"∟ {group_counter.keys[key_id]} -> {save_percent:.2f}% [{counts[key_id]}/{total}]\n"
+
+  log_file.write(output)
+
+  if console_print: print(output, end='')
+
 def percent(
   filepath: str, 
   wanted_saves: list[str],
@@ -59,27 +282,93 @@ def percent(
   include_fails: bool = False,
   over_solves: bool = False,
   all_saves: bool = False,
-  tree_depth: int = 0
+  tree_depth: int = 0,
+  profiler: Profiler = NULL_PROFILER,
+  given_prefix: str = '',
+  index_path: str | None = None,
+  index_depth: int = DEFAULT_INDEX_DEPTH,
+  group_by: list[str] | None = None,
+  fails_file: TextIO | None = None,
+  fails_path: str = '',
+  mirror: bool = False,
+  selection: RowSelection | None = None,
+  result_cache: ResultCache | None = None,
+  plan_rows: int = DEFAULT_PLAN_ROWS,
+  explain: bool = False
 ):
-  saveable_counters = [PercentNode() for _ in range(len(wanted_saves))]
-  total: PercentNode = PercentNode(0)
-  fails = []
+  '''
+  Output the percent of each wanted save, served from the result cache if the same percent was already calculated
+
+  Percents including fails aren't cached as the fails can be as large as the path file, nor with the plans explained
+  as they are only known from evaluating the rows
+  '''
+  cache_key = None
+  if result_cache is not None and not include_fails and not explain:
+    query = {
+      "wanted_saves": wanted_saves,
+      "labels": labels,
+      "leftover": leftover,
+      "build": build,
+      "width": width,
+      "height": height,
+      "hold": hold,
+      "over_solves": over_solves,
+      "all_saves": all_saves,
+      "tree_depth": tree_depth,
+      "given_prefix": given_prefix,
+      "group_by": group_by or [],
+      "mirror": mirror,
+      "selection": selection_key(selection),
+    }
+    cache_key = result_cache.key("percent", filepath, query)
+    cached = result_cache.get(cache_key)
+    profiler.add_cache(CACHE_RESULTS, cached is not None, cached is None)
+    if cached is not None:
+      for warn in cached["warnings"]:
+        print(warn)
+      log_file.write(cached["output"])
+      if console_print: print(cached["output"], end='')
+      return
+
+  # fails are streamed out so memory doesn't grow with the number of fails
+  fails_writer = FailsWriter(labels, log_file, console_print, fails_file, fails_path)
+  counter = PercentCounter(len(wanted_saves), tree_depth, include_fails, fails_writer)
   all_saves_dict: dict[str, int] = {}
 
   wanted_saves_parser = WantedSavesParser() 
   asts = []
   for wanted_save in wanted_saves:
     asts.append(wanted_saves_parser.parse(wanted_save))
+  # the operands are reordered for the rest of the rows after the first plan rows
+  plans = [ExpressionPlan(ast, plan_rows) for ast in asts]
 
-  save_reader = SavesReader(filepath, leftover, build, width, height, hold)
+  save_reader = SavesReader(filepath, leftover, build, width, height, hold, profiler, mirror, selection)
 
-  warnings = set()
+  # every group by is counted in the same pass as the percent
+  group_counters = [GroupCounter(parse_group_by(spec, wanted_saves_parser, save_reader.unused_leftover), len(wanted_saves)) for spec in group_by or []]
+  assign_fumens = any(group_counter.group_by.assign_fumens for group_counter in group_counters)
+
+  if given_prefix:
+    # only read the rows of queues starting with the prefix using the index
+    index = get_prefix_index(filepath, index_path or default_index_path(filepath), index_depth)
+    # the index is of the queues in the path file before being mirrored
+    rows = save_reader.read_offsets(index.offsets_for(mirror_queue(given_prefix) if mirror else given_prefix), assign_fumens)
+  else:
+    rows = save_reader.read(assign_fumens)
+
+  warnings = []
+  # entering the stages costs every row so it's skipped when not profiling
+  profiled = profiler.enabled
 
-  for row in save_reader.read():
+  for row in rows:
     if row.warn is not None and row.warn not in warnings:
-      warnings.add(row.warn)
+      warnings.append(row.warn)
       print(row.warn)
 
+    # rows of a prefix longer than the index depth
+    if not row.queue.startswith(given_prefix):
+      continue
+
     # ignore rows that aren't solveable if out of solves
     if over_solves and not row.solveable:
       continue
@@ -91,29 +380,134 @@ def percent(
           all_saves_dict[save] = 1
         else:
           all_saves_dict[save] += 1
-      total += 1
-    else:
+      counter.total += 1
+    elif not profiled:
       # get first index that satisfies the save
-      if len(row.saves) == 0:
-        index = None
-      else:
-        index = any_index(map(lambda ast: evaluate_ast(ast, row.saves), asts))
-
-      if index is not None:
-        for node in _get_nodes(row.queue, saveable_counters[index], tree_depth):
-          node += 1
-      elif include_fails:
-        fails.append(row.queue)
+      index = first_planned_index(plans, row.saves)
+      counter.add(row.queue, index)
+      for group_counter in group_counters:
+        group_counter.add(row, index)
+    else:
+      with profiler.stage(STAGE_EXPRESSION_EVALUATION):
+        index = first_planned_index(plans, row.saves)
 
-      for node in _get_nodes(row.queue, total, tree_depth):
-        node += 1
+      with profiler.stage(STAGE_TREE_UPDATE):
+        counter.add(row.queue, index)
+        for group_counter in group_counters:
+          group_counter.add(row, index)
 
+  saveable_counters = counter.saveable_counters
   if all_saves:
     # sort items of the dict
     labels, raw_saveable_counters = [list(t) for t in zip(*sorted(all_saves_dict.items(), key=lambda x: queue_val(x[0])))]
     saveable_counters = [PercentNode(a) for a in raw_saveable_counters]
 
-  print_percent(labels, saveable_counters, total, log_file, console_print, fails, tree_depth)
+  with profiler.stage(STAGE_OUTPUT_ENCODING):
+    fails_writer.close()
+    # the output is the result that's cached
+    output = io.StringIO()
+    print_percent(labels, saveable_counters, counter.total, output, False, counter.fails, tree_depth)
+    print_group_percent(labels, group_counters, output, False)
+    if explain and not all_saves:
+      for label, plan in zip(labels, plans):
+        output.write(f"\nPlan of {label}:\n{plan.explain()}")
+
+  log_file.write(output.getvalue())
+  if console_print: print(output.getvalue(), end='')
+
+  if result_cache is not None and cache_key is not None:
+    result_cache.put(cache_key, {"output": output.getvalue(), "warnings": warnings})
+
+# check the intervals after this many more sampled queues
+APPROX_CHECK_INTERVAL = 64
+APPROX_MIN_SAMPLE = 30
+
+def _wilson_half_width(count: int, sampled: int, z: float, population: float) -> float:
+  '''
+  Half width of the wilson score interval with finite population correction
+  '''
+  if sampled == 0:
+    return 1.0
+
+  p = count / sampled
+  half_width = z * math.sqrt(p * (1 - p) / sampled + z * z / (4 * sampled * sampled)) / (1 + z * z / sampled)
+  if population > 1:
+    half_width *= math.sqrt(max(population - sampled, 0) / (population - 1))
+  return half_width
+
+def approx_percent(
+  filepath: str,
+  wanted_saves: list[str],
+  labels: list[str],
+  leftover: str,
+  build: str,
+  width: int,
+  height: int,
+  hold: int,
+  log_file: TextIO,
+  console_print: bool = True,
+  over_solves: bool = False,
+  best_save: bool = False,
+  target_error: float = 0.5,
+  confidence: float = 0.95,
+  seed: int | None = None,
+  profiler: Profiler = NULL_PROFILER,
+  mirror: bool = False
+):
+  '''
+  Estimate the percent of the wanted saves from a random sample of queues, stopping once the
+  confidence interval of every wanted save is within the target error (in percent)
+  '''
+  wanted_saves_parser = WantedSavesParser()
+  asts = [wanted_saves_parser.parse(wanted_save) for wanted_save in wanted_saves]
+
+  save_reader = SavesReader(filepath, leftover, build, width, height, hold, profiler, mirror)
+
+  z = NormalDist().inv_cdf(0.5 + confidence / 2)
+  target = target_error / 100
+  counts = [0] * len(asts)
+  sampled = 0
+  seen = 0
+  warnings = set()
+
+  def half_widths() -> list[float]:
+    num_rows = save_reader.num_rows or seen
+    # population of only solveable queues is estimated from the queues seen so far
+    population = num_rows * sampled / seen if seen else num_rows
+    return [_wilson_half_width(count, sampled, z, population) for count in counts]
+
+  for row in save_reader.read_sample(seed):
+    seen += 1
+    if row.warn is not None and row.warn not in warnings:
+      warnings.add(row.warn)
+      print(row.warn)
+
+    if over_solves and not row.solveable:
+      continue
+    sampled += 1
+
+    with profiler.stage(STAGE_EXPRESSION_EVALUATION):
+      if best_save:
+        index = first_saveable_index(asts, row.saves)
+        if index is not None:
+          counts[index] += 1
+      elif len(row.saves) > 0:
+        for i, ast in enumerate(asts):
+          counts[i] += evaluate_ast(ast, row.saves)
+
+    if sampled >= APPROX_MIN_SAMPLE and sampled % APPROX_CHECK_INTERVAL == 0:
+      if all(half_width <= target for half_width in half_widths()):
+        break
+
+  output = ""
+  for label, count, half_width in zip(labels, counts, half_widths()):
+    save_percent = count / sampled * 100 if sampled != 0 else 0
+    output += f"{label}: {save_percent:.2f}% ± {half_width * 100:.2f}% [{count}/{sampled}]\n"
+  output += f"Sampled {seen} of {save_reader.num_rows} queues at {confidence * 100:g}% confidence\n"
+
+  with profiler.stage(STAGE_OUTPUT_ENCODING):
+    log_file.write(output)
+    if console_print: print(output, end='')
 
 def _print_tree_percent_helper(pieces: str, curr_node: PercentNode, curr_total_node: PercentNode, tree_depth: int, curr_depth: int = 0):
   output = ""
@@ -0,0 +1,109 @@
+import csv
+import heapq
+import json
+from os import path
+from .saves_reader import COLUMN_QUEUE
+from .archive import PathArchive, is_archive
+from .constants import PREFIX_INDEX_SUFFIX, DEFAULT_INDEX_DEPTH
+
+PREFIX_INDEX_VERSION = 1
+
+def default_index_path(filepath: str) -> str:
+  return filepath + PREFIX_INDEX_SUFFIX
+
+def _path_file_metadata(filepath: str) -> dict:
+  # the size and modified time of the path file to know when the index is out of date
+  return {
+    "path_file": path.abspath(filepath),
+    "size": path.getsize(filepath),
+    "mtime": path.getmtime(filepath),
+  }
+
+class PrefixIndex:
+  '''
+  Byte offsets of the rows of a path file for each prefix of the queue up to the depth
+  '''
+  def __init__(self, depth: int, offsets: dict[str, list[int]], metadata: dict):
+    self.depth = depth
+    self.offsets = offsets
+    self.metadata = metadata
+
+  def offsets_for(self, prefix: str) -> list[int]:
+    '''
+    Sorted offsets of the rows with queues starting with the prefix
+
+    Prefixes longer than the depth give the rows of the first depth pieces, which still need to be checked
+    '''
+    if len(prefix) >= self.depth:
+      return self.offsets.get(prefix[:self.depth], [])
+
+    # merge the offsets of every longer prefix so the rows are read in file order
+    return list(heapq.merge(*(offsets for key, offsets in self.offsets.items() if key.startswith(prefix))))
+
+  def save(self, filepath: str):
+    with open(filepath, 'w', encoding="utf8") as outfile:
+      json.dump({
+        "version": PREFIX_INDEX_VERSION,
+        "metadata": self.metadata,
+        "depth": self.depth,
+        "offsets": self.offsets,
+      }, outfile)
+
+  @classmethod
+  def load(cls, filepath: str) -> "PrefixIndex | None":
+    if not path.exists(filepath):
+      return None
+    with open(filepath, 'r', encoding="utf8") as infile:
+      try:
+        data = json.load(infile)
+      except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict) or data.get("version") != PREFIX_INDEX_VERSION:
+      return None
+    return cls(data["depth"], data["offsets"], data["metadata"])
+
+def build_prefix_index(filepath: str, depth: int = DEFAULT_INDEX_DEPTH) -> PrefixIndex:
+  '''
+  Scan the path file for the queue of each row without parsing the rest of the row
+
+  The rows of an archive are by their index instead of their byte offset
+  '''
+  offsets: dict[str, list[int]] = {}
+
+  if is_archive(filepath):
+    for index, queue in enumerate(PathArchive(filepath).queues()):
+      offsets.setdefault(queue[:depth], []).append(index)
+    return PrefixIndex(depth, offsets, _path_file_metadata(filepath))
+
+  with open(filepath, 'rb') as infile:
+    header = infile.readline()
+    fieldnames = next(csv.reader([header.decode("utf-8-sig")]))
+    if COLUMN_QUEUE not in fieldnames:
+      raise ValueError(f"Missing required columns: {COLUMN_QUEUE}. Columns found instead: {', '.join(fieldnames)}")
+    queue_column = fieldnames.index(COLUMN_QUEUE)
+
+    offset = infile.tell()
+    for line in infile:
+      if line.strip():
+        # queues are only pieces so they are never quoted
+        queue = line.split(b',', queue_column + 1)[queue_column].decode("utf-8")
+        offsets.setdefault(queue[:depth], []).append(offset)
+      offset += len(line)
+
+  return PrefixIndex(depth, offsets, _path_file_metadata(filepath))
+
+def get_prefix_index(filepath: str, index_path: str, depth: int = DEFAULT_INDEX_DEPTH) -> PrefixIndex:
+  '''
+  Load the index from index path if made from the same path file with the depth, otherwise build and store it
+  '''
+  index = PrefixIndex.load(index_path)
+  if index is not None and index.depth == depth and index.metadata == _path_file_metadata(filepath):
+    return index
+
+  index = build_prefix_index(filepath, depth)
+  # the stored index only saves rebuilding so the index built is still used without it
+  try:
+    index.save(index_path)
+  except OSError:
+    pass
+  return index
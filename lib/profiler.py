@@ -0,0 +1,126 @@
+import json
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, asdict
+
+STAGE_CSV_READ = "csv read"
+STAGE_ROW_VALIDATION = "row validation"
+STAGE_SAVE_CONSTRUCTION = "save construction"
+STAGE_FUMEN_DECODE = "fumen decode"
+STAGE_EXPRESSION_EVALUATION = "expression evaluation"
+STAGE_TREE_UPDATE = "tree update"
+STAGE_GRAPH_REDUCTION = "graph reduction"
+STAGE_MINIMAL_SEARCH = "minimal search"
+STAGE_BEST_SET_SELECTION = "best-set selection"
+STAGE_COVERAGE_ORDERING = "coverage ordering"
+STAGE_OUTPUT_ENCODING = "output encoding"
+
+CACHE_FUMEN_COMMENTS = "fumen comments"
+CACHE_RESULTS = "results"
+COUNTER_MINIMAL_SEARCH_STEPS = "minimal search steps"
+
+@dataclass
+class StageStats:
+  seconds: float = 0.0
+  calls: int = 0
+
+@dataclass
+class CacheStats:
+  hits: int = 0
+  misses: int = 0
+
+def _peak_rss_kib() -> int | None:
+  try:
+    import resource
+  except ImportError:
+    # not available on windows
+    return None
+
+  import sys
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # macos reports in bytes while linux reports in kilobytes
+  return peak // 1024 if sys.platform == "darwin" else peak
+
+class _StageTimer:
+  __slots__ = ("stats", "start")
+
+  def __init__(self, stats: StageStats):
+    self.stats = stats
+    self.start = 0.0
+
+  def __enter__(self):
+    self.start = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc):
+    self.stats.seconds += time.perf_counter() - self.start
+    self.stats.calls += 1
+    return False
+
+class Profiler:
+  '''
+  Records the wall time and calls of each stage, hit rates of caches and extra counters
+
+  Stages can be nested (ex: fumen decode happens during save construction) so their times overlap
+  '''
+  enabled = True
+
+  def __init__(self):
+    self.stages: dict[str, StageStats] = {}
+    self.caches: dict[str, CacheStats] = {}
+    self.counters: dict[str, int] = {}
+    self._start = time.perf_counter()
+
+  def stage(self, name: str):
+    stats = self.stages.get(name)
+    if stats is None:
+      stats = self.stages[name] = StageStats()
+    return _StageTimer(stats)
+
+  def add_cache(self, name: str, hits: int, misses: int):
+    if hits == 0 and misses == 0:
+      return
+    stats = self.caches.setdefault(name, CacheStats())
+    stats.hits += hits
+    stats.misses += misses
+
+  def add_count(self, name: str, count: int):
+    self.counters[name] = self.counters.get(name, 0) + count
+
+  def report(self, command: str = '') -> dict:
+    caches = {}
+    for name, stats in self.caches.items():
+      lookups = stats.hits + stats.misses
+      caches[name] = {**asdict(stats), "hit_rate": stats.hits / lookups if lookups else 0}
+
+    return {
+      "command": command,
+      "total_seconds": time.perf_counter() - self._start,
+      "stages": {name: asdict(stats) for name, stats in self.stages.items()},
+      "caches": caches,
+      "counters": self.counters,
+      "peak_rss_kib": _peak_rss_kib(),
+    }
+
+  def write(self, filepath: str, command: str = ''):
+    with open(filepath, 'w', encoding="utf8") as outfile:
+      json.dump(self.report(command), outfile, indent=2)
+      outfile.write('\n')
+
+class NullProfiler(Profiler):
+  '''
+  Profiler that records nothing used when profiling is disabled
+  '''
+  enabled = False
+  _context = nullcontext()
+
+  def stage(self, name: str):
+    return self._context
+
+  def add_cache(self, name: str, hits: int, misses: int):
+    pass
+
+  def add_count(self, name: str, count: int):
+    pass
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+from os import path
+from .selection import RowSelection, file_hash
+from .constants import DEFAULT_RESULT_CACHE_SIZE_MB
+
+RESULT_CACHE_VERSION = 1
+# content hashes of the path files by their size and modified time so unchanged path files aren't hashed again
+PATH_HASHES_FILE = "path_hashes.json"
+ENTRY_SUFFIX = ".json"
+
+_tool_version: str | None = None
+
+def tool_version() -> str:
+  '''
+  Hash of the source of the package so results of a changed version are never served
+  '''
+  global _tool_version
+  if _tool_version is None:
+    sha1 = hashlib.sha1(str(RESULT_CACHE_VERSION).encode())
+    lib_dir = path.dirname(__file__)
+    for filename in sorted(os.listdir(lib_dir)):
+      if filename.endswith(".py"):
+        with open(path.join(lib_dir, filename), 'rb') as infile:
+          sha1.update(filename.encode() + b'\0' + infile.read())
+    _tool_version = sha1.hexdigest()
+  return _tool_version
+
+def selection_key(selection: RowSelection | None) -> str | None:
+  if selection is None:
+    return None
+  return hashlib.sha1(selection.bitmap() + selection.rows.to_bytes(8, "little")).hexdigest()
+
+class ResultCache:
+  '''
+  Results of percent and filter in a directory keyed by the content hash of the path file, the query and the tool version
+
+  Each result is its own file, and the least recently used results are removed once the directory is over the size limit.
+  '''
+  def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_RESULT_CACHE_SIZE_MB << 20):
+    self.cache_dir = cache_dir
+    self.max_bytes = max_bytes
+
+  def _path_hash(self, filepath: str) -> str:
+    hashes_path = path.join(self.cache_dir, PATH_HASHES_FILE)
+    hashes = {}
+    if path.isfile(hashes_path):
+      with open(hashes_path, 'r', encoding="utf8") as infile:
+        try:
+          hashes = json.load(infile)
+        except json.JSONDecodeError:
+          hashes = {}
+
+    stat = os.stat(filepath)
+    abspath = path.abspath(filepath)
+    entry = hashes.get(abspath)
+    if isinstance(entry, dict) and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime_ns:
+      return entry["hash"]
+
+    content_hash = file_hash(filepath)
+    hashes[abspath] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": content_hash}
+    self._write(hashes_path, hashes)
+    return content_hash
+
+  def key(self, command: str, filepath: str, query: dict) -> str:
+    '''
+    Key of the result of the command on the path file with the query of the options affecting the result
+    '''
+    key = {
+      "command": command,
+      "path_file": self._path_hash(filepath),
+      "tool": tool_version(),
+      "query": query,
+    }
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+  def _entry_path(self, key: str) -> str:
+    return path.join(self.cache_dir, key + ENTRY_SUFFIX)
+
+  def get(self, key: str) -> dict | None:
+    entry_path = self._entry_path(key)
+    try:
+      with open(entry_path, 'r', encoding="utf8") as infile:
+        result = json.load(infile)
+      # the modified time is when the result was last used
+      os.utime(entry_path)
+    except (OSError, json.JSONDecodeError):
+      return None
+    return result
+
+  def put(self, key: str, result: dict):
+    self._write(self._entry_path(key), result)
+    self._evict()
+
+  def _write(self, filepath: str, data: dict):
+    # the cache only saves recomputing so results are still output without it
+    try:
+      # only the cache directory is made, like the other outputs in the output directory
+      if not path.isdir(self.cache_dir):
+        os.mkdir(self.cache_dir)
+      temp_path = filepath + ".tmp"
+      with open(temp_path, 'w', encoding="utf8") as outfile:
+        json.dump(data, outfile, ensure_ascii=False)
+      # readers never see a partially written result
+      os.replace(temp_path, filepath)
+    except OSError:
+      pass
+
+  def _evict(self):
+    if not path.isdir(self.cache_dir):
+      return
+
+    entries = []
+    total = 0
+    for entry in os.scandir(self.cache_dir):
+      if entry.name.endswith(ENTRY_SUFFIX) and entry.name != PATH_HASHES_FILE:
+        stat = entry.stat()
+        entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total += stat.st_size
+
+    entries.sort()
+    for _, size, entry_path in entries:
+      if total <= self.max_bytes:
+        break
+      try:
+        os.remove(entry_path)
+      except OSError:
+        pass
+      total -= size
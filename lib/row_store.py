@@ -0,0 +1,144 @@
+from array import array
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterator
+from .archive import encode_queue, decode_queue
+from .saves_reader import SavesReader, SavesRow
+
+# typecode of each array of the store in the order they are laid out in the shared memory
+STORE_ARRAYS = (
+  ("queue_codes", 'Q'),
+  ("queue_lengths", 'B'),
+  ("solveable", 'B'),
+  # saves of row i are save ids save offsets[i] to save offsets[i + 1]
+  ("save_offsets", 'I'),
+  ("save_ids", 'I'),
+  # fumens of save j of all rows are fumen ids fumen offsets[j] to fumen offsets[j + 1]
+  ("fumen_offsets", 'I'),
+  ("fumen_ids", 'I'),
+  # utf-8 of fumen k is fumen text offsets[k] to fumen text offsets[k + 1] of fumen text
+  ("fumen_text_offsets", 'Q'),
+  ("fumen_text", 'B'),
+)
+# start of each array in the shared memory is aligned for the largest typecode
+ARRAY_ALIGNMENT = 8
+
+@dataclass
+class RowStoreHandle:
+  '''
+  Everything a worker needs to attach to the store, which is small enough to send to each worker
+  '''
+  name: str
+  layout: dict[str, tuple[int, int]]
+  saves: list[str]
+  num_rows: int
+
+class RowStore:
+  '''
+  Saves and fumens of the rows of a path file parsed once into flat arrays in shared memory
+
+  Workers attach to the same memory with views of the arrays so the rows aren't parsed nor copied in each worker.
+  The process that loaded the store unlinks it once the workers are done.
+  '''
+  def __init__(self, shm: SharedMemory, handle: RowStoreHandle, owner: bool):
+    self.shm = shm
+    self.handle = handle
+    self.owner = owner
+    # views of the shared memory without copying it
+    self.arrays: dict[str, memoryview] = {}
+    for name, typecode in STORE_ARRAYS:
+      offset, count = handle.layout[name]
+      self.arrays[name] = shm.buf[offset:offset + count * array(typecode).itemsize].cast(typecode)
+    self._fumens: dict[int, str] = {}
+
+  @classmethod
+  def load(cls, save_reader: SavesReader) -> tuple["RowStore", list[str]]:
+    '''
+    Read the rows of the save reader with their fumens into a new store
+
+    Return:
+        tuple[RowStore, list[str]]: the store and the warnings of the rows
+    '''
+    arrays = {name: array(typecode) for name, typecode in STORE_ARRAYS}
+    arrays["save_offsets"].append(0)
+    arrays["fumen_offsets"].append(0)
+    arrays["fumen_text_offsets"].append(0)
+    save_ids: dict[str, int] = {}
+    fumen_ids: dict[str, int] = {}
+    warnings = []
+
+    for row in save_reader.read(assign_fumens=True):
+      if row.warn is not None and row.warn not in warnings:
+        warnings.append(row.warn)
+
+      arrays["queue_codes"].append(encode_queue(row.queue))
+      arrays["queue_lengths"].append(len(row.queue))
+      arrays["solveable"].append(row.solveable)
+
+      for save, fumens in zip(row.saves, row.fumens or []):
+        arrays["save_ids"].append(save_ids.setdefault(save, len(save_ids)))
+        for fumen in fumens:
+          fumen_id = fumen_ids.get(fumen)
+          if fumen_id is None:
+            fumen_id = fumen_ids[fumen] = len(fumen_ids)
+            arrays["fumen_text"].frombytes(fumen.encode("utf-8"))
+            arrays["fumen_text_offsets"].append(len(arrays["fumen_text"]))
+          arrays["fumen_ids"].append(fumen_id)
+        arrays["fumen_offsets"].append(len(arrays["fumen_ids"]))
+      arrays["save_offsets"].append(len(arrays["save_ids"]))
+
+    layout = {}
+    size = 0
+    for name, values in arrays.items():
+      layout[name] = (size, len(values))
+      size += -(-len(values) * values.itemsize // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+    # shared memory can't be empty
+    shm = SharedMemory(create=True, size=max(size, 1))
+    for name, values in arrays.items():
+      offset, _ = layout[name]
+      data = values.tobytes()
+      shm.buf[offset:offset + len(data)] = data
+
+    handle = RowStoreHandle(shm.name, layout, list(save_ids), len(arrays["queue_lengths"]))
+    return cls(shm, handle, True), warnings
+
+  @classmethod
+  def attach(cls, handle: RowStoreHandle) -> "RowStore":
+    # workers share the resource tracker of the process that loaded the store so attaching doesn't take ownership
+    return cls(SharedMemory(name=handle.name), handle, False)
+
+  def fumen(self, fumen_id: int) -> str:
+    fumen = self._fumens.get(fumen_id)
+    if fumen is None:
+      offsets = self.arrays["fumen_text_offsets"]
+      fumen = self._fumens[fumen_id] = bytes(self.arrays["fumen_text"][offsets[fumen_id]:offsets[fumen_id + 1]]).decode("utf-8")
+    return fumen
+
+  def rows(self, assign_fumens: bool = False) -> Iterator[SavesRow]:
+    '''
+    Rows as given by the save reader the store was loaded from, without the unused pieces, lines and warnings
+    '''
+    arrays = self.arrays
+    queue_codes, queue_lengths, solveable = arrays["queue_codes"], arrays["queue_lengths"], arrays["solveable"]
+    save_offsets, save_ids = arrays["save_offsets"], arrays["save_ids"]
+    fumen_offsets, fumen_ids = arrays["fumen_offsets"], arrays["fumen_ids"]
+    saves = self.handle.saves
+
+    for i in range(self.handle.num_rows):
+      start, end = save_offsets[i], save_offsets[i + 1]
+      row = SavesRow([saves[save_id] for save_id in save_ids[start:end]], bool(solveable[i]), decode_queue(queue_codes[i], queue_lengths[i]))
+      if assign_fumens:
+        row.fumens = [[self.fumen(fumen_id) for fumen_id in fumen_ids[fumen_offsets[j]:fumen_offsets[j + 1]]] for j in range(start, end)]
+      yield row
+
+  def close(self):
+    '''
+    Release the views and detach, removing the memory if this is the process that loaded the store
+    '''
+    for view in self.arrays.values():
+      view.release()
+    self.arrays = {}
+    self.shm.close()
+    if self.owner:
+      self.shm.unlink()
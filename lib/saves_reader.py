@@ -1,10 +1,14 @@
 import csv
+import copy
+import random
 from collections import Counter
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional
 from .formulas import WIDTHHEIGHT2NUMPIECES, LONUM2BAGCOMP
-from .utils import fumen_get_comments, sort_queue
+from .utils import fumen_get_comments, fumen_mirror, mirror_queue, sort_queue
 from .constants import BAG
+from .selection import RowSelection
+from .profiler import Profiler, NULL_PROFILER, STAGE_CSV_READ, STAGE_ROW_VALIDATION, STAGE_SAVE_CONSTRUCTION, STAGE_FUMEN_DECODE, CACHE_FUMEN_COMMENTS
 
 COLUMN_QUEUE = 'ツモ'
 COLUMN_FUMEN_COUNT = '対応地形数'
@@ -16,6 +20,8 @@ COLUMN_FUMENS_DELIMITOR = ';'
 
 REQUIRED_COLUMNS = {COLUMN_QUEUE, COLUMN_UNUSED_PIECES, COLUMN_FUMENS}
 
+DEFAULT_RESERVOIR_SIZE = 100000
+
 def _get_unused_last_bag(build: str, leftover: str, bag_comp: list[int]) -> set[str]:
   # assumes that not given an impossible build for the leftover and queues in path file
   non_last_bags = leftover + BAG * (len(bag_comp) - 2)
@@ -31,103 +37,395 @@ class SavesRow:
   saves: list[str]
   solveable: bool
   queue: str
+  unused_pieces: list[str] = field(default_factory=list)
   fumens: Optional[list[list[str]]] = None
   line: Optional[dict[str, str]] = None
   warn: Optional[str] = None
 
 class SavesReader:
-  def __init__(self, filepath: str, leftover: str, build: str, width: int, height: int, hold: int):
+  def __init__(self, filepath: str, leftover: str, build: str, width: int, height: int, hold: int, profiler: Profiler = NULL_PROFILER, mirror: bool = False, selection: RowSelection | None = None):
     self.filepath = filepath
-    self.leftover = leftover
-    self.build = build
+    self.profiler = profiler
+    self.mirror = mirror
+    # only the rows of the selection are read
+    self.selection = selection
+    # index of the last row given by read after the header
+    self.row_index = -1
     self.width = width
     self.height = height
     self.hold = hold
+    self._configure(leftover, build)
+
+    # comments of the fumens as they are slow to decode
+    self._fumen_labels: dict[str, Counter] = {}
+    self._fumen_label_lookups = 0
+    self._fumen_label_misses = 0
+
+    # mirrored fumens as the same solves are in many rows
+    self._mirrored_fumens: dict[str, str] = {}
+
+    # number of rows in the path file once known
+    self.num_rows: int | None = None
+
+    # archives are only loaded when read to keep startup fast
+    from .archive import PathArchive, is_archive
+
+    # archived path files are read from their tables instead of as csv
+    self.archive: PathArchive | None = None
+    if is_archive(filepath):
+      with profiler.stage(STAGE_CSV_READ):
+        self.archive = PathArchive(filepath)
+      self.num_rows = self.archive.num_rows
+      self.fieldnames = self.archive.fieldnames
+    else:
+      self._file = open(filepath, 'r', encoding="utf-8-sig")
+      self.reader = csv.DictReader(self._file)
+      self.fieldnames = list(self.reader.fieldnames or [])
 
-    bag_comp = LONUM2BAGCOMP(len(self.leftover), WIDTHHEIGHT2NUMPIECES(width, height, hold))
+    if not REQUIRED_COLUMNS.issubset(set(self.fieldnames)):
+      missing = REQUIRED_COLUMNS - set(self.fieldnames)
+      raise ValueError(f"Missing required columns: {', '.join(missing)}. Columns found instead: {', '.join(self.fieldnames)}")
+
+
+  def _configure(self, leftover: str, build: str):
+    self.leftover = leftover
+    self.build = build
+
+    bag_comp = LONUM2BAGCOMP(len(leftover), WIDTHHEIGHT2NUMPIECES(self.width, self.height, self.hold))
     self.unused_last_bag = _get_unused_last_bag(build, leftover, bag_comp)
     self.leading_size = max(sum(bag_comp[:-1]), len(build))
 
-    self._file = open(filepath, 'r', encoding="utf-8-sig")
-    self.reader = csv.DictReader(self._file)
-    if not REQUIRED_COLUMNS.issubset(set(self.reader.fieldnames or [])):
-      missing = REQUIRED_COLUMNS - set(self.reader.fieldnames or [])
-      raise ValueError(f"Missing required columns: {', '.join(missing)}. Columns found instead: {', '.join(self.reader.fieldnames or [])}")
+    self._min_num_pieces = WIDTHHEIGHT2NUMPIECES(self.width, self.height, 0)
+    self._leftover_ctr = Counter(leftover)
+    self.unused_leftover = self._leftover_ctr - Counter(build) # leftover pieces not used
+
+  def with_config(self, leftover: str, build: str) -> "SavesReader":
+    '''
+    Reader of the same path file finding the saves of the rows with another leftover and build
 
+    It shares the decoded fumens with this reader and is given rows read by this reader to saves row rather than reading.
+    '''
+    reader = copy.copy(self)
+    # only the reader that opened the path file closes it
+    if hasattr(reader, "_file"):
+      del reader._file
+    reader._configure(leftover, build)
+    return reader
 
   def __del__(self):
-    self._file.close()
-    del self._file
+    # file may not have been opened if the constructor raised
+    if hasattr(self, "_file"):
+      self._file.close()
+      del self._file
 
-  def read(self, assign_fumens: bool = False, assign_line: bool = False):
-    fumen_labels = {}
-
-    min_num_pieces = WIDTHHEIGHT2NUMPIECES(self.width, self.height, 0)
-    leftover_ctr = Counter(self.leftover)
-    build_ctr = Counter(self.build)
-    unused_leftover = leftover_ctr - build_ctr # leftover pieces not used
-
-    for row in self.reader:
-      saves = []
-      save_fumens = []
-
-      solveable = row[COLUMN_FUMENS] != ''
-      if not solveable:
-        save_row = SavesRow([], solveable, row[COLUMN_QUEUE])
-        if assign_fumens: save_row.fumens = []
-        if assign_line: save_row.line = row
-        yield save_row
-        continue
-
-      full_queue = self.build + row[COLUMN_QUEUE]
-      
-      # since some leftover isn't used then shows up in the queue
-      # check if what is expected to be the first pieces is leftover pieces
-      if Counter(row[COLUMN_QUEUE][:unused_leftover.total()]) != unused_leftover:
-        raise ValueError(f"Found {row[COLUMN_QUEUE]} in path.csv, but expected to start with pieces not used from leftover {''.join(unused_leftover.elements())}")
-
-      # check if valid length
-      if min_num_pieces > len(full_queue):
-        raise ValueError(f"Full queue could not produce a {self.width}x{self.height} PC. Likely build '{self.build}' ('X' denotes unknown piece) is too short or maybe dimensions of PC is incorrect")
-
-      following_bag = Counter(full_queue[:len(self.leftover) + 7]) - leftover_ctr
-
-      if len(set(following_bag)) != following_bag.total():
-        raise ValueError(f"Leftover/build inconsistent with queues in path.csv (e.g. {row[COLUMN_QUEUE]}). Bag expected for first 7 pieces not part of leftover {''.join(following_bag.elements())} but got repeated pieces.")
-
-      # get the rest of the pieces in the last bag
-      unseen_last_bag_part = self.unused_last_bag - set(full_queue[self.leading_size:])
-      
-      queue_ctr = Counter(row[COLUMN_QUEUE])
-         
-      for unused_piece in row[COLUMN_UNUSED_PIECES].split(COLUMN_UNUSED_PIECES_DELIMITOR):
-        save = ''.join(unseen_last_bag_part) + unused_piece
-        save = sort_queue(save)
-        saves.append(save)
-
-        if assign_fumens:
-          curr_save_fumens = []
-          # find the fumen that didn't use this piece
-          for fumen in row[COLUMN_FUMENS].split(COLUMN_FUMENS_DELIMITOR):
-            # TODO: fix code for multihold
-            if fumen not in fumen_labels:
-              # the comment contains what pieces used in the solve
-              # get the sum of the values of the characters store in dict for fast lookup
-              fumen_labels[fumen] = Counter(fumen_get_comments(fumen)[0])
-            comment = fumen_labels[fumen]
-
-            fumen_unused_piece = queue_ctr - comment
-            if Counter(unused_piece) == fumen_unused_piece:
-              curr_save_fumens.append(fumen)
-          save_fumens.append(curr_save_fumens)
-
-      save_row = SavesRow(saves, solveable, row[COLUMN_QUEUE])
-      if assign_fumens: save_row.fumens = save_fumens
+  def _report_cache(self):
+    self.profiler.add_cache(CACHE_FUMEN_COMMENTS, self._fumen_label_lookups - self._fumen_label_misses, self._fumen_label_misses)
+    self._fumen_label_lookups = self._fumen_label_misses = 0
+
+  def _mirror_row(self, row: dict[str, str], mirror_fumens: bool):
+    '''
+    Change the row in place into the row of the mirrored setup
+    '''
+    row[COLUMN_QUEUE] = mirror_queue(row[COLUMN_QUEUE])
+    row[COLUMN_UNUSED_PIECES] = mirror_queue(row[COLUMN_UNUSED_PIECES])
+    if COLUMN_USED_PIECES in row:
+      row[COLUMN_USED_PIECES] = mirror_queue(row[COLUMN_USED_PIECES])
+
+    # fumens are only decoded when used
+    if mirror_fumens and row[COLUMN_FUMENS]:
+      fumens = []
+      for fumen in row[COLUMN_FUMENS].split(COLUMN_FUMENS_DELIMITOR):
+        if fumen not in self._mirrored_fumens:
+          with self.profiler.stage(STAGE_FUMEN_DECODE):
+            self._mirrored_fumens[fumen] = fumen_mirror(fumen)
+        fumens.append(self._mirrored_fumens[fumen])
+      row[COLUMN_FUMENS] = COLUMN_FUMENS_DELIMITOR.join(fumens)
+
+  def _validate_row(self, queue: str, full_queue: str):
+    unused_leftover = self.unused_leftover
+
+    # since some leftover isn't used then shows up in the queue
+    # check if what is expected to be the first pieces is leftover pieces
+    if Counter(queue[:unused_leftover.total()]) != unused_leftover:
+      raise ValueError(f"Found {queue} in path.csv, but expected to start with pieces not used from leftover {''.join(unused_leftover.elements())}")
+
+    # check if valid length
+    if self._min_num_pieces > len(full_queue):
+      raise ValueError(f"Full queue could not produce a {self.width}x{self.height} PC. Likely build '{self.build}' ('X' denotes unknown piece) is too short or maybe dimensions of PC is incorrect")
+
+    following_bag = Counter(full_queue[:len(self.leftover) + 7]) - self._leftover_ctr
+
+    if len(set(following_bag)) != following_bag.total():
+      raise ValueError(f"Leftover/build inconsistent with queues in path.csv (e.g. {queue}). Bag expected for first 7 pieces not part of leftover {''.join(following_bag.elements())} but got repeated pieces.")
+
+  def _construct_saves(self, row: dict[str, str], full_queue: str, assign_fumens: bool) -> tuple[list[str], list[list[str]], list[str]]:
+    '''
+    Saves of the row, the fumens getting each save, and the unused pieces the saves are from
+    '''
+    saves = []
+    save_fumens = []
+
+    # get the rest of the pieces in the last bag
+    unseen_last_bag_part = self.unused_last_bag - set(full_queue[self.leading_size:])
+
+    queue_ctr = Counter(row[COLUMN_QUEUE])
+    unused_pieces = row[COLUMN_UNUSED_PIECES].split(COLUMN_UNUSED_PIECES_DELIMITOR)
+
+    for unused_piece in unused_pieces:
+      save = ''.join(unseen_last_bag_part) + unused_piece
+      save = sort_queue(save)
+      saves.append(save)
+
+      if assign_fumens:
+        curr_save_fumens = []
+        # find the fumen that didn't use this piece
+        for fumen in row[COLUMN_FUMENS].split(COLUMN_FUMENS_DELIMITOR):
+          # TODO: fix code for multihold
+          self._fumen_label_lookups += 1
+          if fumen not in self._fumen_labels:
+            self._fumen_label_misses += 1
+            # the comment contains what pieces used in the solve
+            # get the sum of the values of the characters store in dict for fast lookup
+            with self.profiler.stage(STAGE_FUMEN_DECODE):
+              self._fumen_labels[fumen] = Counter(fumen_get_comments(fumen)[0])
+          comment = self._fumen_labels[fumen]
+
+          fumen_unused_piece = queue_ctr - comment
+          if Counter(unused_piece) == fumen_unused_piece:
+            curr_save_fumens.append(fumen)
+        save_fumens.append(curr_save_fumens)
+
+    return saves, save_fumens, unused_pieces
+
+  def saves_row(self, row: dict[str, str], assign_fumens: bool = False, assign_line: bool = False) -> SavesRow:
+    '''
+    Get the saves of a row of the path file
+    '''
+    profiler = self.profiler
+    if self.mirror:
+      self._mirror_row(row, assign_fumens or assign_line)
+
+    solveable = row[COLUMN_FUMENS] != ''
+    if not solveable:
+      save_row = SavesRow([], solveable, row[COLUMN_QUEUE])
+      if assign_fumens: save_row.fumens = []
       if assign_line: save_row.line = row
-      elif min_num_pieces + self.hold < len(full_queue):
-        save_row.warn = "More pieces than possibly used in path.csv. Maybe the leftover length isn't correct"
+      return save_row
+
+    full_queue = self.build + row[COLUMN_QUEUE]
+
+    # entering the stages costs every row so it's skipped when not profiling
+    if profiler.enabled:
+      with profiler.stage(STAGE_ROW_VALIDATION):
+        self._validate_row(row[COLUMN_QUEUE], full_queue)
+      with profiler.stage(STAGE_SAVE_CONSTRUCTION):
+        saves, save_fumens, unused_pieces = self._construct_saves(row, full_queue, assign_fumens)
+    else:
+      self._validate_row(row[COLUMN_QUEUE], full_queue)
+      saves, save_fumens, unused_pieces = self._construct_saves(row, full_queue, assign_fumens)
+
+    save_row = SavesRow(saves, solveable, row[COLUMN_QUEUE], unused_pieces)
+    if assign_fumens: save_row.fumens = save_fumens
+    if assign_line: save_row.line = row
+    elif self._min_num_pieces + self.hold < len(full_queue):
+      save_row.warn = "More pieces than possibly used in path.csv. Maybe the leftover length isn't correct"
+
+    return save_row
+
+  def read(self, assign_fumens: bool = False, assign_line: bool = False):
+    try:
+      for row in self.read_rows():
+        yield self.saves_row(row, assign_fumens, assign_line)
+    finally:
+      self._report_cache()
+
+  def read_rows(self) -> Iterator[dict[str, str]]:
+    '''
+    Rows of the path file, or of the selection, as read before finding their saves
+    '''
+    if self.selection is not None:
+      yield from self._read_selected(self.selection)
+      return
+
+    profiler = self.profiler
+    rows = iter(self.reader) if self.archive is None else self.archive.rows()
+    self.row_index = -1
+    if not profiler.enabled:
+      for row in rows:
+        self.row_index += 1
+        yield row
+      return
+
+    while True:
+      with profiler.stage(STAGE_CSV_READ):
+        row = next(rows, None)
+      if row is None:
+        break
+
+      self.row_index += 1
+      yield row
+
+  def _read_selected(self, selection: RowSelection) -> Iterator[dict[str, str]]:
+    '''
+    Rows of the selection where the other rows are skipped without being parsed
+    '''
+    selection.check_file(self.filepath)
+
+    profiler = self.profiler
+    bitmap = selection.bitmap()
+    self.row_index = -1
+    if self.archive is not None:
+      archive = self.archive
+      for row_index in range(min(selection.rows, archive.num_rows)):
+        if not bitmap[row_index >> 3] >> (row_index & 7) & 1:
+          continue
+        with profiler.stage(STAGE_CSV_READ):
+          row = archive.row(row_index)
+        self.row_index = row_index
+        yield row
+      return
+
+    with open(self.filepath, 'rb') as infile:
+      infile.readline()
+      row_index = -1
+      for line in infile:
+        if not line.strip():
+          continue
+        row_index += 1
+        if row_index >= selection.rows or not bitmap[row_index >> 3] >> (row_index & 7) & 1:
+          continue
+
+        with profiler.stage(STAGE_CSV_READ):
+          row = self._line_to_row(line.decode("utf-8"))
+        self.row_index = row_index
+        yield row
+
+  def row_offsets(self) -> list[int]:
+    '''
+    Byte offsets of the start of each row after the header, or the indicies of the rows of an archive
+    '''
+    if self.archive is not None:
+      return list(range(self.archive.num_rows))
+
+    offsets = []
+    with open(self.filepath, 'rb') as infile:
+      infile.readline()
+      offset = infile.tell()
+      for line in infile:
+        if line.strip():
+          offsets.append(offset)
+        offset += len(line)
+    return offsets
+
+  def _line_to_row(self, line: str) -> dict[str, str]:
+    return dict(zip(self.fieldnames, next(csv.reader([line]))))
+
+  def read_offsets(self, offsets: Iterable[int], assign_fumens: bool = False, assign_line: bool = False):
+    '''
+    Rows starting at each of the byte offsets in the path file, or at each row index of an archive
+    '''
+    profiler = self.profiler
+    if self.archive is not None:
+      try:
+        for index in offsets:
+          with profiler.stage(STAGE_CSV_READ):
+            row = self.archive.row(index)
+          yield self.saves_row(row, assign_fumens, assign_line)
+      finally:
+        self._report_cache()
+      return
+
+    try:
+      with open(self.filepath, 'rb') as infile:
+        for offset in offsets:
+          with profiler.stage(STAGE_CSV_READ):
+            infile.seek(offset)
+            row = self._line_to_row(infile.readline().decode("utf-8"))
+          yield self.saves_row(row, assign_fumens, assign_line)
+    finally:
+      self._report_cache()
+
+  def read_lines(self, lines: Iterable[bytes], assign_fumens: bool = False, assign_line: bool = False):
+    '''
+    Rows of lines of the path file after the header given in any order
+    '''
+    profiler = self.profiler
+    try:
+      for line in lines:
+        with profiler.stage(STAGE_CSV_READ):
+          row = self._line_to_row(line.decode("utf-8"))
+        yield self.saves_row(row, assign_fumens, assign_line)
+    finally:
+      self._report_cache()
+
+  def header_offset(self) -> int:
+    with open(self.filepath, 'rb') as infile:
+      infile.readline()
+      return infile.tell()
+
+  def read_appended(self, offset: int | None = None, assign_fumens: bool = False, assign_line: bool = False, final: bool = False):
+    '''
+    Rows from the byte offset up to the last complete line for path files that are still being written
+
+    The offset attribute is moved past each row before it is given. With final, the path file is done being
+    written so a last line without a newline is also a row.
+    '''
+    if self.archive is not None:
+      raise ValueError(f"{self.filepath} is an archive which isn't written by sfinder so can't be followed")
+    self.offset = self.header_offset() if offset is None else offset
+    profiler = self.profiler
+    try:
+      with open(self.filepath, 'rb') as infile:
+        infile.seek(self.offset)
+        while True:
+          with profiler.stage(STAGE_CSV_READ):
+            line = infile.readline()
+            # the last line may still be partially written
+            if not line.endswith(b'\n') and not (final and line):
+              break
+            self.offset += len(line)
+            if not line.strip():
+              continue
+            row = self._line_to_row(line.decode("utf-8"))
+          yield self.saves_row(row, assign_fumens, assign_line)
+    finally:
+      self._report_cache()
+
+  def read_sample(self, seed: int | None = None, reservoir_size: int = DEFAULT_RESERVOIR_SIZE):
+    '''
+    Rows in a uniformly random order without replacement
+
+    A seekable path file is sampled by seeking to the rows in a random order so only the rows used are parsed.
+    Otherwise a reservoir sample of at most reservoir size is taken from reading the whole path file.
+    '''
+    rng = random.Random(seed)
+    profiler = self.profiler
+
+    if self.archive is not None or self._file.seekable():
+      offsets = self.row_offsets()
+      self.num_rows = len(offsets)
+      rng.shuffle(offsets)
+      yield from self.read_offsets(offsets)
+      return
+
+    try:
+      reservoir = []
+      num_rows = 0
+      with profiler.stage(STAGE_CSV_READ):
+        for num_rows, row in enumerate(self.reader, 1):
+          if len(reservoir) < reservoir_size:
+            reservoir.append(row)
+          else:
+            i = rng.randrange(num_rows)
+            if i < reservoir_size:
+              reservoir[i] = row
+      self.num_rows = num_rows
+      rng.shuffle(reservoir)
 
-      yield save_row
+      for row in reservoir:
+        yield self.saves_row(row)
+    finally:
+      self._report_cache()
 
 if __name__ == '__main__':
   reader = SavesReader('../output/path.csv', 'OILJO', 'O', 10, 4, 1)
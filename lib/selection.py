@@ -0,0 +1,104 @@
+import base64
+import hashlib
+import json
+import zlib
+from dataclasses import dataclass
+from os import path
+
+SELECTION_VERSION = 1
+# bytes of the path file hashed at a time
+HASH_BLOCK_SIZE = 1 << 20
+
+def file_hash(filepath: str) -> str:
+  sha1 = hashlib.sha1()
+  with open(filepath, 'rb') as infile:
+    while block := infile.read(HASH_BLOCK_SIZE):
+      sha1.update(block)
+  return sha1.hexdigest()
+
+@dataclass
+class RowSelection:
+  '''
+  Rows of a path file selected by an expression as a bitmap with a bit for each row after the header
+  '''
+  bits: int
+  rows: int
+  file_hash: str
+  expression: str
+  path_file: str = ''
+
+  def count(self) -> int:
+    return self.bits.bit_count()
+
+  def bitmap(self) -> bytes:
+    # indexing the bytes doesn't shift the whole int for each row
+    return self.bits.to_bytes((self.rows + 7) // 8, "little")
+
+  def _check_same_file(self, other: "RowSelection"):
+    if self.file_hash != other.file_hash or self.rows != other.rows:
+      raise ValueError(f"Selections of {other.expression} and {self.expression} are from different path files")
+
+  def __and__(self, other: "RowSelection") -> "RowSelection":
+    self._check_same_file(other)
+    return RowSelection(self.bits & other.bits, self.rows, self.file_hash, f"({self.expression}) && ({other.expression})", self.path_file)
+
+  def __or__(self, other: "RowSelection") -> "RowSelection":
+    self._check_same_file(other)
+    return RowSelection(self.bits | other.bits, self.rows, self.file_hash, f"({self.expression}) || ({other.expression})", self.path_file)
+
+  def __invert__(self) -> "RowSelection":
+    return RowSelection(~self.bits & ((1 << self.rows) - 1), self.rows, self.file_hash, f"!({self.expression})", self.path_file)
+
+  def check_file(self, filepath: str):
+    '''
+    Raise if the path file isn't the one the selection was made from
+    '''
+    if file_hash(filepath) != self.file_hash:
+      raise ValueError(f"Selection of {self.expression} was made from a different path file than {filepath}")
+
+  def save(self, filepath: str):
+    bitmap = zlib.compress(self.bitmap())
+    with open(filepath, 'w', encoding="utf8") as outfile:
+      json.dump({
+        "version": SELECTION_VERSION,
+        "path_file": self.path_file,
+        "file_hash": self.file_hash,
+        "expression": self.expression,
+        "rows": self.rows,
+        "bitmap": base64.b64encode(bitmap).decode("ascii"),
+      }, outfile)
+
+  @classmethod
+  def load(cls, filepath: str) -> "RowSelection":
+    with open(filepath, 'r', encoding="utf8") as infile:
+      try:
+        data = json.load(infile)
+      except json.JSONDecodeError:
+        raise ValueError(f"Selection {filepath} is not a json file") from None
+
+    if not isinstance(data, dict) or data.get("version") != SELECTION_VERSION:
+      raise ValueError(f"Selection {filepath} is not a selection made by this version")
+
+    bits = int.from_bytes(zlib.decompress(base64.b64decode(data["bitmap"])), "little")
+    return cls(bits, data["rows"], data["file_hash"], data["expression"], data["path_file"])
+
+class SelectionBuilder:
+  '''
+  Selection of the rows of the path file read in order that satisfy the expression
+  '''
+  def __init__(self, filepath: str, expression: str):
+    self.filepath = filepath
+    self.expression = expression
+    self.bitmap = bytearray()
+    self.rows = 0
+
+  def add(self, row_index: int, selected: bool):
+    self.rows = max(self.rows, row_index + 1)
+    if len(self.bitmap) < (self.rows + 7) // 8:
+      self.bitmap.extend(bytes((self.rows + 7) // 8 - len(self.bitmap)))
+    if selected:
+      self.bitmap[row_index >> 3] |= 1 << (row_index & 7)
+
+  def build(self, rows: int | None = None) -> RowSelection:
+    bits = int.from_bytes(self.bitmap, "little")
+    return RowSelection(bits, self.rows if rows is None else rows, file_hash(self.filepath), self.expression, path.abspath(self.filepath))
@@ -0,0 +1,118 @@
+import json
+from os import path
+from .constants import TINYURL_API, DEFAULT_SHORTENER_TIMEOUT, DEFAULT_SHORTENER_CONCURRENCY
+
+TINYURL_FAILED = "Tinyurl did not accept fumen due to url length"
+
+class Shortener:
+  '''
+  Shorten urls with an api that takes the url in the query and responds with the short url, like tinyurl
+
+  Short urls are kept in the cache file across runs. Deferred shorteners only record the urls
+  so the urls of many minimals can be shortened together with shorten all.
+  '''
+  def __init__(
+    self,
+    api_url: str = TINYURL_API,
+    cache_path: str | None = None,
+    timeout: float = DEFAULT_SHORTENER_TIMEOUT,
+    concurrency: int = DEFAULT_SHORTENER_CONCURRENCY,
+    defer: bool = False
+  ):
+    self.api_url = api_url
+    self.cache_path = cache_path
+    self.timeout = timeout
+    self.concurrency = concurrency
+    self.defer = defer
+    self.pending: list[str] = []
+    self.cache: dict[str, str] = self._load_cache()
+
+  def deferred(self) -> "Shortener":
+    '''
+    Shortener with the same settings that records the urls not in the cache for another process to shorten
+    '''
+    return Shortener(self.api_url, self.cache_path, self.timeout, self.concurrency, True)
+
+  def _load_cache(self) -> dict[str, str]:
+    if self.cache_path is None or not path.isfile(self.cache_path):
+      return {}
+    with open(self.cache_path, 'r', encoding="utf8") as infile:
+      try:
+        cache = json.load(infile)
+      except json.JSONDecodeError:
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+  def save_cache(self):
+    if self.cache_path is None:
+      return
+    # the cache only saves requests so the links are still output without it
+    try:
+      with open(self.cache_path, 'w', encoding="utf8") as outfile:
+        json.dump(self.cache, outfile)
+    except OSError:
+      pass
+
+  def _request(self, url: str) -> str | None:
+    # network modules are only loaded when shortening to keep startup fast
+    from urllib.error import URLError
+    from urllib.parse import urlencode
+    from urllib.request import urlopen
+
+    request_url = self.api_url + '?' + urlencode({'url': url})
+    try:
+      with urlopen(request_url, timeout=self.timeout) as response:
+        short_url = response.read().decode('utf-8').strip()
+    except (URLError, OSError, ValueError):
+      return None
+    return short_url if short_url.startswith("http") else None
+
+  def shorten(self, url: str) -> str | None:
+    '''
+    Short url of the url, or None if the api didn't give one in time
+    '''
+    if url in self.cache:
+      return self.cache[url]
+    if self.defer:
+      self.pending.append(url)
+      return url
+
+    short_url = self._request(url)
+    if short_url is not None:
+      self.cache[url] = short_url
+      self.save_cache()
+    return short_url
+
+  async def _shorten_async(self, urls: list[str]) -> list[str | None]:
+    import asyncio
+    semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def shorten_one(url: str) -> str | None:
+      async with semaphore:
+        return await asyncio.to_thread(self._request, url)
+
+    return await asyncio.gather(*(shorten_one(url) for url in urls))
+
+  def shorten_all(self, urls: list[str]) -> dict[str, str | None]:
+    '''
+    Short url of each url with the urls not in the cache requested concurrently
+    '''
+    import asyncio
+
+    missing = list(dict.fromkeys(url for url in urls if url not in self.cache))
+    if missing:
+      for url, short_url in zip(missing, asyncio.run(self._shorten_async(missing))):
+        if short_url is not None:
+          self.cache[url] = short_url
+      self.save_cache()
+
+    return {url: self.cache.get(url) for url in urls}
+
+  def replace_all(self, texts: list[str], urls: list[str]) -> list[str]:
+    '''
+    Swap the deferred urls in the texts with their short urls
+    '''
+    short_urls = self.shorten_all(urls)
+    for url, short_url in short_urls.items():
+      texts = [text.replace(url, short_url if short_url is not None else TINYURL_FAILED) for text in texts]
+    return texts
@@ -0,0 +1,119 @@
+import io
+from dataclasses import dataclass, field
+from typing import TextIO
+from .saves_reader import SavesReader
+from .selection import RowSelection
+from .parser import Parser as WantedSavesParser
+from .percent import PercentCounter, first_saveable_index, print_percent
+from .profiler import Profiler, NULL_PROFILER, STAGE_EXPRESSION_EVALUATION, STAGE_TREE_UPDATE, STAGE_OUTPUT_ENCODING
+
+# separates the leftover from the build of a configuration
+SWEEP_CONFIG_DELIMITOR = ':'
+
+@dataclass
+class SweepConfig:
+  '''
+  Leftover and build to read the path file with as given by the label, or why the path file can't be read with it
+  '''
+  label: str
+  leftover: str = ''
+  build: str = ''
+  error: str | None = None
+
+@dataclass
+class _SweepState:
+  config: SweepConfig
+  reader: SavesReader
+  counters: list[PercentCounter]
+  warnings: list[str] = field(default_factory=list)
+
+def sweep_percent(
+  filepath: str,
+  wanted_saves: list[str],
+  labels: list[str],
+  configs: list[SweepConfig],
+  width: int,
+  height: int,
+  hold: int,
+  log_file: TextIO,
+  console_print: bool = True,
+  over_solves: bool = False,
+  best_save: bool = False,
+  tree_depth: int = 0,
+  profiler: Profiler = NULL_PROFILER,
+  mirror: bool = False,
+  selection: RowSelection | None = None
+):
+  '''
+  Percents of the wanted saves for each configuration of leftover and build from one read of the path file
+
+  Each row is read once and its saves found for every configuration, where the wanted saves are evaluated once for the
+  configurations giving the row the same saves. A configuration the path file doesn't fit only outputs its error.
+  '''
+  wanted_saves_parser = WantedSavesParser()
+  asts = [wanted_saves_parser.parse(wanted_save) for wanted_save in wanted_saves]
+  # the percents of each configuration are as percent outputs them with or without best save
+  unit_asts = [asts] if best_save else [[ast] for ast in asts]
+  unit_labels = [labels] if best_save else [[label] for label in labels]
+
+  states: list[_SweepState] = []
+  save_reader = None
+  for config in configs:
+    if config.error is not None:
+      continue
+    try:
+      if save_reader is None:
+        save_reader = SavesReader(filepath, config.leftover, config.build, width, height, hold, profiler, mirror, selection)
+      reader = save_reader.with_config(config.leftover, config.build)
+    except ValueError as e:
+      config.error = str(e)
+      continue
+    states.append(_SweepState(config, reader, [PercentCounter(len(unit), tree_depth) for unit in unit_asts]))
+
+  active = list(states)
+  for row in save_reader.read_rows() if save_reader is not None else []:
+    # configurations giving the row the same saves share the evaluation
+    indicies_by_saves: dict[tuple[str, ...], list[int | None]] = {}
+    for state in list(active):
+      try:
+        # mirroring changes the row in place so each configuration mirrors its own copy
+        saves_row = state.reader.saves_row(dict(row) if mirror else row)
+      except ValueError as e:
+        state.config.error = str(e)
+        active.remove(state)
+        continue
+
+      if saves_row.warn is not None and saves_row.warn not in state.warnings:
+        state.warnings.append(saves_row.warn)
+
+      # ignore rows that aren't solveable if out of solves
+      if over_solves and not saves_row.solveable:
+        continue
+
+      key = tuple(saves_row.saves)
+      indicies = indicies_by_saves.get(key)
+      if indicies is None:
+        with profiler.stage(STAGE_EXPRESSION_EVALUATION):
+          indicies = indicies_by_saves[key] = [first_saveable_index(unit, saves_row.saves) for unit in unit_asts]
+
+      with profiler.stage(STAGE_TREE_UPDATE):
+        for counter, index in zip(state.counters, indicies):
+          counter.add(saves_row.queue, index)
+
+  with profiler.stage(STAGE_OUTPUT_ENCODING):
+    output = io.StringIO()
+    state_by_config = {id(state.config): state for state in states}
+    for i, config in enumerate(configs):
+      output.write(('\n' if i else '') + f"[{config.label}]\n")
+      if config.error is not None:
+        output.write(config.error + '\n')
+        continue
+
+      state = state_by_config[id(config)]
+      for warn in state.warnings:
+        output.write(warn + '\n')
+      for unit, counter in zip(unit_labels, state.counters):
+        print_percent(unit, counter.saveable_counters, counter.total, output, False, [], tree_depth)
+
+  log_file.write(output.getvalue())
+  if console_print: print(output.getvalue(), end='')
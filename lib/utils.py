@@ -1,7 +1,10 @@
-import py_fumen_py as pf
 import re
+from itertools import chain, islice
 from .constants import BAG
-from typing import Iterable
+from typing import Iterable, Iterator, TYPE_CHECKING
+
+if TYPE_CHECKING:
+  import py_fumen_py as pf
 
 PIECEVALS = {
   'T': 1,
@@ -28,7 +31,7 @@ class PIECECOLORS:
 SQUARECHAR = '\u51f8'
 SQUARECHARWIDTH = 2
 
-def _decode_wrapper(fumen: str) -> list[pf.Page]:
+def _decode_wrapper(fumen: str) -> list["pf.Page"]:
   '''
   Decode the fumen with error handling
 
@@ -38,6 +41,7 @@ def _decode_wrapper(fumen: str) -> list[pf.Page]:
   Return:
       list[Page]: decoded fumen
   '''
+  import py_fumen_py as pf
 
   try:
       pages = pf.decode(fumen)
@@ -46,44 +50,84 @@ def _decode_wrapper(fumen: str) -> list[pf.Page]:
 
   return pages
 
-def fumen_combine(fumens: list[str]):
+def _fumen_pages(fumens: Iterable[str]) -> Iterator["pf.Page"]:
+  # decoded one fumen at a time so only the pages being encoded are in memory
+  for fumen in fumens:
+    yield from _decode_wrapper(fumen)
+
+def _fumen_comment_pages(fumens: Iterable[str], comments: list[str], append: bool) -> Iterator["pf.Page"]:
+  for i, fumen in enumerate(fumens):
+    page = _decode_wrapper(fumen)[0]
+    if append and i < len(comments):
+      page.comment += comments[i]
+    yield page
+
+def _encode_chunks(pages: Iterator["pf.Page"], chunk_pages: int) -> Iterator[str]:
+  import py_fumen_py as pf
+
+  if chunk_pages <= 0:
+    yield pf.encode(pages)
+    return
+
+  while True:
+    chunk = islice(pages, chunk_pages)
+    first = next(chunk, None)
+    if first is None:
+      return
+    yield pf.encode(chain([first], chunk))
+
+def fumen_combine(fumens: Iterable[str]):
   '''
   Combine list of fumen codes into one fumen
 
   Parameter:
-      fumens (list[str]): list of fumen codes to combine
+      fumens (Iterable[str]): fumen codes to combine
 
   Return:
       str: fumens combine
   '''
-  pages = []
+  return next(_encode_chunks(_fumen_pages(fumens), 0))
 
-  for fumen in fumens:
-    pages += _decode_wrapper(fumen)
+def fumen_combine_chunks(fumens: Iterable[str], chunk_pages: int) -> Iterator[str]:
+  '''
+  Combine fumen codes into fumens of at most chunk pages each, given as each is encoded
 
-  return pf.encode(pages)
+  Parameter:
+      fumens (Iterable[str]): fumen codes to combine
+      chunk_pages (int): pages in each fumen, or all in one fumen if 0
 
-def fumen_combine_comments(fumens: list[str], comments: list[str], append: bool = False):
+  Return:
+      Iterator[str]: combined fumens
+  '''
+  return _encode_chunks(_fumen_pages(fumens), chunk_pages)
+
+def fumen_combine_comments(fumens: Iterable[str], comments: list[str], append: bool = False):
   '''
   Set the comments of the pages of combined fumen of only first pages
 
   Parameter:
-      fumens (list[str]): list of fumens to combine
+      fumens (Iterable[str]): fumens to combine
       comments (list[str]): list of comments to set
 
   Return:
       str: fumen with the changes
   '''
+  return next(_encode_chunks(_fumen_comment_pages(fumens, comments, append), 0))
 
-  pages = []
+def fumen_combine_comments_chunks(fumens: Iterable[str], comments: list[str], append: bool, chunk_pages: int) -> Iterator[str]:
+  '''
+  Combine the first pages of the fumens with the comments set into fumens of at most chunk pages each
 
-  for fumen in fumens:
-    pages.append(_decode_wrapper(fumen)[0])
-  for page, comment in zip(pages, comments):
-    if append:
-      page.comment += comment
+  Parameter:
+      fumens (Iterable[str]): fumens to combine
+      comments (list[str]): list of comments to set
+      append (bool): add the comments after the comments of the pages
+      chunk_pages (int): pages in each fumen, or all in one fumen if 0
 
-  return pf.encode(pages)
+  Return:
+      Iterator[str]: combined fumens
+  '''
+  return _encode_chunks(_fumen_comment_pages(fumens, comments, append), chunk_pages)
 
 def fumen_get_comments(fumen: str):
   '''
@@ -103,6 +147,30 @@ def fumen_get_comments(fumen: str):
 
   return comments
 
+def fumen_mirror(fumen: str) -> str:
+  '''
+  Mirror the fields and pieces of the pages of a fumen with L-J and S-Z swapped
+
+  Parameter:
+      fumen (str): a fumen code
+
+  Return:
+      str: mirrored fumen
+  '''
+  import py_fumen_py as pf
+
+  pages = _decode_wrapper(fumen)
+
+  for page in pages:
+    page.field.mirror(mirror_color=True)
+    if page.operation is not None:
+      page.operation.mirror()
+    # comments of pieces used in the solve
+    if page.comment and is_queue(page.comment):
+      page.comment = mirror_queue(page.comment)
+
+  return pf.encode(pages)
+
 def sort_queue(queue: str) -> str:
   '''
   Sort a queue with TILJSZO ordering
@@ -123,6 +191,14 @@ def sort_queue(queue: str) -> str:
 def is_queue(text: str) -> bool:
   return re.match(f'^[{BAG}]*$', text) is not None
 
+MIRROR_TABLE = str.maketrans("LJSZ", "JLZS")
+
+def mirror_queue(queue: str) -> str:
+  '''
+  Queue of the mirrored setup with L-J and S-Z swapped
+  '''
+  return queue.translate(MIRROR_TABLE)
+
 def is_wild_queue(text: str) -> bool:
   return re.match(f'^[{BAG}X]*$', text) is not None
 
@@ -144,18 +220,6 @@ def all_index(seq: Iterable[bool]) -> list[int]:
 def make_fumen_url(fumen: str):
   return f"https://fumen.zui.jp/?{fumen}"
 
-def make_tiny(url: str):
-  '''
-  Query tinyurl to generate a tinyurl
-  '''
-  import contextlib
-  from urllib.parse import urlencode
-  from urllib.request import urlopen
-
-  request_url = ('http://tinyurl.com/api-create.php?' + urlencode({'url':url}))
-  with contextlib.closing(urlopen(request_url)) as response:
-    return response.read().decode('utf-8')
-
 def display_fumen(fumen: str, height: int = 4) -> list[list[str]]:
   '''
   Generate string when printed represents the field of the page in 2d list of each page the each line
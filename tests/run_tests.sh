@@ -90,6 +90,223 @@ test_case "Null case with 2nd PC with no leftover" "filter -w T -pc 2 -f $PROJ_D
 # TODO: test validity on queues not just directly specifable with sfinder pattern format
 test_case "2nd QB setup" "percent -w S -pc 2 -f $PROJ_DIR/tests/testPath2-3.csv -lp /dev/null" "S: 5.95% [30/504]"
 
+# profiling doesn't change the output
+test_case "Basic save O 2nd PC with profile" "percent -w O -pc 2 -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -pr -pp /dev/null" "O: 26.27% [1324/5040]"
+
+# lattice gives the same percents for wanted saves of only pieces
+test_case "Lattice of 2nd PC" "percent -w O I LJ -pc 2 -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -lt -ltp /dev/null" $'O: 26.27% [1324/5040]
+I: 44.48% [2242/5040]
+LJ: 0.00% [0/5040]'
+
+# a lattice that can't be stored is still used for the percents
+test_case "Lattice of 2nd PC without storing it" "percent -w O -pc 2 -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -lt -ltp /nonexistent/lattice.json" "O: 26.27% [1324/5040]"
+
+# given prefix matches the tree of the prefix
+test_case "Given prefix of 2nd PC" "percent -w O -gp TIL -pc 2 -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -ip /dev/null" "O: 25.00% [6/24]"
+test_case "Given prefix longer than index depth" "percent -w O -gp TIL -id 1 -pc 2 -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -ip /dev/null" "O: 25.00% [6/24]"
+
+# approx sampling every queue gives the exact percent
+test_case "Approx of 2nd PC with whole sample" "percent -w O -pc 2 -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -ap -te 0.01 -se 0" $'O: 26.27% ± 0.00% [1324/5040]
+Sampled 5040 of 5040 queues at 95% confidence'
+
+# mirror swaps L-J and S-Z of the setup
+test_case "Mirror of 2nd PC" "percent -w S -mi -pc 2 -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null" "S: 44.29% [2232/5040]"
+
+# tinyurl through a local stand-in of the api
+API_DIR="$(mktemp -d)"
+printf 'https://tinyurl.com/test\n' > "$API_DIR/api"
+# port 0 lets the os pick a free port, which the server prints once it's listening
+python -u -m http.server 0 --bind 127.0.0.1 --directory "$API_DIR" > "$API_DIR/server.log" 2>&1 &
+API_PID=$!
+API_PORT=""
+for _ in $(seq 100); do
+    API_PORT=$(sed -n 's/.* port \([0-9]*\) .*/\1/p' "$API_DIR/server.log")
+    [[ -n "$API_PORT" ]] && break
+    sleep 0.1
+done
+test_case "Tinyurl of minimal with 2nd PC" "filter -w O -pc 2 -l LSZO -b LSZO -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -t -tu http://127.0.0.1:$API_PORT/api -tc $API_DIR/cache.json" $'2 edges, 2 nodes
+You must learn 2 solutions to cover all queues. There are 1 combinations of solutions to cover all patterns.
+True minimal for O:
+https://tinyurl.com/test'
+kill $API_PID
+rm -rf "$API_DIR"
+
+# minimal split into fumens of one page each
+test_case "Chunked minimal with 2nd PC" "filter -w O -pc 2 -l LSZO -b LSZO -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -ch 1" $'2 edges, 2 nodes
+You must learn 2 solutions to cover all queues. There are 1 combinations of solutions to cover all patterns.
+True minimal for O:
+v115@9gzhilR4A8i0wwglAtR4D8xwBtF8g0wwAtE8JeAgWm?A6untCMOUABBoo2AS7HOBwngHBFbcRAS0+5AUOaHBQecRAy?lAAA
+v115@9gi0wwilR4A8zhglAtR4D8xwBtF8g0wwAtE8JeAgWk?Aad9VC0PUABBoo2AWFjHBFrnRASo78A48o2AvfEEBwnAVB'
+
+# best set picked without prompting
+test_case "Best set by coverage with 2nd PC" "filter -w O -pc 2 -l LSZO -b LSZO -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -bss coverage" $'2 edges, 2 nodes
+You must learn 2 solutions to cover all queues. There are 1 combinations of solutions to cover all patterns.
+True minimal for O:
+v115@9gzhilR4A8i0wwglAtR4D8xwBtF8g0wwAtE8JeAgWm?A6untCMOUABBoo2AS7HOBwngHBFbcRAS0+5AUOaHBQecRAy?lAAA9gi0wwilR4A8zhglAtR4D8xwBtF8g0wwAtE8JeAgWkA?ad9VC0PUABBoo2AWFjHBFrnRASo78A48o2AvfEEBwnAVB'
+
+# cumulative percents of the minimal set in the order covering the most queues
+test_case "Cumulative exact order with 1st PC" "filter -w ILJO -pc 1 -l TILJSZO -b ILSZ -f $PROJ_DIR/tests/testPath1.csv -lp /dev/null -c -eo" $'3 edges, 3 nodes
+You must learn 3 solutions to cover all queues. There are 1 combinations of solutions to cover all patterns.
+True minimal for ILJO:
+v115@9gD8R4BtRpC8R4ywRpE8xwi0D8ywBtg0JeAgWkA0vy?tC0nUABBoo2AVFM6AFrnRASo78AYb2RBvfEEBwnAVB9gD8w?wR4i0C81wg0E8BtwwRpD8R4BtRpJeAgWkAvOmPCadUABBoo?2AXV9KBFrnRASo78A4MELBvfEEBwnAVB9gD8zwRpC8ywBtR?pE8R4i0D8R4wwBtg0JeAgWkAK3TxC6eUABBoo2AYlm2AFrn?RASo78AYekRBvfEEBwnAVB'
+
+# every wanted save filtered in one pass into its own file
+test_case "All expressions of 2nd PC" "filter -w O T -pc 2 -l LSZO -b LSZO -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -ae -od /tmp" $'[O]
+2 edges, 2 nodes
+You must learn 2 solutions to cover all queues. There are 1 combinations of solutions to cover all patterns.
+True minimal for O:
+v115@9gzhilR4A8i0wwglAtR4D8xwBtF8g0wwAtE8JeAgWm?A6untCMOUABBoo2AS7HOBwngHBFbcRAS0+5AUOaHBQecRAy?lAAA9gi0wwilR4A8zhglAtR4D8xwBtF8g0wwAtE8JeAgWkA?ad9VC0PUABBoo2AWFjHBFrnRASo78A48o2AvfEEBwnAVB
+[T]
+No solutions found
+O: /tmp/0_O.txt
+T: /tmp/1_T.txt'
+
+# the reduced minimal graph written as a maxsat cover
+test_case "Cover export of 2nd PC" "filter -w O -pc 2 -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -ce /tmp/testCover2-1.wcnf" $'Cover of 2 queues by 2 fumens written to /tmp/testCover2-1.wcnf
+2 edges, 2 nodes
+You must learn 2 solutions to cover all queues. There are 1 combinations of solutions to cover all patterns.
+True minimal for O:
+v115@9gzhilR4A8i0wwglAtR4D8xwBtF8g0wwAtE8JeAgWm?A6untCMOUABBoo2AS7HOBwngHBFbcRAS0+5AUOaHBQecRAy?lAAA9gi0wwilR4A8zhglAtR4D8xwBtF8g0wwAtE8JeAgWkA?ad9VC0PUABBoo2AWFjHBFrnRASo78A48o2AvfEEBwnAVB'
+
+# wanted saves filtered across processes from the rows in shared memory, output the same as without workers
+test_case "All expressions across processes of 2nd PC" "filter -w O T -pc 2 -l LSZO -b LSZO -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -ae -od /tmp -j 2" $'[O]
+2 edges, 2 nodes
+You must learn 2 solutions to cover all queues. There are 1 combinations of solutions to cover all patterns.
+True minimal for O:
+v115@9gzhilR4A8i0wwglAtR4D8xwBtF8g0wwAtE8JeAgWm?A6untCMOUABBoo2AS7HOBwngHBFbcRAS0+5AUOaHBQecRAy?lAAA9gi0wwilR4A8zhglAtR4D8xwBtF8g0wwAtE8JeAgWkA?ad9VC0PUABBoo2AWFjHBFrnRASo78A48o2AvfEEBwnAVB
+[T]
+No solutions found
+O: /tmp/0_O.txt
+T: /tmp/1_T.txt'
+
+# every configuration of leftover and build from one read, where a configuration the path file doesn't fit gives its error
+test_case "Sweep of 1st PC" "percent -w ILJO -pc 1 -f $PROJ_DIR/tests/testPath1.csv -lp /dev/null -sw TILJSZO:ILSZ TJO- TILJSZO:ILSZT" $'[TILJSZO:ILSZ]
+ILJO: 8.10% [408/5040]
+
+[TJO-]
+ILJO: 8.10% [408/5040]
+
+[TILJSZO:ILSZT]
+Found TOJSTJZ in path.csv, but expected to start with pieces not used from leftover JO'
+
+# reordering the operands after planning from one row keeps the percents of the order written
+test_case "Planned order of 1st PC" "percent -w SZ||LJ||OO T&&(I||S)&&!Z -pc 1 -l TILJSZO -b ILSZ -f $PROJ_DIR/tests/testPath1.csv -lp /dev/null -pn 1" $'SZ||LJ||OO: 92.26% [4650/5040]
+T&&(I||S)&&!Z: 3.69% [186/5040]'
+
+# fails written into their own file only leave the count in the output
+test_case "Fails path of 2nd PC" "percent -w O -pc 2 -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -fa -fap /dev/null" $'Fails: 3716 written to /dev/null
+
+O: 26.27% [1324/5040]'
+
+# group by counts in the same pass as the percent
+test_case "Group by of 2nd PC" "percent -w O -pc 2 -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -gb save:I" $'O: 26.27% [1324/5040]
+O by I:
+∟ I -> 54.06% [1212/2242]
+∟ !I -> 4.00% [112/2798]'
+
+# a queue is in the group of each number of leftover pieces its solves leave unused
+test_case "Group by unused leftover of 1st PC" "percent -w ILJ -pc 1 -l TILJSZO -b ILSZ -f $PROJ_DIR/tests/testPath1.csv -lp /dev/null -gb unused-leftover" $'ILJ: 23.93% [1206/5040]
+ILJ by unused-leftover:
+∟ 0 -> 23.58% [1164/4936]
+∟ 1 -> 23.82% [1104/4634]'
+
+# following a finished path file gives the same percent
+test_case "Follow of 2nd PC" "percent -w O -pc 2 -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -fo -it 0 -cpp /dev/null" "O: 26.27% [1324/5040]"
+
+# the last row without a newline is read once following stops
+NO_NEWLINE_DIR="$(mktemp -d)"
+head -c -1 "$PROJ_DIR/tests/testPath2-1.csv" > "$NO_NEWLINE_DIR/path.csv"
+test_case "Follow without last newline of 2nd PC" "percent -w O -pc 2 -f $NO_NEWLINE_DIR/path.csv -lp /dev/null -fo -it 0 -cpp /dev/null" "O: 26.27% [1324/5040]"
+rm -rf "$NO_NEWLINE_DIR"
+
+# fails of follow are written out as they are found
+test_case "Follow fails path of 2nd PC" "percent -w O -pc 2 -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -fo -it 0 -cpp /dev/null -fa -fap /dev/null" $'Fails: 3716 written to /dev/null
+
+O: 26.27% [1324/5040]'
+
+# resuming appends the fails of the new rows to the fails of the rows before
+RESUME_DIR="$(mktemp -d)"
+head -n 2501 "$PROJ_DIR/tests/testPath2-1.csv" > "$RESUME_DIR/path.csv"
+python "$SCRIPT" percent -w O -pc 2 -f "$RESUME_DIR/path.csv" -lp /dev/null -fo -it 0 -cpp "$RESUME_DIR/checkpoint.json" -fa -fap "$RESUME_DIR/fails.txt" > /dev/null
+tail -n +2502 "$PROJ_DIR/tests/testPath2-1.csv" >> "$RESUME_DIR/path.csv"
+test_case "Follow resumed fails path of 2nd PC" "percent -w O -pc 2 -f $RESUME_DIR/path.csv -lp /dev/null -fo -it 0 -cpp $RESUME_DIR/checkpoint.json -fa -fap $RESUME_DIR/fails.txt" $'Fails: 3716 written to '"$RESUME_DIR"$'/fails.txt
+
+O: 26.27% [1324/5040]'
+python "$SCRIPT" percent -w O -pc 2 -f "$PROJ_DIR/tests/testPath2-1.csv" -lp /dev/null -fa -fap "$RESUME_DIR/expected_fails.txt" > /dev/null
+echo -n "Test: Follow resumed fails file of 2nd PC ... "
+if cmp -s "$RESUME_DIR/fails.txt" "$RESUME_DIR/expected_fails.txt"; then
+    echo "OK"
+    ((passed++))
+else
+    echo "FAIL"
+    echo "   Fails file differs from the fails of percent without following"
+    ((failed++))
+fi
+rm -rf "$RESUME_DIR"
+
+# fails of follow need a fails file to be kept when resuming
+test_case "Invalid follow fails without fails path" "percent -w O -pc 2 -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -fo -fa" "Follow with -fa requires -fap"
+
+# batch reads each path file once for all of its jobs
+test_case "Batch of percent and filter jobs" "batch -m $PROJ_DIR/tests/batchManifest.json -o /dev/null -j 2" $'[O] percent
+O: 26.27% [1324/5040]
+T: 0.00% [0/5040]
+[I] percent
+I: 50.00% [360/720]
+[O minimal] filter
+2 edges, 2 nodes
+True minimal for O:
+v115@9gzhilR4A8i0wwglAtR4D8xwBtF8g0wwAtE8JeAgWm?A6untCMOUABBoo2AS7HOBwngHBFbcRAS0+5AUOaHBQecRAy?lAAA9gi0wwilR4A8zhglAtR4D8xwBtF8g0wwAtE8JeAgWkA?ad9VC0PUABBoo2AWFjHBFrnRASo78A48o2AvfEEBwnAVB
+[S] percent
+S: 5.95% [30/504]
+Ran 4 jobs reading 3 path files'
+
+# selections save the rows a filter selected for percent and filter to read only those rows
+test_case "Selection of O with 2nd PC" "filter -w O -pc 2 -l LSZO -b LSZO -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -s selection -so /tmp/selection_O.json" "O: 1324/5040 rows selected into /tmp/selection_O.json"
+test_case "Selection of S with 2nd PC" "filter -w S -pc 2 -l LSZO -b LSZO -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -s selection -so /tmp/selection_S.json" "S: 1120/5040 rows selected into /tmp/selection_S.json"
+test_case "Combine O and not S" "combine -s /tmp/selection_O.json /tmp/selection_S.json -n 1 -o /tmp/selection_OnS.json -lp /dev/null" "(O) && (!(S)): 736/5040 rows selected into /tmp/selection_OnS.json"
+test_case "Percent within selection of O" "percent -w S -pc 2 -l LSZO -b LSZO -f $PROJ_DIR/tests/testPath2-1.csv -lp /dev/null -sl /tmp/selection_O.json" "S: 44.41% [588/1324]"
+
+# the second run is served from the result cache of the first
+rm -rf /tmp/sfinder_result_cache
+test_case "Result cache miss with 1st PC" "percent -w T -pc 1 -l TILJSZO -b ILSZ -f $PROJ_DIR/tests/testPath1.csv -lp /dev/null -td 1 -rc /tmp/sfinder_result_cache" $'T: 88.69% [4470/5040]
+∟ T -> 88.51% [1487/1680]
+∟ J -> 89.05% [1496/1680]
+∟ O -> 88.51% [1487/1680]'
+test_case "Result cache hit with 1st PC" "percent -w T -pc 1 -l TILJSZO -b ILSZ -f $PROJ_DIR/tests/testPath1.csv -lp /dev/null -td 1 -rc /tmp/sfinder_result_cache" $'T: 88.69% [4470/5040]
+∟ T -> 88.51% [1487/1680]
+∟ J -> 89.05% [1496/1680]
+∟ O -> 88.51% [1487/1680]'
+
+# archives are read in place of the path file with the same rows
+test_case "Archive of 2nd PC" "archive -f $PROJ_DIR/tests/testPath2-1.csv -o /tmp/testPath2-1.csv.archive -lp /dev/null" "Archived 5040 rows with 20 distinct fumens into /tmp/testPath2-1.csv.archive: 1292140 -> 37983 bytes (34.02x)"
+LONG_QUEUE_DIR="$(mktemp -d)"
+head -n 1 "$PROJ_DIR/tests/testPath2-1.csv" > "$LONG_QUEUE_DIR/path.csv"
+printf 'OZSJLITOZSJLITOZSJLITOZ,0,,,\n' >> "$LONG_QUEUE_DIR/path.csv"
+test_case "Invalid archive of too long queue" "archive -f $LONG_QUEUE_DIR/path.csv -lp /dev/null" "Found OZSJLITOZSJLITOZSJLITOZ in path.csv, but queues can only have up to 22 pieces to be archived"
+test_case "Percent of archive of 2nd PC" "percent -w O S -pc 2 -l LSZO -b LSZO -f /tmp/testPath2-1.csv.archive -lp /dev/null" $'O: 26.27% [1324/5040]
+S: 22.22% [1120/5040]'
+
+# diff joins the path files on the queues in both, sorting in chunks smaller than the path files
+test_case "Diff of 2nd PC setups" "diff -w I -pc 2 -f $PROJ_DIR/tests/testPath2-1.csv $PROJ_DIR/tests/testPath2-3.csv -lp /dev/null -dp /dev/null -cr 1000" $'I:
+∟ testPath2-1.csv -> 12.70% [64/504]
+∟ testPath2-3.csv -> 0.00% [0/504]
+∟ both -> 0.00% [0/504]
+∟ either -> 12.70% [64/504]
+∟ only testPath2-1.csv -> 12.70% [64/504]
+∟ only testPath2-3.csv -> 0.00% [0/504]
+Queues only in testPath2-1.csv: 4536'
+
+# chain takes the save with the best chance of the next stage
+test_case "Chain of 1st and 2nd PC" "chain -m $PROJ_DIR/tests/chainManifest.json -lp /dev/null -nt" $'Stage 1
+TILJSZO: 21.71% [testPath1.csv]
+∟ IJSZ -> 99.72%
+∟ LSZO -> 94.21%
+Stage 2
+LSZO: 94.21% [testPath2-1.csv]
+IJSZ: 99.72% [testPath2-2.csv]
+Chain of 2 PCs from TILJSZO: 21.71%'
+
 # TODO: errors
 test_case "Invalid build" "percent -w I -pc 1 -l TILJSZO -b ILSz -f $PROJ_DIR/tests/testPath1.csv -lp /dev/null" "Build expected to contain only TILJSZO pieces"
 test_case "Invalid no leftover but with build" "percent -w I -pc 1 -b ILSZ -f $PROJ_DIR/tests/testPath1.csv -lp /dev/null" "-l must be set"